@@ -33,7 +33,7 @@ import FreeCAD as App
 import FreeCAD, math, sys, os, DraftVecUtils, Draft_rc
 from math import pi
 from FreeCAD import Vector
-import traceback
+import traceback, bisect
 import Draft
 import Part
 from pivy import coin
@@ -42,7 +42,7 @@ if FreeCAD.GuiUp:
     gui = True
 else:
     FreeCAD.Console.PrintMessage("FreeCAD Gui not present. GDT module will have some features disabled.")
-    gui = True
+    gui = False
 
 try:
     from PySide import QtCore,QtGui,QtSvg
@@ -59,22 +59,23 @@ checkBoxState = True
 auxDictionaryDS=[]
 for i in range(1,100):
     auxDictionaryDS.append('DS'+str(i))
-dictionaryAnnotation=[]
-for i in range(1,100):
-    dictionaryAnnotation.append('Annotation'+str(i))
+# faces -> annotation index, only kept while a batch is open
+batchAnnotationIndex = None
+# line colors of the annotations by inspection state
+inspectionColors = {'pass': (0.0,0.67,0.0), 'marginal': (1.0,0.67,0.0), 'fail': (1.0,0.0,0.0)}
 
 #---------------------------------------------------------------------------
 # Param functions
 #---------------------------------------------------------------------------
 
 def getParamType(param):
-    if param in ["lineWidth"]:
+    if param in ["lineWidth","tessellationCacheSize"]:
         return "int"
     elif param in ["textFamily"]:
         return "string"
     elif param in ["textSize","lineScale"]:
         return "float"
-    elif param in ["alwaysShowGrid","showUnit"]:
+    elif param in ["alwaysShowGrid","showUnit","tessellationCacheOnDisk"]:
         return "bool"
     elif param in ["textColor","lineColor"]:
         return "unsigned"
@@ -182,6 +183,10 @@ def getAllAnnotationObjects():
     "getAllAnnotationObjects(): returns a list of annotation objects"
     return getObjectsOfType("Annotation")
 
+def getAllStyleObjects():
+    "getAllStyleObjects(): returns a list of style objects"
+    return getObjectsOfType("Style")
+
 def getRGB(param):
     color = QtGui.QColor(getParam(param,16753920)>>8)
     r = float(color.red()/255.0)
@@ -205,6 +210,102 @@ def getLineWidth():
 def getRGBLine():
     return getRGB("lineColor")
 
+def getStyleDefault(prop):
+    "getStyleDefault(prop): returns the default value of a style property from the GDT preferences"
+    if prop == "LineWidth":
+        return getLineWidth()
+    elif prop == "LineColor":
+        return getRGBLine()
+    elif prop == "LineScale":
+        return getParam("lineScale",1.0)
+    elif prop == "FontSize":
+        return getTextSize()
+    elif prop == "FontName":
+        return getTextFamily()
+    elif prop == "FontColor":
+        return getRGBText()
+    elif prop == "Decimals":
+        return FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Units").GetInt("Decimals",2)
+    elif prop == "ShowUnit":
+        return getParam("showUnit",True)
+    else:
+        return None
+
+def getStyleOfAnnotation(obj):
+    "getStyleOfAnnotation(obj): returns the style object used by the given annotation or by its annotation plane"
+    style = getattr(obj,"Style",None)
+    if style == None and getattr(obj,"AP",None) <> None:
+        style = getattr(obj.AP,"Style",None)
+    return style
+
+def restyleAnnotation(obj):
+    "restyleAnnotation(obj): binds an annotation to the style nodes of its current style and marks it to be laid out again"
+    vobj = getattr(obj,"ViewObject",None)
+    if vobj <> None and getattr(vobj.Proxy,"built",False):
+        vobj.Proxy.updateStyle(vobj)
+    obj.touch()
+
+def getStyleValue(obj, prop):
+    "getStyleValue(obj,prop): returns the value of a style property of the given annotation"
+    vobj = getattr(obj,"ViewObject",None)
+    value = None
+    if vobj <> None and hasattr(vobj,prop) and getattr(vobj,"OverrideStyle",True):
+        value = vobj.getPropertyByName(prop)
+    else:
+        style = getStyleOfAnnotation(obj)
+        if style <> None:
+            value = style.getPropertyByName(prop)
+        elif vobj <> None and hasattr(vobj,prop):
+            value = vobj.getPropertyByName(prop)
+        else:
+            value = getStyleDefault(prop)
+    if hasattr(value,"Value"):
+        value = value.Value
+    return value
+
+def refreshAnnotations():
+    "refreshAnnotations(): touches all the annotations and recomputes the document, unless a batch is open"
+    if batchAnnotationIndex <> None:
+        return
+    for l in getAllAnnotationObjects():
+        l.touch()
+    FreeCAD.ActiveDocument.recompute()
+
+def openBatch():
+    '''openBatch(): starts a batch of GDT object creations. Until closeBatch is
+    called the annotations are looked up through an index and the document is
+    not recomputed.'''
+    global batchAnnotationIndex
+    batchAnnotationIndex = {}
+    for l in getAllAnnotationObjects():
+        batchAnnotationIndex[getFacesKey(l.faces)] = l
+
+def closeBatch():
+    "closeBatch(): ends the current batch and recomputes the document once"
+    global batchAnnotationIndex
+    batchAnnotationIndex = None
+    refreshAnnotations()
+
+def inBatch():
+    "inBatch(): returns True if a batch of GDT object creations is open"
+    return batchAnnotationIndex <> None
+
+def getAnnotationName():
+    "getAnnotationName(): returns the name for a new annotation object"
+    if batchAnnotationIndex <> None:
+        return 'Annotation'+str(len(batchAnnotationIndex)+1)
+    return 'Annotation'+str(len(getAllAnnotationObjects())+1)
+
+def getGDTGroup():
+    "getGDTGroup(): returns the GDT group of the active document, creating it if needed"
+    group = FreeCAD.ActiveDocument.getObject("GDT")
+    if group == None:
+        group = FreeCAD.ActiveDocument.addObject("App::DocumentObjectGroupPython", "GDT")
+        _GDTObject(group)
+        if gui:
+            _ViewProviderGDT(group.ViewObject)
+    return group
+
 def hideGrid():
     if hasattr(FreeCADGui,"Snapper") and getParam("alwaysShowGrid") == False:
         if FreeCADGui.Snapper.grid:
@@ -251,10 +352,24 @@ def makeContainerOfData():
     container = ContainerOfData(faces)
     return container
 
+def getFacesKey(faces):
+    "getFacesKey(faces): returns a hashable key for a list of (object, subelement) links, the same whatever the order of the faces"
+    key = []
+    for link in faces:
+        subs = link[1]
+        if isinstance(subs, str):
+            subs = [subs]
+        for sub in subs:
+            key.append((link[0].Name, sub))
+    return tuple(sorted(key))
+
 def getAnnotationObj(obj):
+    if batchAnnotationIndex <> None:
+        return batchAnnotationIndex.get(getFacesKey(obj.faces))
+    key = getFacesKey(obj.faces)
     List = getAllAnnotationObjects()
     for l in List:
-        if l.faces == obj.faces:
+        if getFacesKey(l.faces) == key:
             return l
     return None
 
@@ -273,16 +388,12 @@ def getAnnotationWithGT(obj):
                 return l
     return None
 
-def getPointsToPlot(obj):
+def getPointsToPlot(obj, texts=None, selectedPoint=None):
     points = []
     segments = []
     if obj.GT <> [] or obj.DF <> None:
-        X = FreeCAD.Vector(1.0,0.0,0.0)
-        Y = FreeCAD.Vector(0.0,1.0,0.0)
-        Direction = X if abs(X.dot(obj.AP.Direction)) < 0.8 else Y
-        Vertical = obj.AP.Direction.cross(Direction).normalize()
-        Horizontal = Vertical.cross(obj.AP.Direction).normalize()
-        point = obj.selectedPoint
+        Horizontal, Vertical = getPlaneAxes(obj.AP)
+        point = obj.selectedPoint if selectedPoint == None else selectedPoint
         d = point.distanceToPlane(obj.p1, obj.Direction)
         if obj.circumferenceBool:
             P3 = point + obj.Direction * (-d)
@@ -295,7 +406,7 @@ def getPointsToPlot(obj):
         segments = [0,1,2]
         existGT = True
         if obj.GT <> []:
-            points, segments = getPointsToPlotGT(obj, points, segments, Vertical, Horizontal)
+            points, segments = getPointsToPlotGT(obj, points, segments, Vertical, Horizontal, texts)
         else:
             existGT = False
         if obj.DF <> None:
@@ -303,11 +414,11 @@ def getPointsToPlot(obj):
         segments = segments + []
     return points, segments
 
-def getPointsToPlotGT(obj, points, segments, Vertical, Horizontal):
+def getPointsToPlotGT(obj, points, segments, Vertical, Horizontal, texts=None):
     newPoints = points
     newSegments = segments
-    if obj.ViewObject.LineScale > 0:
-        sizeOfLine = obj.ViewObject.LineScale
+    if getStyleValue(obj,"LineScale") > 0:
+        sizeOfLine = getStyleValue(obj,"LineScale")
     else:
         sizeOfLine = 1.0
     for i in range(len(obj.GT)):
@@ -319,7 +430,15 @@ def getPointsToPlotGT(obj, points, segments, Vertical, Horizontal):
         P1 = P0 + Vertical * (-sizeOfLine*2)
         P2 = P0 + Horizontal * (sizeOfLine*2)
         P3 = P1 + Horizontal * (sizeOfLine*2)
-        lengthToleranceValue = len(stringencodecoin(displayExternal(obj.GT[i].ToleranceValue, obj.ViewObject.Decimals, 'Length', obj.ViewObject.ShowUnit)))
+        text = stringencodecoin(displayExternal(obj.GT[i].ToleranceValue, getStyleValue(obj,"Decimals"), 'Length', getStyleValue(obj,"ShowUnit")))
+        if texts <> None:
+            texts.append(text)
+        width = getTextWidth(text, getStyleValue(obj,"FontName"), getStyleValue(obj,"FontSize"))
+        if width == None:
+            lengthToleranceValue = len(text)
+        else:
+            # measured width plus half a cell of margin on each side
+            lengthToleranceValue = width/sizeOfLine + 1
         if obj.GT[i].FeatureControlFrameIcon <> '':
             lengthToleranceValue += 2
         if obj.GT[i].Circumference:
@@ -368,8 +487,8 @@ def getPointsToPlotDF(obj, existGT, points, segments, Vertical, Horizontal):
     d = len(points)
     newPoints = points
     newSegments = segments
-    if obj.ViewObject.LineScale > 0:
-        sizeOfLine = obj.ViewObject.LineScale
+    if getStyleValue(obj,"LineScale") > 0:
+        sizeOfLine = getStyleValue(obj,"LineScale")
     else:
         sizeOfLine = 1.0
     if not existGT:
@@ -398,10 +517,10 @@ def getPointsToPlotDF(obj, existGT, points, segments, Vertical, Horizontal):
     newSegments = newSegments + [-1, 0+d, 2+d, -1, 1+d, 2+d, 3+d, 4+d, 5+d, 6+d, 7+d, 3+d]
     return newPoints, newSegments
 
-def plotStrings(self, fp, points):
+def plotStrings(self, fp, points, texts=None):
     import DraftGeomUtils
-    if fp.ViewObject.LineScale > 0:
-        sizeOfLine = fp.ViewObject.LineScale
+    if getStyleValue(fp,"LineScale") > 0:
+        sizeOfLine = getStyleValue(fp,"LineScale")
     else:
         sizeOfLine = 1.0
     X = FreeCAD.Vector(1.0,0.0,0.0)
@@ -475,7 +594,11 @@ def plotStrings(self, fp, points):
                 self.svg[indexIcon].filename = str(filename)
                 indexIcon+=1
 
-            self.textGT[index].string = self.textGT3d[index].string = stringencodecoin(displayExternal(fp.GT[i].ToleranceValue, fp.ViewObject.Decimals, 'Length', fp.ViewObject.ShowUnit))
+            if texts:
+                text = texts[i]
+            else:
+                text = stringencodecoin(displayExternal(fp.GT[i].ToleranceValue, getStyleValue(fp,"Decimals"), 'Length', getStyleValue(fp,"ShowUnit")))
+            self.textGT[index].string = self.textGT3d[index].string = text
             self.textGTpos[index].translation.setValue([posToleranceValue.x, posToleranceValue.y, posToleranceValue.z])
             self.textGT[index].justification = coin.SoAsciiText.CENTER
             index+=1
@@ -525,9 +648,9 @@ def plotStrings(self, fp, points):
             self.textGT[index].justification = coin.SoAsciiText.LEFT
             self.textGTpos[index].translation.setValue([posDiameterTolerance.x, posDiameterTolerance.y, posDiameterTolerance.z])
             if fp.toleranceSelectBool:
-                text = stringencodecoin(displayExternal(fp.diameter, fp.ViewObject.Decimals, 'Length', fp.ViewObject.ShowUnit) + stringplusminus() + displayExternal(fp.toleranceDiameter, fp.ViewObject.Decimals, 'Length', fp.ViewObject.ShowUnit))
+                text = stringencodecoin(displayExternal(fp.diameter, getStyleValue(fp,"Decimals"), 'Length', getStyleValue(fp,"ShowUnit")) + stringplusminus() + displayExternal(fp.toleranceDiameter, getStyleValue(fp,"Decimals"), 'Length', getStyleValue(fp,"ShowUnit")))
             else:
-                text = stringencodecoin(displayExternal(fp.lowLimit, fp.ViewObject.Decimals, 'Length', fp.ViewObject.ShowUnit) + ' - ' + displayExternal(fp.highLimit, fp.ViewObject.Decimals, 'Length', fp.ViewObject.ShowUnit))
+                text = stringencodecoin(displayExternal(fp.lowLimit, getStyleValue(fp,"Decimals"), 'Length', getStyleValue(fp,"ShowUnit")) + ' - ' + displayExternal(fp.highLimit, getStyleValue(fp,"Decimals"), 'Length', getStyleValue(fp,"ShowUnit")))
             self.textGT[index].string = self.textGT3d[index].string = text
             index+=1
         for i in range(index):
@@ -600,6 +723,652 @@ def plotStrings(self, fp, points):
                 pass
             index+=1
 
+#---------------------------------------------------------------------------
+# Face signatures
+#---------------------------------------------------------------------------
+
+# a face reference is kept if its face still matches its signature this well
+keepConfidence = 0.9
+# and it is moved to another face only if that one matches at least this well
+rebindConfidence = 0.5
+
+def getFaceSignature(face):
+    "getFaceSignature(face): returns a (surface type, area, centroid, direction, radius) tuple describing a face"
+    surface = face.Surface
+    if hasattr(surface,"Axis"):
+        direction = surface.Axis
+    else:
+        direction = face.normalAt(0,0)
+    radius = getattr(surface,"Radius",0.0)
+    c = face.CenterOfMass
+    return (type(surface).__name__, face.Area, c.x, c.y, c.z, direction.x, direction.y, direction.z, float(radius))
+
+def signatureToString(signature):
+    return ';'.join([signature[0]] + [repr(l) for l in signature[1:]])
+
+def stringToSignature(text):
+    values = text.split(';')
+    return tuple([values[0]] + [float(l) for l in values[1:]])
+
+def compareFaceSignatures(a, b, scale):
+    "compareFaceSignatures(a,b,scale): returns a 0 to 1 score of how well two face signatures match, scale is the length of a large displacement"
+    if a[0] <> b[0]:
+        return 0.0
+    area = min(a[1],b[1])/max(a[1],b[1]) if max(a[1],b[1]) > 0 else 1.0
+    d2 = (a[2]-b[2])**2 + (a[3]-b[3])**2 + (a[4]-b[4])**2
+    position = 1.0/(1.0 + d2/(scale*scale))
+    direction = abs(a[5]*b[5] + a[6]*b[6] + a[7]*b[7])
+    radius = min(a[8],b[8])/max(a[8],b[8]) if min(a[8],b[8]) > 0 else (1.0 if a[8] == b[8] else 0.0)
+    return area*position*direction*radius
+
+def getAreaBucket(area):
+    # buckets of 5% of area
+    return int(math.floor(math.log(area)/math.log(1.05))) if area > 0 else 0
+
+class FaceSignatureIndex:
+    "Signatures of the faces of a shape bucketed by surface type and area"
+    def __init__(self, shape):
+        self.signatures = []
+        self.buckets = {}
+        self.types = {}
+        for i, face in enumerate(shape.Faces):
+            signature = getFaceSignature(face)
+            self.signatures.append(signature)
+            self.buckets.setdefault((signature[0], getAreaBucket(signature[1])), []).append(i)
+            self.types.setdefault(signature[0], []).append(i)
+        self.scale = max(shape.BoundBox.DiagonalLength*0.05, 1e-6)
+
+    def match(self, signature):
+        '''match(signature): returns the (face name, confidence) of the face that best
+        matches a signature, looking first in its area bucket and the neighbouring ones'''
+        k = getAreaBucket(signature[1])
+        candidates = []
+        for b in [k-1, k, k+1]:
+            candidates.extend(self.buckets.get((signature[0], b), []))
+        best = (None, 0.0)
+        for i in candidates:
+            score = compareFaceSignatures(signature, self.signatures[i], self.scale)
+            if score > best[1]:
+                best = ('Face'+str(i+1), score)
+        if best[1] < keepConfidence:
+            for i in self.types.get(signature[0], []):
+                score = compareFaceSignatures(signature, self.signatures[i], self.scale)
+                if score > best[1]:
+                    best = ('Face'+str(i+1), score)
+        return best
+
+    def getSignature(self, sub):
+        "getSignature(sub): returns the signature of a 'FaceN' subelement or None if it does not exist"
+        if not sub.startswith('Face') or not sub[4:].isdigit() or not 0 < int(sub[4:]) <= len(self.signatures):
+            return None
+        return self.signatures[int(sub[4:])-1]
+
+# object name -> (shape hash code, FaceSignatureIndex)
+faceSignatureIndexes = {}
+
+def getFaceSignatureIndex(obj):
+    "getFaceSignatureIndex(obj): returns the face signature index of the shape of an object, rebuilt only when the shape changes"
+    key = (obj.Document.Name, obj.Name)
+    code = obj.Shape.hashCode()
+    if not key in faceSignatureIndexes or faceSignatureIndexes[key][0] <> code:
+        faceSignatureIndexes[key] = (code, FaceSignatureIndex(obj.Shape))
+    return faceSignatureIndexes[key][1]
+
+def getFaceLinks(faces):
+    "getFaceLinks(faces): returns a list of (object, subelement) pairs from a link or a list of links"
+    if faces and not isinstance(faces, list):
+        faces = [faces]
+    links = []
+    for link in faces or []:
+        subs = link[1]
+        if isinstance(subs, str):
+            subs = [subs]
+        for sub in subs:
+            links.append((link[0], sub))
+    return links
+
+def getFaceSignatures(faces):
+    "getFaceSignatures(faces): returns the signatures, as strings, of the linked faces"
+    signatures = []
+    for link in getFaceLinks(faces):
+        signature = getFaceSignatureIndex(link[0]).getSignature(link[1])
+        signatures.append(signatureToString(signature) if signature <> None else '')
+    return signatures
+
+def rebindFaces(obj):
+    '''rebindFaces(obj): re-resolves the face references of an annotation or annotation plane
+    whose faces no longer match their stored signatures, returns the new list of
+    (object, subelement) links and the lowest confidence of the matches'''
+    links = getFaceLinks(obj.faces)
+    confidence = 1.0
+    newLinks = []
+    for i, link in enumerate(links):
+        sub = link[1]
+        if i < len(obj.faceSignatures) and obj.faceSignatures[i] <> '':
+            stored = stringToSignature(obj.faceSignatures[i])
+            index = getFaceSignatureIndex(link[0])
+            current = index.getSignature(sub)
+            score = compareFaceSignatures(stored, current, index.scale) if current <> None else 0.0
+            if score < keepConfidence:
+                match, matchScore = index.match(stored)
+                if match <> None and matchScore > score and matchScore >= rebindConfidence:
+                    if match <> sub:
+                        FreeCAD.Console.PrintWarning(obj.Label + ": " + link[0].Label + "." + sub + " re-bound to " + match + " (confidence " + str(round(matchScore,2)) + ")\n")
+                    sub, score = match, matchScore
+                else:
+                    FreeCAD.Console.PrintWarning(obj.Label + ": no face of " + link[0].Label + " matches " + sub + "\n")
+            confidence = min(confidence, score)
+        newLinks.append((link[0], sub))
+    return newLinks, confidence
+
+# objects whose faces are being re-bound by updateFaceBinding
+bindingObjects = set()
+
+def resetFaceSignatures(obj):
+    '''resetFaceSignatures(obj): makes the faces of an object the reference of its signatures after
+    they were edited, so that the next recompute keeps the edit instead of re-binding it'''
+    if not hasattr(obj,"faceSignatures") or 'Restore' in getattr(obj,"State",[]):
+        return
+    if (obj.Document.Name, obj.Name) in bindingObjects:
+        return
+    obj.faceSignatures = getFaceSignatures(obj.faces)
+
+def updateFaceBinding(obj):
+    "updateFaceBinding(obj): re-binds the faces of an object if they changed and refreshes their signatures"
+    if not hasattr(obj,"faceSignatures"):
+        obj.addProperty("App::PropertyStringList","faceSignatures","GDT","Geometric signatures of the linked faces, used to find them again after topology changes")
+        obj.addProperty("App::PropertyFloat","facesConfidence","GDT","How well the linked faces match their signatures, from 0 to 1").facesConfidence = 1.0
+        obj.setEditorMode('faceSignatures',2)
+        obj.setEditorMode('facesConfidence',1)
+        obj.faceSignatures = getFaceSignatures(obj.faces)
+        return
+    links, confidence = rebindFaces(obj)
+    if [l[1] for l in links] <> [l[1] for l in getFaceLinks(obj.faces)]:
+        bindingObjects.add((obj.Document.Name, obj.Name))
+        try:
+            if getType(obj) == "AnnotationPlane":
+                obj.faces = (links[0][0], links[0][1])
+            else:
+                obj.faces = links
+        finally:
+            bindingObjects.discard((obj.Document.Name, obj.Name))
+    obj.faceSignatures = getFaceSignatures(obj.faces)
+    obj.facesConfidence = confidence
+
+#---------------------------------------------------------------------------
+# Face patterns
+#---------------------------------------------------------------------------
+
+def getFaceTable(shape):
+    '''getFaceTable(shape): returns numpy arrays of the surface kind (0 other, 1 plane,
+    2 cylinder), area, perimeter, number of edges, radius and axis or normal of the
+    faces of a shape'''
+    n = len(shape.Faces)
+    kind = numpy.zeros(n, dtype=numpy.int64)
+    values = numpy.zeros((n, 7))
+    for i, face in enumerate(shape.Faces):
+        surface = face.Surface
+        name = type(surface).__name__
+        if name == "Plane":
+            kind[i] = 1
+            direction = face.normalAt(0,0)
+        elif name == "Cylinder":
+            kind[i] = 2
+            direction = surface.Axis
+            values[i,3] = surface.Radius
+        else:
+            continue
+        values[i,0] = face.Area
+        values[i,1] = sum([l.Length for l in face.Edges])
+        values[i,2] = len(face.Edges)
+        values[i,4:7] = [direction.x, direction.y, direction.z]
+    return kind, values
+
+def groupRows(keys):
+    "groupRows(keys): returns the lists of row indices of an integer array that have equal rows"
+    if len(keys) == 0:
+        return []
+    order = numpy.lexsort(keys.T[::-1])
+    ordered = keys[order]
+    starts = numpy.concatenate(([0], numpy.nonzero(numpy.any(numpy.diff(ordered, axis=0) <> 0, axis=1))[0] + 1, [len(keys)]))
+    return [order[starts[i]:starts[i+1]] for i in range(len(starts)-1)]
+
+def findFacePatterns(obj, tolerance=1e-3, angularTolerance=1e-4):
+    '''findFacePatterns(obj,[tolerance],[angularTolerance]): returns the groups of equivalent
+    faces of the shape of an object, as sorted lists of (object, 'FaceN') links. Cylinders are
+    equivalent if they have the same radius, length and axis direction, planar faces if they
+    have the same normal, area, perimeter and number of edges'''
+    kind, values = getFaceTable(obj.Shape)
+    direction = values[:,4:7]
+    # the sign of an axis is arbitrary, make its largest component positive
+    largest = numpy.argmax(numpy.abs(direction), axis=1)
+    sign = numpy.sign(direction[numpy.arange(len(direction)), largest])
+    sign[sign == 0] = 1
+    direction = direction * sign[:,None]
+    linear = numpy.round(values[:,0:4] / numpy.array([tolerance, tolerance, 1.0, tolerance]))
+    angular = numpy.round(direction / angularTolerance)
+    keys = numpy.column_stack((kind, linear, angular)).astype(numpy.int64)
+    groups = []
+    supported = numpy.nonzero(kind > 0)[0]
+    for rows in groupRows(keys[supported]):
+        if len(rows) > 1:
+            groups.append(sorted([(obj, 'Face'+str(i+1)) for i in supported[rows]]))
+    groups.sort(key=lambda l: -len(l))
+    return groups
+
+def getPatternOfFace(obj, sub, groups=None):
+    "getPatternOfFace(obj,sub,[groups]): returns the group of faces equivalent to a face, or only the face if it is not in a pattern"
+    if groups == None:
+        groups = findFacePatterns(obj)
+    for group in groups:
+        if (obj, sub) in group:
+            return group
+    return [(obj, sub)]
+
+def getPatternContainers(obj):
+    "getPatternContainers(obj): returns a ContainerOfData for each face pattern of an object, ready to be annotated"
+    return [ContainerOfData(l) for l in findFacePatterns(obj)]
+
+def selectFacePatterns():
+    "selectFacePatterns(): extends the selected faces to the face patterns they belong to"
+    groups = {}
+    faces = []
+    for l in getSelectionEx():
+        for sub in l.SubElementNames:
+            if not l.Object.Name in groups:
+                groups[l.Object.Name] = findFacePatterns(l.Object)
+            for link in getPatternOfFace(l.Object, sub, groups[l.Object.Name]):
+                if not link in faces:
+                    faces.append(link)
+    FreeCADGui.Selection.clearSelection()
+    for link in faces:
+        FreeCADGui.Selection.addSelection(link[0], link[1])
+    return faces
+
+#---------------------------------------------------------------------------
+# Spatial index of annotation frames
+#---------------------------------------------------------------------------
+
+def getPlaneAxes(AP):
+    "getPlaneAxes(AP): returns the horizontal and vertical directions along which the frames of an annotation plane are drawn"
+    X = FreeCAD.Vector(1.0,0.0,0.0)
+    Y = FreeCAD.Vector(0.0,1.0,0.0)
+    Direction = X if abs(X.dot(AP.Direction)) < 0.8 else Y
+    Vertical = AP.Direction.cross(Direction).normalize()
+    Horizontal = Vertical.cross(AP.Direction).normalize()
+    return Horizontal, Vertical
+
+def getFrameKey(obj):
+    "getFrameKey(obj): returns a tuple of the data that determines the frame of an annotation"
+    GT = []
+    for l in obj.GT:
+        DS = l.DS
+        datums = 0 if DS == None else len([d for d in [DS.Primary, DS.Secondary, DS.Tertiary] if d <> None])
+        GT.append((l.Name, l.ToleranceValue, l.FeatureControlFrameIcon, l.Circumference, datums))
+    return (tuple(obj.selectedPoint), tuple(obj.p1), obj.circumferenceBool, obj.DF <> None, tuple(GT), getStyleValue(obj,"LineScale"))
+
+def intersectRects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def intersectSegmentRect(p, q, rect):
+    "intersectSegmentRect(p,q,rect): checks if the 2D segment pq crosses the inside of a (umin,vmin,umax,vmax) rectangle"
+    t0, t1 = 0.0, 1.0
+    d = (q[0]-p[0], q[1]-p[1])
+    for k, lower, upper in [(0, rect[0], rect[2]), (1, rect[1], rect[3])]:
+        if abs(d[k]) < 1e-12:
+            if p[k] <= lower or p[k] >= upper:
+                return False
+        else:
+            a = (lower - p[k]) / d[k]
+            b = (upper - p[k]) / d[k]
+            if a > b:
+                a, b = b, a
+            t0, t1 = max(t0, a), min(t1, b)
+            if t0 >= t1:
+                return False
+    return True
+
+def intersectSegments(p, q, r, s):
+    "intersectSegments(p,q,r,s): checks if the 2D segments pq and rs properly cross each other"
+    def orientation(a, b, c):
+        return (b[0]-a[0])*(c[1]-a[1]) - (b[1]-a[1])*(c[0]-a[0])
+    return orientation(p,q,r)*orientation(p,q,s) < 0 and orientation(r,s,p)*orientation(r,s,q) < 0
+
+class FrameIndex:
+    '''Uniform grid of the frame rectangles and leaders of the annotations of
+    an annotation plane, in (u,v) coordinates along the plane axes. Frames are
+    about two lines high, so cells a few lines wide keep the number of frames
+    per cell small.'''
+    def __init__(self, AP, cellSize=None):
+        self.AP = AP
+        self.origin = FreeCAD.Vector(AP.PointWithOffset)
+        self.Horizontal, self.Vertical = getPlaneAxes(AP)
+        self.direction = FreeCAD.Vector(AP.Direction)
+        if cellSize == None:
+            cellSize = getStyleValue(AP,"LineScale")*4
+        self.cellSize = cellSize if cellSize > 0 else 4.0
+        self.cells = {}
+        self.leaderCells = {}
+        self.rects = {}
+        self.leaders = {}
+        self.keys = {}
+
+    def toPlane(self, point):
+        "toPlane(point): returns the (u,v) coordinates of a 3D point projected on the plane"
+        d = point - self.origin
+        return (d.dot(self.Horizontal), d.dot(self.Vertical))
+
+    def fromPlane(self, u, v):
+        "fromPlane(u,v): returns the 3D point of the plane at the given coordinates"
+        return self.origin + self.Horizontal*u + self.Vertical*v
+
+    def getCells(self, rect):
+        c = self.cellSize
+        i0, i1 = int(math.floor(rect[0]/c)), int(math.floor(rect[2]/c))
+        j0, j1 = int(math.floor(rect[1]/c)), int(math.floor(rect[3]/c))
+        return [(i,j) for i in range(i0, i1+1) for j in range(j0, j1+1)]
+
+    def insert(self, name, rect, leader=[]):
+        "insert(name,rect,[leader]): adds or moves the frame of an annotation"
+        self.remove(name)
+        self.rects[name] = rect
+        self.leaders[name] = leader
+        for cell in self.getCells(rect):
+            self.cells.setdefault(cell, set()).add(name)
+        for cell in self.getLeaderCells(leader):
+            self.leaderCells.setdefault(cell, set()).add(name)
+
+    def remove(self, name):
+        "remove(name): removes the frame of an annotation from the index"
+        if not name in self.rects:
+            return
+        for cell in self.getCells(self.rects.pop(name)):
+            self.cells[cell].discard(name)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        for cell in self.getLeaderCells(self.leaders.pop(name)):
+            self.leaderCells[cell].discard(name)
+            if not self.leaderCells[cell]:
+                del self.leaderCells[cell]
+        self.keys.pop(name, None)
+
+    def getSegmentRect(self, p, q):
+        return (min(p[0],q[0]), min(p[1],q[1]), max(p[0],q[0]), max(p[1],q[1]))
+
+    def getLeaderCells(self, leader):
+        cells = set()
+        for k in range(len(leader)-1):
+            cells.update(self.getCells(self.getSegmentRect(leader[k], leader[k+1])))
+        return cells
+
+    def updateAnnotation(self, obj, points=None):
+        '''updateAnnotation(obj,[points]): indexes the frame of an annotation from
+        its computed layout, the layout is computed if points is not given'''
+        if not obj.spBool or (obj.GT == [] and obj.DF == None):
+            self.remove(obj.Name)
+            return
+        rect, leader = self.getFrame(obj, points=points)
+        self.insert(obj.Name, rect, leader)
+        self.keys[obj.Name] = getFrameKey(obj)
+
+    def getFrame(self, obj, selectedPoint=None, points=None):
+        '''getFrame(obj,[selectedPoint],[points]): returns the frame rectangle and the
+        leader of an annotation placed at its selected point or at the given one'''
+        if points == None:
+            points = getPointsToPlot(obj, selectedPoint=selectedPoint)[0]
+        coords = [self.toPlane(p) for p in points]
+        frame = coords[3:]
+        rect = (min([p[0] for p in frame]), min([p[1] for p in frame]), max([p[0] for p in frame]), max([p[1] for p in frame]))
+        return rect, coords[:3]
+
+    def isLeaderFree(self, leader, exclude=None):
+        "isLeaderFree(leader,[exclude]): checks that a leader crosses no indexed frame or leader"
+        for k in range(len(leader)-1):
+            p, q = leader[k], leader[k+1]
+            for cell in self.getCells(self.getSegmentRect(p, q)):
+                for other in self.cells.get(cell, ()):
+                    if other <> exclude and intersectSegmentRect(p, q, self.rects[other]):
+                        return False
+                for other in self.leaderCells.get(cell, ()):
+                    if other <> exclude:
+                        otherLeader = self.leaders[other]
+                        for m in range(len(otherLeader)-1):
+                            if intersectSegments(p, q, otherLeader[m], otherLeader[m+1]):
+                                return False
+        return True
+
+    def refresh(self):
+        "refresh(): indexes the annotations of the plane that were added or changed since the last refresh"
+        if not self.direction.isEqual(self.AP.Direction, 1e-9) or not self.origin.isEqual(self.AP.PointWithOffset, 1e-9):
+            self.__init__(self.AP, self.cellSize)
+        names = set()
+        for obj in getAnnotationsOfPlane(self.AP):
+            names.add(obj.Name)
+            if self.keys.get(obj.Name) <> getFrameKey(obj):
+                self.updateAnnotation(obj)
+        for name in list(self.rects):
+            if not name in names:
+                self.remove(name)
+
+    def query(self, rect, exclude=None):
+        "query(rect,[exclude]): returns the names of the frames that overlap a rectangle"
+        found = set()
+        for cell in self.getCells(rect):
+            for name in self.cells.get(cell, ()):
+                if name <> exclude and not name in found and intersectRects(rect, self.rects[name]):
+                    found.add(name)
+        return found
+
+    def getOverlaps(self):
+        "getOverlaps(): returns the sorted pairs of names of overlapping frames"
+        pairs = set()
+        for names in self.cells.values():
+            names = sorted(names)
+            for i in range(len(names)):
+                for j in range(i+1, len(names)):
+                    if intersectRects(self.rects[names[i]], self.rects[names[j]]):
+                        pairs.add((names[i], names[j]))
+        return sorted(pairs)
+
+    def getLeaderCrossings(self):
+        '''getLeaderCrossings(): returns the sorted (leader, other) pairs of names where
+        the leader of an annotation crosses the frame or the leader of another one'''
+        pairs = set()
+        for name, leader in self.leaders.items():
+            for k in range(len(leader)-1):
+                p, q = leader[k], leader[k+1]
+                cells = self.getCells(self.getSegmentRect(p, q))
+                for cell in cells:
+                    for other in self.cells.get(cell, ()):
+                        if other <> name and intersectSegmentRect(p, q, self.rects[other]):
+                            pairs.add((name, other))
+                    for other in self.leaderCells.get(cell, ()):
+                        if other <> name and not (name, other) in pairs:
+                            otherLeader = self.leaders[other]
+                            for m in range(len(otherLeader)-1):
+                                if intersectSegments(p, q, otherLeader[m], otherLeader[m+1]):
+                                    pairs.add((name, other))
+                                    break
+        return sorted(pairs)
+
+    def findFreeSpace(self, rect, exclude=None, step=None, maxRings=50, leader=None):
+        '''findFreeSpace(rect,[exclude],[step],[maxRings],[leader]): returns the (du,dv) shift
+        closest to zero that moves the rectangle to a place where it overlaps no frame,
+        or None if there is no such place within maxRings steps. If a leader is given
+        its last point moves with the rectangle and it must not cross anything either,
+        unless no such place exists.'''
+        if step == None:
+            step = self.cellSize/2
+        fallback = None
+        for ring in range(maxRings+1):
+            candidates = []
+            for i in range(-ring, ring+1):
+                for j in range(-ring, ring+1):
+                    if max(abs(i), abs(j)) == ring:
+                        candidates.append((i*i+j*j, i, j))
+            candidates.sort()
+            for distance, i, j in candidates:
+                shifted = (rect[0]+i*step, rect[1]+j*step, rect[2]+i*step, rect[3]+j*step)
+                if not self.query(shifted, exclude):
+                    if leader == None:
+                        return (i*step, j*step)
+                    end = (leader[-1][0]+i*step, leader[-1][1]+j*step)
+                    if self.isLeaderFree([leader[0], end], exclude):
+                        return (i*step, j*step)
+                    if fallback == None:
+                        fallback = (i*step, j*step)
+        return fallback
+
+# (document name, annotation plane name) -> FrameIndex
+frameIndexes = {}
+
+def getFrameIndex(AP):
+    "getFrameIndex(AP): returns the up to date frame index of an annotation plane, creating it if needed"
+    key = (AP.Document.Name, AP.Name)
+    if not key in frameIndexes:
+        frameIndexes[key] = FrameIndex(AP)
+    frameIndexes[key].refresh()
+    return frameIndexes[key]
+
+def selectOverlappingAnnotations(AP):
+    "selectOverlappingAnnotations(AP): selects the annotations of a plane whose frames overlap or whose leaders cross"
+    index = getFrameIndex(AP)
+    names = set()
+    for pair in index.getOverlaps() + index.getLeaderCrossings():
+        names.update(pair)
+    FreeCADGui.Selection.clearSelection()
+    for name in sorted(names):
+        FreeCADGui.Selection.addSelection(AP.Document.getObject(name))
+    FreeCAD.Console.PrintMessage(str(len(names)) + " annotations with overlapping frames or crossing leaders\n")
+
+#---------------------------------------------------------------------------
+# Automatic placement of annotation frames
+#---------------------------------------------------------------------------
+
+def getInitialPlacement(index, obj, center, distance):
+    "getInitialPlacement(index,obj,center,distance): returns the (u,v) point where an annotation would be placed with nothing around it"
+    anchor = index.toPlane(obj.p1)
+    du, dv = anchor[0]-center[0], anchor[1]-center[1]
+    length = math.sqrt(du*du + dv*dv)
+    if length < 1e-9:
+        du, dv, length = 1.0, 1.0, math.sqrt(2.0)
+    return (anchor[0] + du/length*distance, anchor[1] + dv/length*distance)
+
+def placeAnnotation(index, obj, point):
+    '''placeAnnotation(index,obj,point): moves an annotation from the given (u,v) point
+    to the nearest place where its frame is free, indexes it and returns its selected point'''
+    selectedPoint = index.fromPlane(point[0], point[1])
+    rect, leader = index.getFrame(obj, selectedPoint)
+    shift = index.findFreeSpace(rect, obj.Name, leader=[leader[0], (point[0], point[1])])
+    if shift <> None and shift <> (0.0, 0.0):
+        selectedPoint = index.fromPlane(point[0]+shift[0], point[1]+shift[1])
+        rect, leader = index.getFrame(obj, selectedPoint)
+    index.insert(obj.Name, rect, leader)
+    return selectedPoint
+
+def untangleLeaders(index, objects, placed, maxPasses=3):
+    '''untangleLeaders(index,objects,placed,[maxPasses]): swaps the selected points in
+    placed of the given annotations whose leaders cross, when the swap leaves both
+    leaders and frames free'''
+    objects = dict([(l.Name, l) for l in objects])
+    for n in range(maxPasses):
+        swapped = False
+        for a, b in index.getLeaderCrossings():
+            if not a in objects or not b in objects or not a in index.rects or not b in index.rects:
+                continue
+            oldA = (index.rects[a], index.leaders[a])
+            oldB = (index.rects[b], index.leaders[b])
+            index.remove(a)
+            index.remove(b)
+            rectA2, leaderA2 = index.getFrame(objects[a], placed[b])
+            rectB2, leaderB2 = index.getFrame(objects[b], placed[a])
+            free = not index.query(rectA2) and not index.query(rectB2) and not intersectRects(rectA2, rectB2)
+            free = free and index.isLeaderFree(leaderA2) and index.isLeaderFree(leaderB2)
+            free = free and not intersectSegments(leaderA2[0], leaderA2[-1], leaderB2[0], leaderB2[-1])
+            if free:
+                placed[a], placed[b] = placed[b], placed[a]
+                index.insert(a, rectA2, leaderA2)
+                index.insert(b, rectB2, leaderB2)
+                swapped = True
+            else:
+                index.insert(a, oldA[0], oldA[1])
+                index.insert(b, oldB[0], oldB[1])
+        if not swapped:
+            break
+
+def placeAnnotations(AP, onlyNew=False):
+    '''placeAnnotations(AP,[onlyNew]): computes the selected points of the annotations of a
+    plane so that their frames do not overlap and their leaders are short and do not cross.
+    With onlyNew only the annotations without a selected point are placed, around the
+    fixed ones. Returns the number of placed annotations.'''
+    index = getFrameIndex(AP)
+    annotations = [l for l in getAnnotationsOfPlane(AP) if l.GT <> [] or l.DF <> None]
+    if onlyNew:
+        toPlace = [l for l in annotations if not l.spBool]
+    else:
+        toPlace = annotations
+    if toPlace == []:
+        return 0
+    for l in toPlace:
+        index.remove(l.Name)
+    anchors = [index.toPlane(l.p1) for l in annotations]
+    center = (sum([l[0] for l in anchors])/len(anchors), sum([l[1] for l in anchors])/len(anchors))
+    distance = index.cellSize
+    # annotations far from the center first, they have the least room to move
+    initial = [(getInitialPlacement(index, l, center, distance), l) for l in toPlace]
+    initial.sort(key=lambda l: -((l[0][0]-center[0])**2 + (l[0][1]-center[1])**2))
+    # annotation name -> selected point
+    placed = {}
+    for point, obj in initial:
+        placed[obj.Name] = placeAnnotation(index, obj, point)
+    untangleLeaders(index, toPlace, placed)
+    for obj in toPlace:
+        obj.selectedPoint = placed[obj.Name]
+        obj.spBool = True
+        index.keys[obj.Name] = getFrameKey(obj)
+    refreshAnnotations()
+    return len(toPlace)
+
+#---------------------------------------------------------------------------
+# Font metrics
+#---------------------------------------------------------------------------
+
+# rendered widths of texts, keyed by (FontName, FontSize, text)
+glyphMetricsCache = {}
+
+def getTextWidth(text, fontName, fontSize):
+    '''getTextWidth(text,fontName,fontSize): returns the width of a text rendered
+    with the given font, or None if it can not be measured. Each distinct text
+    and font is only measured once.'''
+    key = (fontName, fontSize, text)
+    if key not in glyphMetricsCache:
+        glyphMetricsCache[key] = measureTextWidth(text, fontName, fontSize)
+    return glyphMetricsCache[key]
+
+def measureTextWidth(text, fontName, fontSize):
+    "measureTextWidth(text,fontName,fontSize): returns the width of the bounding box of the text as rendered by coin"
+    if text == "":
+        return 0.0
+    try:
+        root = coin.SoSeparator()
+        root.ref()
+        font = coin.SoFont()
+        font.name = str(fontName)
+        font.size = fontSize
+        asciiText = coin.SoAsciiText()
+        asciiText.string = text
+        root.addChild(font)
+        root.addChild(asciiText)
+        action = coin.SoGetBoundingBoxAction(coin.SbViewportRegion())
+        action.apply(root)
+        box = action.getBoundingBox()
+        root.unref()
+        if box.isEmpty():
+            return None
+        return box.getMax().getValue()[0] - box.getMin().getValue()[0]
+    except:
+        return None
+
 #---------------------------------------------------------------------------
 # UNITS handling
 #---------------------------------------------------------------------------
@@ -737,28 +1506,97 @@ class _ViewProviderGDT:
 
 class _AnnotationPlane(_GDTObject):
     "The GDT AnnotationPlane object"
-    def __init__(self, obj):
+    def __init__(self, obj, faces=None):
         _GDTObject.__init__(self,obj,"AnnotationPlane")
+        if faces == None:
+            faces = (getSelectionEx()[0].Object, getSelectionEx()[0].SubElementNames[0])
         obj.addProperty("App::PropertyFloat","Offset","GDT","The offset value to aply in this annotation plane")
-        obj.addProperty("App::PropertyLinkSub","faces","GDT","Linked face of the object").faces = (getSelectionEx()[0].Object, getSelectionEx()[0].SubElementNames[0])
+        obj.addProperty("App::PropertyLinkSub","faces","GDT","Linked face of the object").faces = faces
         obj.addProperty("App::PropertyVectorDistance","p1","GDT","Center point of Grid").p1 = obj.faces[0].Shape.getElement(obj.faces[1][0]).CenterOfMass
         obj.addProperty("App::PropertyVector","Direction","GDT","The normal direction of this annotation plane").Direction = obj.faces[0].Shape.getElement(obj.faces[1][0]).normalAt(0,0)
         obj.addProperty("App::PropertyVectorDistance","PointWithOffset","GDT","Center point of Grid with offset applied")
+        obj.addProperty("App::PropertyLink","Style","GDT","Style used by the annotations of this annotation plane")
 
     def onChanged(self,vobj,prop):
         if hasattr(vobj,"PointWithOffset"):
             vobj.setEditorMode('PointWithOffset',1)
+        if prop in ["Direction","PointWithOffset"]:
+            invalidatePlaneIndex(vobj.Document)
+        if prop == "faces":
+            resetFaceSignatures(vobj)
+        if prop == "Style" and not 'Restore' in getattr(vobj,"State",[]):
+            # the annotations without a style of their own follow the one of their plane
+            for l in getAnnotationsOfPlane(vobj):
+                if getattr(l,"Style",None) == None:
+                    restyleAnnotation(l)
 
     def execute(self, fp):
         '''"Print a short message when doing a recomputation, this method is mandatory" '''
+        updateFaceBinding(fp)
         fp.p1 = fp.faces[0].Shape.getElement(fp.faces[1][0]).CenterOfMass
         fp.Direction = fp.faces[0].Shape.getElement(fp.faces[1][0]).normalAt(0,0)
+        fp.PointWithOffset = fp.p1 + fp.Direction * fp.Offset
 
 class _ViewProviderAnnotationPlane(_ViewProviderGDT):
     "A View Provider for the GDT AnnotationPlane object"
     def __init__(self, obj):
         _ViewProviderGDT.__init__(self,obj)
 
+    def attach(self, vobj):
+        "called on object creation"
+        from pivy import coin
+        self.Object = vobj.Object
+        # style nodes shared by all the annotations of this plane
+        self.lineColor = coin.SoBaseColor()
+        self.textColor = coin.SoBaseColor()
+        c = getRGBLine()
+        self.lineColor.rgb.setValue(c[0],c[1],c[2])
+        c = getRGBText()
+        self.textColor.rgb.setValue(c[0],c[1],c[2])
+        self.drawstyle = coin.SoDrawStyle()
+        self.drawstyle.style = coin.SoDrawStyle.LINES
+        self.drawstyle.lineWidth = getLineWidth()
+        self.font = coin.SoFont()
+        self.font3d = coin.SoFont()
+        self.font.size = getTextSize()
+        self.font3d.size = getTextSize()*100
+        self.font.name = self.font3d.name = str(getTextFamily())
+        # the annotations of this plane are attached under this group, so the
+        # Visibility of the plane shows or hides all of them at once
+        self.group = coin.SoSeparator()
+        self.group.renderCaching = coin.SoSeparator.ON
+        self.switch = coin.SoSwitch()
+        self.switch.whichChild = coin.SO_SWITCH_ALL
+        self.group.addChild(self.switch)
+        vobj.addDisplayMode(self.group,"Annotations")
+
+    def getDisplayModes(self, vobj):
+        return ["Annotations"]
+
+    def getDefaultDisplayMode(self):
+        return "Annotations"
+
+    def onChanged(self, vobj, prop):
+        if prop == "Visibility" and vobj.Visibility:
+            # flush the layouts deferred while the plane was hidden
+            for l in getAnnotationsOfPlane(vobj.Object):
+                if hasattr(l.ViewObject.Proxy,"built") and l.spBool:
+                    l.ViewObject.Proxy.flush(l)
+
+    def setupContextMenu(self, vobj, menu):
+        action = menu.addAction("Isolate annotations")
+        action.triggered.connect(lambda: isolateAnnotationPlane(vobj.Object))
+        action = menu.addAction("Show all annotation planes")
+        action.triggered.connect(lambda: showAllAnnotationPlanes(vobj.Object.Document))
+        action = menu.addAction("Select overlapping annotations")
+        action.triggered.connect(lambda: selectOverlappingAnnotations(vobj.Object))
+        action = menu.addAction("Place annotations automatically")
+        action.triggered.connect(lambda: placeAnnotations(vobj.Object))
+        action = menu.addAction("Place new annotations automatically")
+        action.triggered.connect(lambda: placeAnnotations(vobj.Object, onlyNew=True))
+        action = menu.addAction("Merge coincident annotation planes")
+        action.triggered.connect(lambda: mergeCoincidentAnnotationPlanes(vobj.Object.Document))
+
     def updateData(self, obj, prop):
         "called when the base object is changed"
         if prop in ["Point","Direction","Offset"]:
@@ -775,27 +1613,160 @@ class _ViewProviderAnnotationPlane(_ViewProviderGDT):
     def getIcon(self):
         return(":/dd/icons/annotationPlane.svg")
 
-def makeAnnotationPlane(Name, Offset):
+def getAnnotationsOfPlane(AP):
+    "getAnnotationsOfPlane(AP): returns a list of the annotation objects placed on the given annotation plane"
+    return [l for l in AP.InList if getType(l) == "Annotation" and l.AP == AP]
+
+def showAnnotationPlane(AP, show=True):
+    "showAnnotationPlane(AP,[show]): shows or hides all the annotations of the given annotation plane"
+    if gui:
+        AP.ViewObject.Visibility = show
+
+def isolateAnnotationPlane(AP):
+    "isolateAnnotationPlane(AP): shows the annotations of the given annotation plane and hides the rest"
+    for l in AP.Document.Objects:
+        if getType(l) == "AnnotationPlane":
+            showAnnotationPlane(l, l == AP)
+
+def showAllAnnotationPlanes(doc=None):
+    "showAllAnnotationPlanes([doc]): shows the annotations of every annotation plane"
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    for l in doc.Objects:
+        if getType(l) == "AnnotationPlane":
+            showAnnotationPlane(l)
+
+# planes closer than these are coincident
+planeTolerance = 1e-3
+planeAngularTolerance = 1e-4
+
+def getPlaneKey(direction, point):
+    '''getPlaneKey(direction,point): returns the (quantized normal, offset) key of the plane
+    through a point, with the normal oriented so that its largest component is positive'''
+    n = FreeCAD.Vector(direction).normalize()
+    components = [n.x, n.y, n.z]
+    largest = max(range(3), key=lambda i: abs(components[i]))
+    if components[largest] < 0:
+        n = n * -1
+    return (int(round(n.x/planeAngularTolerance)), int(round(n.y/planeAngularTolerance)), int(round(n.z/planeAngularTolerance))), n.dot(point)
+
+class PlaneIndex:
+    "Annotation planes of a document sorted by quantized normal and offset"
+    def __init__(self, doc):
+        self.doc = doc
+        self.entries = []
+        for l in doc.Objects:
+            if getType(l) == "AnnotationPlane":
+                normal, offset = getPlaneKey(l.Direction, l.PointWithOffset)
+                self.entries.append((normal, offset, l.Name))
+        self.entries.sort()
+
+    def getParallel(self, direction):
+        "getParallel(direction): returns the (offset, name) entries of the planes with the given normal, found by bisection"
+        normal = getPlaneKey(direction, FreeCAD.Vector())[0]
+        low = bisect.bisect_left(self.entries, (normal, -float('inf')))
+        high = bisect.bisect_right(self.entries, (normal, float('inf')))
+        return [(l[1], l[2]) for l in self.entries[low:high]]
+
+    def getCandidates(self, direction, point):
+        "getCandidates(direction,point): returns the planes parallel to a plane through a point, nearest first"
+        offset = getPlaneKey(direction, point)[1]
+        candidates = sorted([(abs(l[0]-offset), l[1]) for l in self.getParallel(direction)])
+        return [self.doc.getObject(l[1]) for l in candidates if self.doc.getObject(l[1]) <> None]
+
+    def getCoincident(self):
+        "getCoincident(): returns the groups of coincident annotation planes"
+        groups = []
+        group = []
+        for i, entry in enumerate(self.entries):
+            if group and (entry[0] <> group[-1][0] or entry[1] - group[-1][1] > planeTolerance):
+                if len(group) > 1:
+                    groups.append(group)
+                group = []
+            group.append(entry)
+        if len(group) > 1:
+            groups.append(group)
+        return [[self.doc.getObject(l[2]) for l in group if self.doc.getObject(l[2]) <> None] for group in groups]
+
+# document name -> PlaneIndex, dropped when an annotation plane moves
+planeIndexes = {}
+
+def getPlaneIndex(doc=None):
+    "getPlaneIndex([doc]): returns the plane index of a document, building it if needed"
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    if not doc.Name in planeIndexes:
+        planeIndexes[doc.Name] = PlaneIndex(doc)
+    return planeIndexes[doc.Name]
+
+def invalidatePlaneIndex(doc):
+    planeIndexes.pop(doc.Name, None)
+
+def getAnnotationPlanesForFaces(faces):
+    '''getAnnotationPlanesForFaces(faces): returns all the annotation planes, those parallel to
+    the first face nearest first, followed by the rest in creation order'''
+    planes = getAllAnnotationPlaneObjects()
+    if not faces:
+        return planes
+    face = faces[0][0].Shape.getElement(faces[0][1])
+    try:
+        candidates = getPlaneIndex(faces[0][0].Document).getCandidates(face.normalAt(0,0), face.CenterOfMass)
+    except Exception:
+        return planes
+    return candidates + [l for l in planes if not l in candidates]
+
+def mergeAnnotationPlanes(planes):
+    '''mergeAnnotationPlanes(planes): moves the annotations of the given planes to the one
+    with most annotations and removes the others, returns the kept plane'''
+    planes = sorted(planes, key=lambda l: -len(getAnnotationsOfPlane(l)))
+    kept = planes[0]
+    # a batch already open, like the one of an import, is left to its owner
+    ownBatch = not inBatch()
+    if ownBatch:
+        openBatch()
+    try:
+        for plane in planes[1:]:
+            for l in getAnnotationsOfPlane(plane):
+                if hasattr(l,"Style") and l.Style == None and getattr(plane,"Style",None) <> getattr(kept,"Style",None):
+                    l.Style = getattr(plane,"Style",None)
+                l.AP = kept
+            plane.Document.removeObject(plane.Name)
+    finally:
+        if ownBatch:
+            closeBatch()
+    invalidatePlaneIndex(kept.Document)
+    return kept
+
+def mergeCoincidentAnnotationPlanes(doc=None, ask=True):
+    "mergeCoincidentAnnotationPlanes([doc],[ask]): merges each group of coincident annotation planes, asking first if ask is True"
+    groups = getPlaneIndex(doc).getCoincident()
+    if groups == []:
+        FreeCAD.Console.PrintMessage("No coincident annotation planes\n")
+        return 0
+    if ask and gui:
+        text = '\n'.join([', '.join([p.Label for p in l]) for l in groups])
+        answer = QtGui.QMessageBox.question(QtGui.qApp.activeWindow(), 'Merge annotation planes', 'Merge these coincident annotation planes?\n\n' + text, QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
+        if answer <> QtGui.QMessageBox.Yes:
+            return 0
+    for l in groups:
+        mergeAnnotationPlanes(l)
+    return len(groups)
+
+def makeAnnotationPlane(Name, Offset, faces=None):
     ''' Explanation
     '''
-    if len(getAllAnnotationPlaneObjects()) == 0:
-        group = FreeCAD.ActiveDocument.addObject("App::DocumentObjectGroupPython", "GDT")
-        _GDTObject(group)
-        _ViewProviderGDT(group.ViewObject)
-    else:
-        group = FreeCAD.ActiveDocument.getObject("GDT")
+    group = getGDTGroup()
 
     obj = FreeCAD.ActiveDocument.addObject("App::FeaturePython","AnnotationPlane")
-    _AnnotationPlane(obj)
+    _AnnotationPlane(obj, faces)
     if gui:
         _ViewProviderAnnotationPlane(obj.ViewObject)
     obj.Label = Name
     obj.Offset = Offset
+    obj.PointWithOffset = obj.p1 + obj.Direction * obj.Offset
     group.addObject(obj)
     hideGrid()
-    for l in getAllAnnotationObjects():
-        l.touch()
-    FreeCAD.ActiveDocument.recompute()
+    refreshAnnotations()
     return obj
 
     #-----------------------------------------------------------------------
@@ -831,7 +1802,7 @@ def makeDatumFeature(Name, ContainerOfData):
     group.addObject(obj)
     AnnotationObj = getAnnotationObj(ContainerOfData)
     if AnnotationObj == None:
-        makeAnnotation(ContainerOfData.faces, ContainerOfData.annotationPlane, DF=obj, GT=[])
+        makeAnnotation(ContainerOfData.faces, ContainerOfData.annotationPlane, DF=obj, GT=[], selectedPoint=ContainerOfData.selectedPoint)
     else:
         faces = AnnotationObj.faces
         AP = AnnotationObj.AP
@@ -843,9 +1814,7 @@ def makeDatumFeature(Name, ContainerOfData):
         highLimit = AnnotationObj.highLimit
         group = makeAnnotation(faces, AP, DF=obj, GT=GT, modify = True, Object = AnnotationObj, diameter=diameter, toleranceSelect=toleranceSelect, toleranceDiameter=toleranceDiameter, lowLimit=lowLimit, highLimit=highLimit)
         group.addObject(obj)
-    for l in getAllAnnotationObjects():
-        l.touch()
-    FreeCAD.ActiveDocument.recompute()
+    refreshAnnotations()
     return obj
 
     #-----------------------------------------------------------------------
@@ -893,9 +1862,7 @@ def makeDatumSystem(Name, Primary, Secondary=None, Tertiary=None):
     obj.Tertiary = Tertiary
     group = FreeCAD.ActiveDocument.getObject("GDT")
     group.addObject(obj)
-    for l in getAllAnnotationObjects():
-        l.touch()
-    FreeCAD.ActiveDocument.recompute()
+    refreshAnnotations()
     return obj
 
     #-----------------------------------------------------------------------
@@ -949,7 +1916,7 @@ def makeGeometricTolerance(Name, ContainerOfData):
     group.addObject(obj)
     AnnotationObj = getAnnotationObj(ContainerOfData)
     if AnnotationObj == None:
-        makeAnnotation(ContainerOfData.faces, ContainerOfData.annotationPlane, DF=None, GT=obj, diameter=ContainerOfData.diameter, toleranceSelect=ContainerOfData.toleranceSelect, toleranceDiameter=ContainerOfData.toleranceDiameter, lowLimit=ContainerOfData.lowLimit, highLimit=ContainerOfData.highLimit)
+        makeAnnotation(ContainerOfData.faces, ContainerOfData.annotationPlane, DF=None, GT=obj, diameter=ContainerOfData.diameter, toleranceSelect=ContainerOfData.toleranceSelect, toleranceDiameter=ContainerOfData.toleranceDiameter, lowLimit=ContainerOfData.lowLimit, highLimit=ContainerOfData.highLimit, selectedPoint=ContainerOfData.selectedPoint)
     else:
         gt=AnnotationObj.GT
         gt.append(obj)
@@ -970,9 +1937,7 @@ def makeGeometricTolerance(Name, ContainerOfData):
             highLimit = AnnotationObj.highLimit
         group = makeAnnotation(faces, AP, DF=DF, GT=gt, modify = True, Object = AnnotationObj, diameter=diameter, toleranceSelect=toleranceSelect, toleranceDiameter=toleranceDiameter, lowLimit=lowLimit, highLimit=highLimit)
         group.addObject(obj)
-    for l in getAllAnnotationObjects():
-        l.touch()
-    FreeCAD.ActiveDocument.recompute()
+    refreshAnnotations()
     return obj
 
     #-----------------------------------------------------------------------
@@ -997,8 +1962,16 @@ class _Annotation(_GDTObject):
         obj.addProperty("App::PropertyFloat","toleranceDiameter","GDT","Diameter tolerance (Plus-minus)")
         obj.addProperty("App::PropertyFloat","lowLimit","GDT","Low limit diameter tolerance")
         obj.addProperty("App::PropertyFloat","highLimit","GDT","High limit diameter tolerance")
+        obj.addProperty("App::PropertyLink","Style","GDT","Style used by this annotation, if empty the style of its annotation plane is used")
 
     def onChanged(self,obj,prop):
+        if prop == "faces":
+            resetFaceSignatures(obj)
+        if prop == "Style" and not 'Restore' in getattr(obj,"State",[]):
+            restyleAnnotation(obj)
+        if prop == "faces" and obj.faces <> [] and hasattr(obj,"circumferenceBool") and not 'Restore' in getattr(obj,"State",[]):
+            face = obj.faces[0][0].Shape.getElement(obj.faces[0][1])
+            obj.circumferenceBool = True if (True in [l.Closed for l in face.Edges] and len(face.Vertexes) == 2) else False
         if hasattr(obj,"spBool"):
             obj.setEditorMode('spBool',2)
         if hasattr(obj,"diameter"):
@@ -1025,6 +1998,7 @@ class _Annotation(_GDTObject):
     def execute(self, fp):
         '''"Print a short message when doing a recomputation, this method is mandatory" '''
         # FreeCAD.Console.PrintMessage('Executed\n')
+        updateFaceBinding(fp)
         auxP1 = fp.p1
         if fp.circumferenceBool:
             vertexex = fp.faces[0][0].Shape.getElement(fp.faces[0][1]).Vertexes
@@ -1048,13 +2022,94 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
         obj.addProperty("App::PropertyColor","FontColor","GDT","Font color").FontColor = getRGBText()
         obj.addProperty("App::PropertyInteger","Decimals","GDT","The number of decimals to show").Decimals = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Units").GetInt("Decimals",2)
         obj.addProperty("App::PropertyBool","ShowUnit","GDT","Show the unit suffix").ShowUnit = getParam("showUnit",True)
+        obj.addProperty("App::PropertyBool","OverrideStyle","GDT","Use the style properties of this annotation instead of the ones of its style").OverrideStyle = False
         _ViewProviderGDT.__init__(self,obj)
 
     def attach(self, obj):
         "called on object creation"
         from pivy import coin
-        self.node = coin.SoGroup()
-        self.node3d = coin.SoGroup()
+        self.Object = obj.Object
+        if not hasattr(obj,"OverrideStyle"):
+            # annotations of older documents keep their own style
+            obj.addProperty("App::PropertyBool","OverrideStyle","GDT","Use the style properties of this annotation instead of the ones of its style").OverrideStyle = True
+        self.display = coin.SoGroup()
+        self.display3d = coin.SoGroup()
+        obj.addDisplayMode(self.display,"2D")
+        obj.addDisplayMode(self.display3d,"3D")
+        self.mode = 0
+        self.planeGroup = None
+        self.planeProxy = None
+        # the scene sub-graph is built the first time the annotation is shown
+        self.built = False
+        self.dirty = True
+        self.inspectionState = None
+
+    def isShown(self, vobj):
+        "isShown(vobj): returns True if the annotation is currently visible"
+        if not vobj.Visibility:
+            return False
+        AP = vobj.Object.AP
+        if AP <> None and AP.ViewObject <> None and not AP.ViewObject.Visibility:
+            return False
+        return True
+
+    def getPlaneProxy(self, fp):
+        "getPlaneProxy(fp): returns the view provider of the annotation plane if it owns a rendering group"
+        if fp.AP <> None and fp.AP.ViewObject <> None and hasattr(fp.AP.ViewObject.Proxy,"switch"):
+            return fp.AP.ViewObject.Proxy
+        return None
+
+    def attachToPlane(self, fp):
+        "attachToPlane(fp): moves the scene sub-graph of the annotation under the rendering group of its plane"
+        planeProxy = self.getPlaneProxy(fp)
+        if self.planeGroup <> None and planeProxy is self.planeProxy:
+            return
+        if planeProxy <> None:
+            parents = [planeProxy.switch]
+        else:
+            parents = [self.display, self.display3d]
+        if self.planeGroup <> None:
+            for parent in self.planeGroup:
+                parent.removeChild(self.switch)
+        for parent in parents:
+            parent.addChild(self.switch)
+        self.planeGroup = parents
+        self.planeProxy = planeProxy
+        self.updateStyle(fp.ViewObject)
+
+    def updateStyle(self, vobj):
+        "updateStyle(vobj): binds the annotation to the shared style nodes of its style, of its plane or to its own ones"
+        source = self
+        if not vobj.OverrideStyle:
+            style = getStyleOfAnnotation(vobj.Object)
+            if style <> None and style.ViewObject <> None and hasattr(style.ViewObject.Proxy,"lineColor"):
+                source = style.ViewObject.Proxy
+            elif self.getPlaneProxy(vobj.Object) <> None:
+                source = self.getPlaneProxy(vobj.Object)
+        self.lineStyle.removeAllChildren()
+        self.lineStyle.addChild(source.drawstyle)
+        self.lineStyle.addChild(source.lineColor)
+        self.textStyle.removeAllChildren()
+        self.textStyle.addChild(source.textColor)
+        self.textStyle.addChild(source.font)
+        self.textStyle3d.removeAllChildren()
+        self.textStyle3d.addChild(source.textColor)
+        self.textStyle3d.addChild(source.font3d)
+
+    def materialize(self, obj):
+        "materialize(obj): builds the scene sub-graph of the annotation"
+        from pivy import coin
+        self.built = True
+        self.node = coin.SoSeparator()
+        self.node3d = coin.SoSeparator()
+        self.node.renderCaching = self.node3d.renderCaching = coin.SoSeparator.ON
+        self.switch = coin.SoSwitch()
+        self.switch.addChild(self.node)
+        self.switch.addChild(self.node3d)
+        self.switch.whichChild = self.mode
+        self.lineStyle = coin.SoGroup()
+        self.textStyle = coin.SoGroup()
+        self.textStyle3d = coin.SoGroup()
         self.lineColor = coin.SoBaseColor()
         self.textColor = coin.SoBaseColor()
 
@@ -1063,7 +2118,7 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
         self.lines = coin.SoIndexedLineSet()
 
         selectionNode = coin.SoType.fromName("SoFCSelection").createInstance()
-        selectionNode.documentName.setValue(FreeCAD.ActiveDocument.Name)
+        selectionNode.documentName.setValue(obj.Object.Document.Name)
         selectionNode.objectName.setValue(obj.Object.Name) # here obj is the ViewObject, we need its associated App Object
         selectionNode.subElementName.setValue("Lines")
         selectionNode.addChild(self.lines)
@@ -1078,13 +2133,11 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
         self.textDF.justification = self.textDF3d.justification = coin.SoAsciiText.CENTER
         labelDF = coin.SoSeparator()
         labelDF.addChild(self.textDFpos)
-        labelDF.addChild(self.textColor)
-        labelDF.addChild(self.font)
+        labelDF.addChild(self.textStyle)
         labelDF.addChild(self.textDF)
         labelDF3d = coin.SoSeparator()
         labelDF3d.addChild(self.textDFpos)
-        labelDF3d.addChild(self.textColor)
-        labelDF3d.addChild(self.font3d)
+        labelDF3d.addChild(self.textStyle3d)
         labelDF3d.addChild(self.textDF3d)
 
         self.textGT = []
@@ -1104,13 +2157,11 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
             self.textGT[i].justification = self.textGT3d[i].justification = coin.SoAsciiText.CENTER
             labelGT = coin.SoSeparator()
             labelGT.addChild(self.textGTpos[i])
-            labelGT.addChild(self.textColor)
-            labelGT.addChild(self.font)
+            labelGT.addChild(self.textStyle)
             labelGT.addChild(self.textGT[i])
             labelGT3d = coin.SoSeparator()
             labelGT3d.addChild(self.textGTpos[i])
-            labelGT3d.addChild(self.textColor)
-            labelGT3d.addChild(self.font3d)
+            labelGT3d.addChild(self.textStyle3d)
             labelGT3d.addChild(self.textGT3d[i])
             self.svg.append(coin.SoTexture2())
             self.face.append(coin.SoFaceSet())
@@ -1131,44 +2182,92 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
 
         self.drawstyle = coin.SoDrawStyle()
         self.drawstyle.style = coin.SoDrawStyle.LINES
+        # overrides the line color of the style while inspection results are shown
+        self.inspectionStyle = coin.SoGroup()
+        self.inspectionColor = coin.SoBaseColor()
 
         self.node.addChild(labelDF)
-        self.node.addChild(self.drawstyle)
-        self.node.addChild(self.lineColor)
+        self.node.addChild(self.lineStyle)
+        self.node.addChild(self.inspectionStyle)
         self.node.addChild(self.data)
         self.node.addChild(self.lines)
         self.node.addChild(selectionNode)
-        obj.addDisplayMode(self.node,"2D")
 
         self.node3d.addChild(labelDF3d)
-        self.node3d.addChild(self.lineColor)
+        self.node3d.addChild(self.lineStyle)
+        self.node3d.addChild(self.inspectionStyle)
         self.node3d.addChild(self.data)
         self.node3d.addChild(self.lines)
         self.node3d.addChild(selectionNode)
-        obj.addDisplayMode(self.node3d,"3D")
         self.onChanged(obj,"LineColor")
         self.onChanged(obj,"LineWidth")
-        self.onChanged(obj,"FontSize")
-        self.onChanged(obj,"FontName")
         self.onChanged(obj,"FontColor")
+        # set the fonts directly, the layout is done by the caller
+        if obj.FontSize.Value > 0:
+            self.font.size = obj.FontSize.Value
+            self.font3d.size = obj.FontSize.Value*100
+        self.font.name = self.font3d.name = str(obj.FontName)
+        self.attachToPlane(obj.Object)
+        self.setInspectionState(self.inspectionState)
+
+    def setInspectionState(self, state):
+        "setInspectionState(state): colors the lines of the annotation by an inspection state, 'pass', 'marginal' or 'fail', or by its style if state is None"
+        self.inspectionState = state
+        if not (hasattr(self,"built") and self.built):
+            return
+        if state in inspectionColors:
+            c = inspectionColors[state]
+            self.inspectionColor.rgb.setValue(c[0],c[1],c[2])
+            if self.inspectionStyle.getNumChildren() == 0:
+                self.inspectionStyle.addChild(self.inspectionColor)
+        else:
+            self.inspectionStyle.removeAllChildren()
+
+    def flush(self, fp):
+        "flush(fp): builds and lays out the annotation if it is shown and has pending changes"
+        if not self.isShown(fp.ViewObject):
+            return
+        if not self.built:
+            self.materialize(fp.ViewObject)
+        if self.dirty:
+            self.layout(fp)
+
+    def layout(self, fp):
+        "layout(fp): computes the points of the annotation and updates its scene sub-graph"
+        self.dirty = False
+        self.updateStyle(fp.ViewObject)
+        texts = []
+        points, segments = getPointsToPlot(fp, texts)
+        # print str(points)
+        # print str(segments)
+        self.data.point.setNum(len(points))
+        cnt=0
+        for p in points:
+            self.data.point.set1Value(cnt,p.x,p.y,p.z)
+            cnt=cnt+1
+        self.lines.coordIndex.setNum(len(segments))
+        self.lines.coordIndex.setValues(0,len(segments),segments)
+        plotStrings(self, fp, points, texts)
+        index = frameIndexes.get((fp.Document.Name, getattr(fp.AP,"Name",None)))
+        if index <> None:
+            index.updateAnnotation(fp, points)
 
     def updateData(self, fp, prop):
         "If a property of the handled feature has changed we have the chance to handle this here"
         # fp is the handled feature, prop is the name of the property that has changed
-        if prop in "selectedPoint" and hasattr(fp.ViewObject,"Decimals") and hasattr(fp.ViewObject,"ShowUnit") and fp.spBool:
-            points, segments = getPointsToPlot(fp)
-            # print str(points)
-            # print str(segments)
-            self.data.point.setNum(len(points))
-            cnt=0
-            for p in points:
-                self.data.point.set1Value(cnt,p.x,p.y,p.z)
-                cnt=cnt+1
-            self.lines.coordIndex.setNum(len(segments))
-            self.lines.coordIndex.setValues(0,len(segments),segments)
-            plotStrings(self, fp, points)
-        if prop in "faces" and fp.faces <> []:
-            fp.circumferenceBool = True if (True in [l.Closed for l in fp.faces[0][0].Shape.getElement(fp.faces[0][1]).Edges] and len(fp.faces[0][0].Shape.getElement(fp.faces[0][1]).Vertexes) == 2) else False
+        if prop in "selectedPoint" and hasattr(fp.ViewObject,"Decimals") and hasattr(fp.ViewObject,"ShowUnit") and fp.spBool and hasattr(self,"built"):
+            # layout of hidden annotations is deferred until they are shown
+            self.dirty = True
+            self.flush(fp)
+        if prop == "AP" and hasattr(self,"built") and self.built:
+            self.attachToPlane(fp)
+
+    def onDelete(self, vobj, subelements):
+        if hasattr(self,"built") and self.built and self.planeGroup <> None:
+            for parent in self.planeGroup:
+                parent.removeChild(self.switch)
+            self.planeGroup = None
+        return True
 
     def doubleClicked(self,obj):
         try:
@@ -1188,11 +2287,21 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
         return "2D"
 
     def setDisplayMode(self,mode):
+        self.mode = 1 if mode == "3D" else 0
+        if hasattr(self,"built") and self.built and self.isShown(self.Object.ViewObject):
+            self.switch.whichChild = self.mode
         return mode
 
     def onChanged(self, vobj, prop):
         "Here we can do something when a single property got changed"
-        if (prop == "LineColor") and hasattr(vobj,"LineColor"):
+        if (prop == "OverrideStyle") and hasattr(vobj,"OverrideStyle"):
+            for p in styleProperties:
+                if hasattr(vobj,p):
+                    vobj.setEditorMode(p, 0 if vobj.OverrideStyle else 2)
+            if hasattr(self,"built") and self.built:
+                self.updateStyle(vobj)
+                vobj.Object.touch()
+        elif (prop == "LineColor") and hasattr(vobj,"LineColor"):
             if hasattr(self,"lineColor"):
                 c = vobj.getPropertyByName("LineColor")
                 self.lineColor.rgb.setValue(c[0],c[1],c[2])
@@ -1216,17 +2325,22 @@ class _ViewProviderAnnotation(_ViewProviderGDT):
             if hasattr(self,"font") and hasattr(self,"font3d"):
                 self.font.name = self.font3d.name = str(vobj.FontName)
                 vobj.Object.touch()
+        elif prop == "Visibility":
+            if hasattr(self,"built") and self.built:
+                self.switch.whichChild = self.mode if vobj.Visibility else coin.SO_SWITCH_NONE
+            if hasattr(self,"built") and vobj.Object.spBool:
+                self.flush(vobj.Object)
         else:
             self.updateData(vobj.Object, "selectedPoint")
 
     def getIcon(self):
         return(":/dd/icons/annotation.svg")
 
-def makeAnnotation(faces, AP, DF=None, GT=[], modify=False, Object=None, diameter = 0.0, toleranceSelect = True, toleranceDiameter = 0.0, lowLimit = 0.0, highLimit = 0.0):
+def makeAnnotation(faces, AP, DF=None, GT=[], modify=False, Object=None, diameter = 0.0, toleranceSelect = True, toleranceDiameter = 0.0, lowLimit = 0.0, highLimit = 0.0, selectedPoint = None):
     ''' Explanation
     '''
     if not modify:
-        obj = FreeCAD.ActiveDocument.addObject("App::DocumentObjectGroupPython",dictionaryAnnotation[len(getAllAnnotationObjects())])
+        obj = FreeCAD.ActiveDocument.addObject("App::DocumentObjectGroupPython",getAnnotationName())
         _Annotation(obj)
         if gui:
             _ViewProviderAnnotation(obj.ViewObject)
@@ -1234,6 +2348,8 @@ def makeAnnotation(faces, AP, DF=None, GT=[], modify=False, Object=None, diamete
         group.addObject(obj)
         obj.faces = faces
         obj.AP = AP
+        if batchAnnotationIndex <> None:
+            batchAnnotationIndex[getFacesKey(faces)] = obj
         if obj.circumferenceBool:
             vertexex = obj.faces[0][0].Shape.getElement(obj.faces[0][1]).Vertexes
             index = [l.Point.z for l in vertexex].index(max([l.Point.z for l in vertexex]))
@@ -1263,10 +2379,9 @@ def makeAnnotation(faces, AP, DF=None, GT=[], modify=False, Object=None, diamete
             obj.selectedPoint = point
             hideGrid()
             obj.addObject(obj.DF) if obj.DF <> None else obj.addObject(obj.GT[0])
-            select(obj)
-            for l in getAllAnnotationObjects():
-                l.touch()
-            FreeCAD.ActiveDocument.recompute()
+            if not inBatch():
+                select(obj)
+            refreshAnnotations()
             return obj
         else:
             if DF:
@@ -1277,20 +2392,114 @@ def makeAnnotation(faces, AP, DF=None, GT=[], modify=False, Object=None, diamete
                 FreeCAD.ActiveDocument.removeObject(obj.GT[-1].Name)
             FreeCAD.ActiveDocument.removeObject(obj.Name)
             hideGrid()
-            for l in getAllAnnotationObjects():
-                l.touch()
-            FreeCAD.ActiveDocument.recompute()
+            refreshAnnotations()
             return None
     if not obj.spBool:
+        if selectedPoint <> None:
+            return getPoint(selectedPoint)
+        if inBatch():
+            # left without a selected point, to be placed by placeAnnotations
+            obj.addObject(obj.DF) if obj.DF <> None else obj.addObject(obj.GT[0])
+            return obj
         return FreeCADGui.Snapper.getPoint(callback=getPoint)
     else:
         hideGrid()
-        select(obj)
-        for l in getAllAnnotationObjects():
-            l.touch()
-        FreeCAD.ActiveDocument.recompute()
+        if not inBatch():
+            select(obj)
+        refreshAnnotations()
         return obj
 
+    #-----------------------------------------------------------------------
+    # Style
+    #-----------------------------------------------------------------------
+
+styleProperties = ["LineWidth","LineColor","LineScale","FontSize","FontName","FontColor","Decimals","ShowUnit"]
+# style properties that change the layout of the annotations
+styleMetrics = ["LineScale","FontSize","FontName","Decimals","ShowUnit"]
+
+def getAnnotationsOfStyle(style):
+    "getAnnotationsOfStyle(style): returns a list of the annotation objects that use the given style"
+    annotations = []
+    for l in style.InList:
+        if getType(l) == "Annotation" and l.Style == style:
+            annotations.append(l)
+        elif getType(l) == "AnnotationPlane" and l.Style == style:
+            annotations += [a for a in getAnnotationsOfPlane(l) if getattr(a,"Style",None) == None]
+    return annotations
+
+class _Style(_GDTObject):
+    "The GDT Style object"
+    def __init__(self, obj):
+        _GDTObject.__init__(self,obj,"Style")
+        obj.addProperty("App::PropertyFloat","LineWidth","GDT","Line width").LineWidth = getStyleDefault("LineWidth")
+        obj.addProperty("App::PropertyColor","LineColor","GDT","Line color").LineColor = getStyleDefault("LineColor")
+        obj.addProperty("App::PropertyFloat","LineScale","GDT","Line scale").LineScale = getStyleDefault("LineScale")
+        obj.addProperty("App::PropertyLength","FontSize","GDT","Font size").FontSize = getStyleDefault("FontSize")
+        obj.addProperty("App::PropertyString","FontName","GDT","Font name").FontName = getStyleDefault("FontName")
+        obj.addProperty("App::PropertyColor","FontColor","GDT","Font color").FontColor = getStyleDefault("FontColor")
+        obj.addProperty("App::PropertyInteger","Decimals","GDT","The number of decimals to show").Decimals = getStyleDefault("Decimals")
+        obj.addProperty("App::PropertyBool","ShowUnit","GDT","Show the unit suffix").ShowUnit = getStyleDefault("ShowUnit")
+
+    def onChanged(self,obj,prop):
+        "Do something when a property has changed"
+        if prop in styleMetrics and not 'Restore' in getattr(obj,"State",[]):
+            # only the annotations whose layout depends on this property are relaid out
+            for l in getAnnotationsOfStyle(obj):
+                l.touch()
+
+class _ViewProviderStyle(_ViewProviderGDT):
+    "A View Provider for the GDT Style object"
+    def __init__(self, obj):
+        _ViewProviderGDT.__init__(self,obj)
+
+    def attach(self, vobj):
+        "called on object creation"
+        from pivy import coin
+        self.Object = vobj.Object
+        # style nodes shared by all the annotations that use this style
+        self.lineColor = coin.SoBaseColor()
+        self.textColor = coin.SoBaseColor()
+        self.drawstyle = coin.SoDrawStyle()
+        self.drawstyle.style = coin.SoDrawStyle.LINES
+        self.font = coin.SoFont()
+        self.font3d = coin.SoFont()
+        for prop in ["LineColor","LineWidth","FontColor","FontSize","FontName"]:
+            self.updateData(vobj.Object, prop)
+
+    def updateData(self, obj, prop):
+        "called when the base object is changed"
+        if not hasattr(self,"lineColor") or not hasattr(obj,prop):
+            return
+        if prop == "LineColor":
+            c = obj.LineColor
+            self.lineColor.rgb.setValue(c[0],c[1],c[2])
+        elif prop == "LineWidth":
+            self.drawstyle.lineWidth = obj.LineWidth
+        elif prop == "FontColor":
+            c = obj.FontColor
+            self.textColor.rgb.setValue(c[0],c[1],c[2])
+        elif prop == "FontSize":
+            if obj.FontSize.Value > 0:
+                self.font.size = obj.FontSize.Value
+                self.font3d.size = obj.FontSize.Value*100
+        elif prop == "FontName":
+            self.font.name = self.font3d.name = str(obj.FontName)
+
+    def getIcon(self):
+        return(":/dd/icons/preferences-gdt.svg")
+
+def makeStyle(Name):
+    ''' Explanation
+    '''
+    obj = FreeCAD.ActiveDocument.addObject("App::FeaturePython","Style")
+    _Style(obj)
+    if gui:
+        _ViewProviderStyle(obj.ViewObject)
+    obj.Label = Name
+    group = getGDTGroup()
+    group.addObject(obj)
+    return obj
+
     #-----------------------------------------------------------------------
     # Other classes
     #-----------------------------------------------------------------------
@@ -1367,6 +2576,7 @@ class ContainerOfData(object):
         self.datumSystem = 0
         self.annotationPlane = 0
         self.annotation = None
+        self.selectedPoint = None
         self.combo = ['','','','','','']
         self.Proxy = self
 
@@ -1468,6 +2678,8 @@ class GDTGuiClass(QtGui.QWidget):
             makeGeometricTolerance(self.textName, self.ContainerOfData)
         elif self.idGDT == 4:
             makeAnnotationPlane(self.textName, self.ContainerOfData.OffsetValue)
+        elif self.idGDT == 5:
+            makeStyle(self.textName)
         else:
             pass
 
@@ -1523,6 +2735,8 @@ class textLabelWidget:
             NumberOfObjects = len(getAllGeometricToleranceObjects())
         elif self.idGDT == 4:
             NumberOfObjects = len(getAllAnnotationPlaneObjects())
+        elif self.idGDT == 5:
+            NumberOfObjects = len(getAllStyleObjects())
         else:
             NumberOfObjects = 0
         return NumberOfObjects
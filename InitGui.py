@@ -39,13 +39,19 @@ class GeometricDimensioningAndTolerancingWorkbench ( Workbench ):
 			import geometricTolerance
 			import annotationPlane
 			import inventory
+			import annotationStyle
+			import validate
+			import facePattern
+			import toleranceZones
 		except ImportError:
 			FreeCAD.Console.PrintWarning("Error: Initializing one or more of the GD&T modules failed, GD&T will not work as expected.\n")
 
 		self.cmdList = ['dd_datumFeature','dd_datumSystem','dd_geometricTolerance','dd_annotationPlane']
-		self.inventory = ['dd_inventory']
-		self.appendToolbar("GD&T Tools",self.cmdList+self.inventory)
- 		self.appendMenu("GD&T Tools",self.cmdList+self.inventory)
+		self.inventory = ['dd_inventory','dd_validate','dd_toleranceZones']
+		self.styleList = ['dd_annotationStyle']
+		self.selectionList = ['dd_facePattern']
+		self.appendToolbar("GD&T Tools",self.cmdList+self.selectionList+self.styleList+self.inventory)
+ 		self.appendMenu("GD&T Tools",self.cmdList+self.selectionList+self.styleList+self.inventory)
 
 		FreeCADGui.addIconPath(':/dd/icons')
 		FreeCADGui.addPreferencePage( ':/dd/ui/preferences-gdt.ui','GDT' )
@@ -74,6 +80,7 @@ class GeometricDimensioningAndTolerancingWorkbench ( Workbench ):
 			showCmdList = False
 		if showCmdList:
 			self.appendContextMenu("",self.cmdList) # add commands to the context menu
+			self.appendContextMenu("",self.selectionList)
 		self.appendContextMenu("",self.inventory)
 
 FreeCADGui.addWorkbench(GeometricDimensioningAndTolerancingWorkbench)
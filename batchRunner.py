@@ -0,0 +1,241 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Batch runner of GD&T actions over many FCStd files.
+
+The files are fanned out to a pool of FreeCADCmd worker processes, one
+document per process. Every finished file is appended to a journal (one JSON
+object per line) as soon as its result is collected, so an interrupted run
+can be resumed with the same journal and only the missing files are done.
+
+    python batchRunner.py export /data/parts/*.FCStd --output /data/pmi --jobs 8
+    python batchRunner.py statistics /data/parts --journal stats.jsonl --timeout 120
+
+Actions:
+    export      writes the GD&T model of each file to the output directory
+                (--format jsonl, csv or qif)
+    statistics  counts the GD&T objects of each file
+    import      imports <spec-dir>/<file name>.csv into each file and saves it
+    validate    checks the consistency of the GD&T model of each file
+
+The driver only needs a Python interpreter. The workers run this same file
+inside FreeCADCmd, which gets its parameters through GDT_BATCH_* environment
+variables and reports its result on a line starting with resultMarker.
+'''
+
+import sys, os, json, time, subprocess, tempfile
+
+resultMarker = "GDT-RESULT "
+
+actions = ['export', 'statistics', 'import', 'validate']
+
+    #-----------------------------------------------------------------------
+    # Worker
+    #-----------------------------------------------------------------------
+
+def getStatistics(doc):
+    "getStatistics(doc): returns the number of GD&T objects of each type in the document"
+    from GDT import getType
+    statistics = {}
+    for obj in doc.Objects:
+        tp = getType(obj)
+        if tp in ["AnnotationPlane", "DatumFeature", "DatumSystem", "GeometricTolerance", "Annotation", "Style"]:
+            statistics[tp] = statistics.get(tp, 0) + 1
+    return statistics
+
+def runAction(action, filename, options):
+    "runAction(action,filename,options): opens a document, runs the action on it and returns a result dictionary"
+    import FreeCAD
+    doc = FreeCAD.openDocument(filename)
+    try:
+        if action == 'export':
+            import exporter
+            name = os.path.splitext(os.path.basename(filename))[0] + '.' + options.get('format', 'jsonl')
+            output = os.path.join(options.get('output', os.path.dirname(filename)), name)
+            return {'output': output, 'records': exporter.exportDocument(doc, output)}
+        elif action == 'statistics':
+            return {'statistics': getStatistics(doc)}
+        elif action == 'import':
+            import importer
+            name = os.path.splitext(os.path.basename(filename))[0] + '.csv'
+            spec = os.path.join(options.get('specDir', os.path.dirname(filename)), name)
+            created, errors = importer.importSpecifications(spec, doc)
+            doc.save()
+            return {'created': created, 'errors': errors}
+        elif action == 'validate':
+            import validator
+            findings = validator.validateDocument(doc)
+            return {'valid': not [l for l in findings if l.Severity == 'Error'], 'findings': [str(l) for l in findings]}
+        raise ValueError("unknown action '%s'" % action)
+    finally:
+        FreeCAD.closeDocument(doc.Name)
+
+def runWorker():
+    "runWorker(): runs the action given by the environment on one file and prints its result"
+    sys.path.insert(0, os.environ['GDT_BATCH_PATH'])
+    action = os.environ['GDT_BATCH_ACTION']
+    filename = os.environ['GDT_BATCH_FILE']
+    options = json.loads(os.environ.get('GDT_BATCH_OPTIONS', '{}'))
+    try:
+        result = runAction(action, filename, options)
+        result['status'] = 'ok'
+    except Exception as e:
+        result = {'status': 'error', 'message': str(e)}
+    sys.stdout.write(resultMarker + json.dumps(result) + '\n')
+    sys.stdout.flush()
+
+    #-----------------------------------------------------------------------
+    # Driver
+    #-----------------------------------------------------------------------
+
+def findFiles(paths):
+    "findFiles(paths): returns the FCStd files given directly or found in the given directories"
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend([os.path.join(root, l) for l in sorted(names) if l.lower().endswith('.fcstd')])
+        else:
+            files.append(path)
+    return [os.path.abspath(l) for l in files]
+
+def readJournal(journal):
+    "readJournal(journal): returns the set of files already done in a journal"
+    done = set()
+    if journal and os.path.exists(journal):
+        with open(journal) as stream:
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'ok':
+                    done.add(record['file'])
+    return done
+
+def getResult(output):
+    "getResult(output): returns the result printed by a worker in its output file"
+    output.seek(0)
+    result = None
+    for line in output:
+        if not isinstance(line, str):
+            line = line.decode('utf-8', 'replace')
+        if line.startswith(resultMarker):
+            result = json.loads(line[len(resultMarker):])
+    return result
+
+class Worker:
+    "A FreeCADCmd process running one action on one file"
+    def __init__(self, freecad, action, filename, options):
+        self.filename = filename
+        self.output = tempfile.TemporaryFile()
+        env = dict(os.environ)
+        env['GDT_BATCH_ACTION'] = action
+        env['GDT_BATCH_FILE'] = filename
+        env['GDT_BATCH_OPTIONS'] = json.dumps(options)
+        env['GDT_BATCH_PATH'] = os.path.dirname(os.path.abspath(__file__))
+        self.start = time.time()
+        self.process = subprocess.Popen([freecad, os.path.abspath(__file__)], stdout=self.output, stderr=subprocess.STDOUT, env=env)
+
+    def poll(self, timeout):
+        "poll(timeout): returns the result record if the worker ended or timed out, else None"
+        code = self.process.poll()
+        if code == None:
+            if timeout and time.time() - self.start > timeout:
+                self.process.kill()
+                self.process.wait()
+                return self.close({'status': 'timeout'})
+            return None
+        result = getResult(self.output)
+        if result == None:
+            result = {'status': 'error', 'message': 'worker exited with code %d and no result' % code}
+        return self.close(result)
+
+    def close(self, result):
+        self.output.close()
+        result['file'] = self.filename
+        result['seconds'] = round(time.time() - self.start, 3)
+        return result
+
+def runBatch(action, files, jobs=4, timeout=None, journal=None, options={}, freecad='FreeCADCmd'):
+    '''runBatch(action,files,[jobs],[timeout],[journal],[options],[freecad]): runs
+    the action over the files with at most jobs worker processes, yields the
+    result of each file as it ends. Files already done in the journal are skipped.'''
+    done = readJournal(journal)
+    pending = [l for l in files if not l in done]
+    pending.reverse()
+    running = []
+    log = open(journal, 'a') if journal else None
+    try:
+        while pending or running:
+            while pending and len(running) < jobs:
+                running.append(Worker(freecad, action, pending.pop(), options))
+            finished = False
+            for worker in running[:]:
+                result = worker.poll(timeout)
+                if result != None:
+                    running.remove(worker)
+                    finished = True
+                    if log:
+                        log.write(json.dumps(result) + '\n')
+                        log.flush()
+                    yield result
+            if not finished:
+                time.sleep(0.05)
+    finally:
+        for worker in running:
+            worker.process.kill()
+            worker.process.wait()
+            worker.output.close()
+        if log:
+            log.close()
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a GD&T action over many FCStd files with a pool of FreeCADCmd processes")
+    parser.add_argument('action', choices=actions)
+    parser.add_argument('paths', nargs='+', help="FCStd files or directories")
+    parser.add_argument('--jobs', type=int, default=4, help="number of worker processes")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds allowed for each file")
+    parser.add_argument('--journal', default=None, help="JSON Lines file of results, used to resume a run")
+    parser.add_argument('--freecad', default='FreeCADCmd', help="FreeCADCmd executable")
+    parser.add_argument('--output', default=None, help="output directory of the export action")
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'csv', 'qif'], help="format of the export action")
+    parser.add_argument('--spec-dir', default=None, help="directory of the CSV files of the import action")
+    args = parser.parse_args(argv)
+    options = {'format': args.format}
+    if args.output:
+        options['output'] = os.path.abspath(args.output)
+    if args.spec_dir:
+        options['specDir'] = os.path.abspath(args.spec_dir)
+    failed = 0
+    for result in runBatch(args.action, findFiles(args.paths), args.jobs, args.timeout, args.journal, options, args.freecad):
+        if result['status'] != 'ok':
+            failed += 1
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+if 'GDT_BATCH_FILE' in os.environ:
+    runWorker()
+elif __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
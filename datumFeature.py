@@ -47,7 +47,7 @@ class DatumFeatureCommand:
         else:
             self.toolTip = 'Add Datum Feature'
             showGrid()
-            gdt.dialogWidgets[1] = comboLabelWidget(Text='Active annotation plane:', List=getAllAnnotationPlaneObjects())
+            gdt.dialogWidgets[1] = comboLabelWidget(Text='Active annotation plane:', List=getAnnotationPlanesForFaces(ContainerOfData.faces))
         gdt.activate(idGDT = self.idGDT, dialogTitle=self.toolTip, dialogIconPath=self.iconPath, endFunction=self.Activated, dictionary=self.dictionary)
 
     def GetResources(self):
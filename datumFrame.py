@@ -0,0 +1,244 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Datum reference frames solved from measured points.
+
+The datum features of a DatumSystem are fitted to the measured points of
+their faces: a plane for planar faces and an axis for cylindrical ones. The
+primary datum sets the Z axis, the secondary is constrained perpendicular to
+it and sets the X axis, and the tertiary fixes the remaining translation.
+
+    solver = datumFrame.DatumFrameSolver(pointsByFace)
+    frame = solver.getFrame(doc.DS1)
+    local = frame.toFrame(points)
+
+A solver fits each datum feature once and solves each datum system once,
+so all the tolerances that share a datum system reuse the same frame. The
+planar fits of all the datum features needed are done in one batched
+eigen decomposition.
+'''
+
+import numpy
+from GDT import *
+from inspection import getMeasuredPoints, getPlaneBasis, fitCylinder, tiltDirection
+
+class DatumFit(object):
+    "A datum feature fitted to measured points, a plane (point, outward normal) or an axis (point, direction)"
+    def __init__(self, DF, kind, point, direction):
+        self.DF = DF
+        self.kind = kind
+        self.point = point
+        self.direction = direction
+
+class DatumFrame(object):
+    "A datum reference frame, origin and the rows of its X, Y and Z axes in document coordinates"
+    def __init__(self, DS, origin, axes, fits):
+        self.DS = DS
+        self.origin = origin
+        self.axes = axes
+        self.fits = fits
+
+    def getMatrix(self):
+        "getMatrix(): returns the 4x4 matrix that transforms document coordinates to frame coordinates"
+        matrix = numpy.identity(4)
+        matrix[:3,:3] = self.axes
+        matrix[:3,3] = -numpy.dot(self.axes, self.origin)
+        return matrix
+
+    def toFrame(self, points):
+        "toFrame(points): returns an N x 3 array of points in frame coordinates"
+        return numpy.dot(numpy.asarray(points, dtype=float) - self.origin, self.axes.T)
+
+    def directionToFrame(self, directions):
+        return numpy.dot(directions, self.axes.T)
+
+def getDatumAnnotation(DF):
+    for l in DF.InList:
+        if getType(l) == "Annotation" and l.DF == DF:
+            return l
+    return None
+
+def getDatumKind(annotation):
+    "getDatumKind(annotation): returns 'axis' if the first face of the annotation is cylindrical, else 'plane'"
+    link = getFaceLinks(annotation.faces)[0]
+    surface = link[0].Shape.getElement(link[1]).Surface
+    return 'axis' if type(surface).__name__ in ["Cylinder", "Cone"] else 'plane'
+
+def getNominalNormal(annotation):
+    link = getFaceLinks(annotation.faces)[0]
+    n = link[0].Shape.getElement(link[1]).normalAt(0,0)
+    return numpy.array([n.x, n.y, n.z])
+
+def orthogonalize(direction, axes):
+    "orthogonalize(direction,axes): returns the unit direction with its components along the given unit axes removed, or None if nothing is left"
+    d = numpy.array(direction, dtype=float)
+    for a in axes:
+        d = d - numpy.dot(d, a)*a
+    norm = numpy.linalg.norm(d)
+    if norm < 1e-9:
+        return None
+    return d / norm
+
+class DatumFrameSolver:
+    "Solves and caches the datum reference frames of datum systems for one set of measured points"
+    def __init__(self, pointsByFace):
+        self.pointsByFace = pointsByFace
+        self.fits = {}
+        self.frames = {}
+        self.nominalFrames = {}
+
+    def fitDatums(self, DFs):
+        '''fitDatums(DFs): fits the datum features not fitted yet. The planar ones are
+        solved together: their scatter matrices are stacked and decomposed at once.'''
+        planes = []
+        names = set()
+        for DF in DFs:
+            if DF == None or DF.Name in self.fits or DF.Name in names:
+                continue
+            names.add(DF.Name)
+            annotation = getDatumAnnotation(DF)
+            points = getMeasuredPoints(annotation.faces, self.pointsByFace) if annotation <> None else None
+            if points is None or len(points) < 3:
+                # reported when a frame that needs it is solved
+                continue
+            if getDatumKind(annotation) == 'axis':
+                origin, direction, params = fitCylinder(points)
+                u, v = getPlaneBasis(direction)
+                direction = tiltDirection(direction, params[:2])
+                # the fitted axis has an arbitrary sense, the nominal one sets it
+                if numpy.dot(direction, getNominalGeometry(getFaceLinks(annotation.faces)[0])[2]) < 0:
+                    direction = -direction
+                self.fits[DF.Name] = DatumFit(DF, 'axis', origin + u*params[2] + v*params[3], direction)
+            else:
+                planes.append((DF, points, getNominalNormal(annotation)))
+        if planes == []:
+            return
+        centroids = numpy.array([p[1].mean(axis=0) for p in planes])
+        scatter = numpy.array([numpy.dot((p[1]-c).T, p[1]-c) for p, c in zip(planes, centroids)])
+        values, vectors = numpy.linalg.eigh(scatter)
+        for i, (DF, points, nominal) in enumerate(planes):
+            normal = vectors[i][:,0]
+            if numpy.dot(normal, nominal) < 0:
+                normal = -normal
+            # the datum plane is the tangent plane on the high points, outside the material
+            height = numpy.dot(points - centroids[i], normal).max()
+            self.fits[DF.Name] = DatumFit(DF, 'plane', centroids[i] + normal*height, normal)
+
+    def solve(self, DS):
+        "solve(DS): returns the DatumFrame of a datum system from the fits of its datum features"
+        DFs = getDatums(DS)
+        self.fitDatums(DFs)
+        for l in DFs:
+            if not l.Name in self.fits:
+                raise ValueError("The datum feature " + l.Label + " has no measured points")
+        # the directions the datums leave free are anchored to the nominal primary datum, as in the nominal frame
+        return solveFrame(DS, [self.fits[l.Name] for l in DFs], getNominalFit(DFs[0]).point)
+
+    def getFrame(self, DS):
+        "getFrame(DS): returns the cached DatumFrame of a datum system, solving it the first time"
+        if not DS.Name in self.frames:
+            self.frames[DS.Name] = self.solve(DS)
+        return self.frames[DS.Name]
+
+    def getNominalFrame(self, DS):
+        "getNominalFrame(DS): returns the cached DatumFrame of a datum system solved from the nominal geometry of its datum features"
+        if not DS.Name in self.nominalFrames:
+            self.nominalFrames[DS.Name] = solveFrame(DS, [getNominalFit(l) for l in getDatums(DS)])
+        return self.nominalFrames[DS.Name]
+
+    def solveAll(self, DSs):
+        '''solveAll(DSs): solves the frames of several datum systems, fitting all their
+        datum features in one batch first, returns a dictionary by datum system name.
+        The datum systems that can not be solved are reported and left out.'''
+        DFs = []
+        solvable = []
+        for DS in DSs:
+            try:
+                DFs.extend(getDatums(DS))
+                solvable.append(DS)
+            except ValueError as e:
+                FreeCAD.Console.PrintWarning(str(e) + "\n")
+        self.fitDatums(DFs)
+        for DS in solvable:
+            try:
+                self.getFrame(DS)
+            except ValueError as e:
+                FreeCAD.Console.PrintWarning(str(e) + "\n")
+        return self.frames
+
+def getDatums(DS):
+    "getDatums(DS): returns the datum features of a datum system in precedence order"
+    DFs = [l for l in [DS.Primary, DS.Secondary, DS.Tertiary] if l <> None]
+    if DFs == []:
+        raise ValueError("The datum system " + DS.Label + " has no datums")
+    return DFs
+
+def getNominalGeometry(link):
+    "getNominalGeometry(link): returns the kind ('plane' or 'axis'), a point and a direction of the nominal geometry of a linked face"
+    face = link[0].Shape.getElement(link[1])
+    surface = face.Surface
+    if type(surface).__name__ in ["Cylinder", "Cone"]:
+        p, d = surface.Center if hasattr(surface,"Center") else surface.Location, surface.Axis
+        return 'axis', numpy.array([p.x, p.y, p.z]), numpy.array([d.x, d.y, d.z])
+    p, d = face.CenterOfMass, face.normalAt(0,0)
+    return 'plane', numpy.array([p.x, p.y, p.z]), numpy.array([d.x, d.y, d.z])
+
+def getNominalFit(DF):
+    "getNominalFit(DF): returns the DatumFit of the nominal geometry of a datum feature"
+    annotation = getDatumAnnotation(DF)
+    if annotation == None:
+        raise ValueError("The datum feature " + DF.Label + " is not in any annotation")
+    kind, point, direction = getNominalGeometry(getFaceLinks(annotation.faces)[0])
+    return DatumFit(DF, kind, point, direction)
+
+def solveFrame(DS, fits, anchor=None):
+    '''solveFrame(DS,fits,[anchor]): returns the DatumFrame built from the fits of the datum features
+    of a datum system, in precedence order. The directions of the origin the datums leave free are
+    fixed by projecting anchor, the point of the primary datum by default, on the datums.'''
+    axes = []
+    for fit in fits:
+        d = orthogonalize(fit.direction, axes)
+        if d is not None and len(axes) < 2:
+            axes.append(d)
+    if len(axes) < 2:
+        axes.append(getPlaneBasis(axes[0])[0])
+    Z, X = axes[0], axes[1]
+    Y = numpy.cross(Z, X)
+    # the origin lies on every datum plane and on every datum axis, in the least squares sense;
+    # a weak pull towards the anchor fixes the directions they leave free
+    rows, values = [], []
+    for fit in fits:
+        if fit.kind == 'plane':
+            rows.append(fit.direction)
+            values.append(numpy.dot(fit.direction, fit.point))
+        else:
+            for n in getPlaneBasis(fit.direction):
+                rows.append(n)
+                values.append(numpy.dot(n, fit.point))
+    if anchor is None:
+        anchor = fits[0].point
+    weight = 1e-6
+    for n in numpy.identity(3):
+        rows.append(n*weight)
+        values.append(numpy.dot(n, anchor)*weight)
+    origin = numpy.linalg.lstsq(numpy.array(rows), numpy.array(values), rcond=-1)[0]
+    return DatumFrame(DS, origin, numpy.array([X, Y, Z]), fits)
@@ -0,0 +1,318 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Export of the GD&T model of a document.
+
+The records are produced by a generator that walks the objects of the
+document one at a time, so the whole model is never held in memory. It can
+be used headless, e.g. from FreeCADCmd:
+
+    import exporter
+    exporter.exportFile("part.FCStd", "part.jsonl")
+
+Files with a .qif or .xml extension are written as a QIF-style XML document
+of semantic PMI through an incremental XML writer.
+'''
+
+import json, csv
+from xml.sax.saxutils import XMLGenerator
+from GDT import *
+
+csvColumns = ["Type", "Name", "Label", "AP", "Faces", "Offset", "Point", "Direction", "Annotation", "Primary", "Secondary", "Tertiary", "Characteristic", "ToleranceValue", "FeatureControlFrame", "Circumference", "DS", "DF", "GT", "SelectedPoint", "Diameter", "ToleranceSelect", "ToleranceDiameter", "LowLimit", "HighLimit"]
+
+def getName(obj):
+    "getName(obj): returns the name of a linked object or None"
+    if obj == None:
+        return None
+    return obj.Name
+
+def getFaceNames(links):
+    "getFaceNames(links): returns a list of 'Object.Face' strings from a list of (object, subelement) links"
+    names = []
+    for link in links:
+        subs = link[1]
+        if isinstance(subs, str):
+            subs = [subs]
+        for sub in subs:
+            names.append(link[0].Name + '.' + sub)
+    return names
+
+def getVector(v):
+    return [v.x, v.y, v.z]
+
+def getAnnotationOf(obj):
+    "getAnnotationOf(obj): returns the name of the annotation that holds a datum feature or geometric tolerance"
+    for l in obj.InList:
+        if getType(l) == "Annotation":
+            return l.Name
+    return None
+
+def makeRecord(obj):
+    "makeRecord(obj): returns a dictionary with the GD&T data of the given object, or None if it is not a GD&T object"
+    tp = getType(obj)
+    record = {"Type": tp, "Name": obj.Name, "Label": obj.Label}
+    if tp == "AnnotationPlane":
+        record["Faces"] = getFaceNames([obj.faces]) if obj.faces else []
+        record["Offset"] = obj.Offset
+        record["Point"] = getVector(obj.PointWithOffset)
+        record["Direction"] = getVector(obj.Direction)
+    elif tp == "DatumFeature":
+        record["Annotation"] = getAnnotationOf(obj)
+    elif tp == "DatumSystem":
+        record["Primary"] = getName(obj.Primary)
+        record["Secondary"] = getName(obj.Secondary)
+        record["Tertiary"] = getName(obj.Tertiary)
+    elif tp == "GeometricTolerance":
+        record["Characteristic"] = obj.Characteristic
+        record["ToleranceValue"] = obj.ToleranceValue
+        record["FeatureControlFrame"] = obj.FeatureControlFrame
+        record["Circumference"] = obj.Circumference
+        record["DS"] = getName(obj.DS)
+        record["Annotation"] = getAnnotationOf(obj)
+    elif tp == "Annotation":
+        record["Faces"] = getFaceNames(obj.faces)
+        record["AP"] = getName(obj.AP)
+        record["DF"] = getName(obj.DF)
+        record["GT"] = [l.Name for l in obj.GT]
+        record["SelectedPoint"] = getVector(obj.selectedPoint) if obj.spBool else None
+        record["Circumference"] = obj.circumferenceBool
+        record["Diameter"] = obj.diameter
+        record["ToleranceSelect"] = obj.toleranceSelectBool
+        record["ToleranceDiameter"] = obj.toleranceDiameter
+        record["LowLimit"] = obj.lowLimit
+        record["HighLimit"] = obj.highLimit
+    else:
+        return None
+    return record
+
+def iterRecords(doc=None, types=None):
+    "iterRecords([doc],[types]): yields one record per GD&T object of the document"
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    for obj in doc.Objects:
+        if types <> None and not getType(obj) in types:
+            continue
+        record = makeRecord(obj)
+        if record <> None:
+            yield record
+
+def writeJSONLines(records, stream):
+    "writeJSONLines(records,stream): writes each record as a JSON object on its own line, returns the number of records"
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, sort_keys=True))
+        stream.write('\n')
+        count += 1
+    return count
+
+def getCSVValue(value):
+    if value == None:
+        return ''
+    elif isinstance(value, list):
+        return ';'.join([str(l) for l in value])
+    return value
+
+def writeCSV(records, stream):
+    "writeCSV(records,stream): writes the records as CSV rows with a fixed header, returns the number of records"
+    writer = csv.writer(stream)
+    writer.writerow(csvColumns)
+    count = 0
+    for record in records:
+        writer.writerow([getCSVValue(record.get(column)) for column in csvColumns])
+        count += 1
+    return count
+
+    #-----------------------------------------------------------------------
+    # QIF
+    #-----------------------------------------------------------------------
+
+qifNamespace = "http://qifstandards.org/xsd/qif3"
+
+qifCharacteristics = {'Straightness': 'Straightness', 'Flatness': 'Flatness', 'Circularity': 'Circularity', 'Cylindricity': 'Cylindricity', 'Profile of a line': 'LineProfile', 'Profile of a surface': 'SurfaceProfile', 'Perpendicularity': 'Perpendicularity', 'Angularity': 'Angularity', 'Parallelism': 'Parallelism', 'Symmetry': 'Symmetry', 'Position': 'Position', 'Concentricity': 'Concentricity', 'Circular run-out': 'CircularRunout', 'Total run-out': 'TotalRunout'}
+
+qifMaterialConditions = {'Maximum material condition': 'MAXIMUM', 'Least material condition': 'LEAST', 'Regardless of feature size': 'REGARDLESS'}
+
+qifModifiers = {'Free state': 'FreeState', 'Projected tolerance zone': 'ProjectedTolerance', 'Tangent plane': 'TangentPlane', 'Unequal Bilateral': 'UnequalBilateral'}
+
+qifPrecedences = ['PRIMARY', 'SECONDARY', 'TERTIARY']
+
+class QIFWriter:
+    "Writes an indented XML document element by element, nothing is kept in memory but the ids of the GD&T objects"
+    def __init__(self, stream):
+        self.generator = XMLGenerator(stream, 'utf-8')
+        self.depth = 0
+        self.ids = {}
+
+    def getId(self, kind, obj):
+        "getId(kind,obj): returns the QIF id of an object, the same object may have one id per kind of QIF item"
+        key = (kind, obj if isinstance(obj, str) else obj.Name)
+        if not key in self.ids:
+            self.ids[key] = len(self.ids) + 1
+        return str(self.ids[key])
+
+    def indent(self):
+        self.generator.characters('\n' + '  '*self.depth)
+
+    def start(self, name, attributes={}):
+        self.indent()
+        self.generator.startElement(name, attributes)
+        self.depth += 1
+
+    def end(self, name):
+        self.depth -= 1
+        self.indent()
+        self.generator.endElement(name)
+
+    def element(self, name, text, attributes={}):
+        self.indent()
+        self.generator.startElement(name, attributes)
+        self.generator.characters(str(text))
+        self.generator.endElement(name)
+
+def getAnnotationObjectOf(obj):
+    for l in obj.InList:
+        if getType(l) == "Annotation":
+            return l
+    return None
+
+def iterObjects(doc, tp):
+    "iterObjects(doc,tp): yields the objects of the document of the given GD&T type"
+    for obj in doc.Objects:
+        if getType(obj) == tp:
+            yield obj
+
+def writeQIFFeatures(writer, doc):
+    writer.start("Features")
+    writer.start("FeatureNominals")
+    for obj in iterObjects(doc, "Annotation"):
+        writer.start("SurfaceFeatureNominal", {"id": writer.getId("FeatureNominal", obj)})
+        writer.element("Name", obj.Label)
+        writer.start("FaceReferences")
+        for name in getFaceNames(obj.faces):
+            writer.element("FaceReference", name)
+        writer.end("FaceReferences")
+        if obj.circumferenceBool:
+            writer.element("Diameter", obj.diameter)
+        writer.end("SurfaceFeatureNominal")
+    writer.end("FeatureNominals")
+    writer.end("Features")
+
+def writeQIFDatums(writer, doc):
+    writer.start("DatumDefinitions")
+    for obj in iterObjects(doc, "DatumFeature"):
+        writer.start("DatumDefinition", {"id": writer.getId("DatumDefinition", obj)})
+        writer.element("DatumLabel", obj.Label)
+        annotation = getAnnotationObjectOf(obj)
+        if annotation <> None:
+            writer.element("FeatureNominalId", writer.getId("FeatureNominal", annotation))
+        writer.end("DatumDefinition")
+    writer.end("DatumDefinitions")
+    writer.start("DatumReferenceFrames")
+    for obj in iterObjects(doc, "DatumSystem"):
+        writer.start("DatumReferenceFrame", {"id": writer.getId("DatumReferenceFrame", obj)})
+        writer.element("Name", obj.Label)
+        writer.start("Datums")
+        for i, datum in enumerate([obj.Primary, obj.Secondary, obj.Tertiary]):
+            if datum <> None:
+                writer.start("Datum")
+                writer.element("DatumDefinitionId", writer.getId("DatumDefinition", datum))
+                writer.element("Precedence", qifPrecedences[i])
+                writer.end("Datum")
+        writer.end("Datums")
+        writer.end("DatumReferenceFrame")
+    writer.end("DatumReferenceFrames")
+
+def writeQIFCharacteristics(writer, doc):
+    writer.start("Characteristics")
+    writer.start("CharacteristicDefinitions")
+    for obj in iterObjects(doc, "GeometricTolerance"):
+        name = qifCharacteristics.get(obj.Characteristic, 'Position')
+        writer.start(name + "CharacteristicDefinition", {"id": writer.getId("CharacteristicDefinition", obj)})
+        writer.element("Name", obj.Label)
+        writer.element("ToleranceValue", obj.ToleranceValue)
+        if obj.Circumference:
+            writer.element("ZoneShape", "DIAMETER")
+        if obj.FeatureControlFrame in qifMaterialConditions:
+            writer.element("MaterialCondition", qifMaterialConditions[obj.FeatureControlFrame])
+        elif obj.FeatureControlFrame in qifModifiers:
+            writer.element(qifModifiers[obj.FeatureControlFrame], "true")
+        if obj.DS <> None:
+            writer.element("DatumReferenceFrameId", writer.getId("DatumReferenceFrame", obj.DS))
+        writer.end(name + "CharacteristicDefinition")
+    writer.end("CharacteristicDefinitions")
+    writer.start("CharacteristicItems")
+    for obj in iterObjects(doc, "GeometricTolerance"):
+        name = qifCharacteristics.get(obj.Characteristic, 'Position')
+        writer.start(name + "CharacteristicItem", {"id": writer.getId("CharacteristicItem", obj)})
+        writer.element("CharacteristicDefinitionId", writer.getId("CharacteristicDefinition", obj))
+        annotation = getAnnotationObjectOf(obj)
+        if annotation <> None:
+            writer.element("FeatureNominalId", writer.getId("FeatureNominal", annotation))
+        writer.end(name + "CharacteristicItem")
+    writer.end("CharacteristicItems")
+    writer.end("Characteristics")
+
+def writeQIF(doc, stream):
+    '''writeQIF(doc,stream): writes the GD&T model of the document as a QIF-style
+    XML document, returns the number of written ids. Each section is written in
+    its own pass over the document objects.'''
+    writer = QIFWriter(stream)
+    writer.generator.startDocument()
+    writer.generator.startElement("QIFDocument", {"xmlns": qifNamespace, "versionQIF": "3.0.0"})
+    writer.depth = 1
+    writer.start("FileUnits")
+    writer.start("PrimaryUnits")
+    writer.element("LinearUnit", "millimeter")
+    writer.end("PrimaryUnits")
+    writer.end("FileUnits")
+    writer.start("Product")
+    writer.element("Name", doc.Label)
+    writer.end("Product")
+    writeQIFFeatures(writer, doc)
+    writeQIFDatums(writer, doc)
+    writeQIFCharacteristics(writer, doc)
+    writer.depth = 0
+    writer.indent()
+    writer.generator.endElement("QIFDocument")
+    writer.generator.characters('\n')
+    writer.generator.endDocument()
+    return len(writer.ids)
+
+def exportDocument(doc, filename, types=None):
+    "exportDocument(doc,filename,[types]): exports the GD&T model of the document to a .csv, .qif or JSON Lines file"
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'wb') as stream:
+            return writeCSV(iterRecords(doc, types), stream)
+    elif filename.lower().endswith('.qif') or filename.lower().endswith('.xml'):
+        with open(filename, 'wb') as stream:
+            return writeQIF(doc, stream)
+    else:
+        with open(filename, 'w') as stream:
+            return writeJSONLines(iterRecords(doc, types), stream)
+
+def exportFile(docFilename, filename, types=None):
+    "exportFile(docFilename,filename,[types]): opens a FCStd file, exports its GD&T model and closes it"
+    doc = FreeCAD.openDocument(docFilename)
+    try:
+        return exportDocument(doc, filename, types)
+    finally:
+        FreeCAD.closeDocument(doc.Name)
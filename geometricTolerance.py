@@ -57,7 +57,7 @@ class GeometricToleranceCommand:
         else:
             self.toolTip = 'Add Geometric Tolerance'
             showGrid()
-            gdt.dialogWidgets[3] = comboLabelWidget(Text='Active annotation plane:', List=getAllAnnotationPlaneObjects())
+            gdt.dialogWidgets[3] = comboLabelWidget(Text='Active annotation plane:', List=getAnnotationPlanesForFaces(ContainerOfData.faces))
             gdt.dialogWidgets[1] = fieldLabeCombolWidget(Text='Tolerance value:', Circumference = ['',':/dd/icons/diameter.svg'], Diameter = ContainerOfData.diameter, List=self.FeatureControlFrame.Label, Icons=self.FeatureControlFrame.Icon, ToolTip=self.FeatureControlFrame.toolTip)
         gdt.dialogWidgets[2] = comboLabelWidget(Text='Datum system:', List=[None]+getAllDatumSystemObjects())
         gdt.activate(idGDT = self.idGDT, dialogTitle=self.toolTip, dialogIconPath=self.iconPath, endFunction=self.Activated, dictionary=self.dictionary)
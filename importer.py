@@ -0,0 +1,238 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Bulk import of GD&T specifications from a CSV file.
+
+Each row describes a datum feature and/or a geometric tolerance applied to
+some faces. The rows are read one at a time and all the objects are created
+in a single batch, so the document is recomputed only once at the end. Rows
+with errors are reported and skipped, the rest of the file is still imported.
+
+Columns (the header row is required, unknown columns are ignored):
+
+    faces               faces to annotate, e.g. "Pad.Face6;Pad.Face8"
+    plane               label of the annotation plane
+    planeFace           face used to create the plane if it does not exist
+                        (the first annotated face is used by default)
+    offset              offset of a new annotation plane
+    datum               label of a datum feature to create on the faces
+    name                label of the geometric tolerance
+    characteristic      e.g. "Position", empty if the row has no tolerance
+    tolerance           tolerance value
+    circumference       1 if the tolerance applies to a diameter
+    modifier            e.g. "Maximum material condition"
+    datums              datum features of the datum system, e.g. "A|B|C"
+    diameter, toleranceDiameter, lowLimit, highLimit
+                        size of a diameter annotation
+    x, y, z             point where the annotation is placed, if empty the
+                        annotation is placed automatically
+'''
+
+import csv
+from GDT import *
+
+class FaceIndex:
+    "Resolves 'Object.FaceN' references of a document, looking objects up by name or label"
+    def __init__(self, doc):
+        self.objects = {}
+        for obj in doc.Objects:
+            self.objects[obj.Label] = obj
+        for obj in doc.Objects:
+            self.objects[obj.Name] = obj
+        self.numFaces = {}
+
+    def resolve(self, reference):
+        "resolve(reference): returns the (object, 'FaceN') link of a reference or raises a ValueError"
+        reference = reference.strip()
+        i = reference.rfind('.')
+        if i < 1:
+            raise ValueError("invalid face reference '%s'" % reference)
+        name, sub = reference[:i], reference[i+1:]
+        obj = self.objects.get(name)
+        if obj == None or not hasattr(obj,"Shape"):
+            raise ValueError("unknown object '%s'" % name)
+        if not obj.Name in self.numFaces:
+            self.numFaces[obj.Name] = len(obj.Shape.Faces)
+        if not sub.startswith('Face') or not sub[4:].isdigit() or not 0 < int(sub[4:]) <= self.numFaces[obj.Name]:
+            raise ValueError("'%s' has no face '%s'" % (name, sub))
+        return (obj, sub)
+
+def getFloat(row, column, default=0.0):
+    value = (row.get(column) or '').strip()
+    if value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("invalid number '%s' in column '%s'" % (value, column))
+
+def getBool(row, column):
+    return (row.get(column) or '').strip().lower() in ['1', 'true', 'yes', 'x']
+
+class SpecificationImporter:
+    "Imports the rows of a specification file into a document"
+    def __init__(self, doc):
+        self.doc = doc
+        self.faceIndex = FaceIndex(doc)
+        self.characteristics = makeCharacteristics().Label
+        self.modifiers = makeFeatureControlFrame().toolTip
+        self.planes = dict([(l.Label, l) for l in getAllAnnotationPlaneObjects()])
+        self.datumFeatures = dict([(l.Label, l) for l in getAllDatumFeatureObjects()])
+        self.datumSystems = {}
+        for l in getAllDatumSystemObjects():
+            self.datumSystems[(l.Primary, l.Secondary, l.Tertiary)] = l
+        self.numGT = len(getAllGeometricToleranceObjects())
+        self.created = 0
+        self.errors = []
+        # annotation planes with annotations to place automatically
+        self.toPlace = set()
+
+    def validate(self, row):
+        "validate(row): checks a row and returns the data needed to import it, raises a ValueError if it is not valid"
+        data = {}
+        references = [l for l in (row.get('faces') or '').split(';') if l.strip()]
+        if references == []:
+            raise ValueError("no faces")
+        # in the order given, the first face orients the annotation
+        data['faces'] = [self.faceIndex.resolve(l) for l in references]
+        planeLabel = (row.get('plane') or '').strip()
+        if planeLabel == '':
+            raise ValueError("no annotation plane")
+        data['plane'] = planeLabel
+        if not planeLabel in self.planes:
+            planeFace = (row.get('planeFace') or '').strip()
+            data['planeFace'] = self.faceIndex.resolve(planeFace) if planeFace else data['faces'][0]
+            data['offset'] = getFloat(row, 'offset')
+        data['datum'] = (row.get('datum') or '').strip()
+        if data['datum'] in self.datumFeatures:
+            raise ValueError("datum feature '%s' already exists" % data['datum'])
+        data['characteristic'] = (row.get('characteristic') or '').strip()
+        if data['characteristic'] == '' and data['datum'] == '':
+            raise ValueError("the row has neither a datum nor a characteristic")
+        if data['characteristic'] <> '':
+            if not data['characteristic'] in self.characteristics:
+                raise ValueError("unknown characteristic '%s'" % data['characteristic'])
+            data['tolerance'] = getFloat(row, 'tolerance')
+            data['circumference'] = getBool(row, 'circumference')
+            data['modifier'] = (row.get('modifier') or '').strip()
+            if data['modifier'] <> '' and not data['modifier'] in self.modifiers:
+                raise ValueError("unknown modifier '%s'" % data['modifier'])
+            datums = [l.strip() for l in (row.get('datums') or '').split('|') if l.strip()]
+            if len(datums) > 3:
+                raise ValueError("more than three datums")
+            for l in datums:
+                if not l in self.datumFeatures and l <> data['datum']:
+                    raise ValueError("unknown datum feature '%s'" % l)
+            if len(set(datums)) <> len(datums):
+                raise ValueError("repeated datum feature")
+            data['datums'] = datums
+        data['diameter'] = getFloat(row, 'diameter', None)
+        data['toleranceDiameter'] = getFloat(row, 'toleranceDiameter')
+        data['lowLimit'] = getFloat(row, 'lowLimit')
+        data['highLimit'] = getFloat(row, 'highLimit')
+        if (row.get('x') or '').strip() == '':
+            data['point'] = None
+        else:
+            data['point'] = FreeCAD.Vector(getFloat(row, 'x'), getFloat(row, 'y'), getFloat(row, 'z'))
+        return data
+
+    def getDatumSystem(self, datums):
+        "getDatumSystem(datums): returns the datum system made of the given datum features, creating it if needed"
+        if datums == []:
+            return None
+        features = tuple([self.datumFeatures[l] for l in datums] + [None]*(3-len(datums)))
+        if not features in self.datumSystems:
+            name = 'DS' + str(len(self.datumSystems)+1) + ': ' + ' | '.join(datums)
+            self.datumSystems[features] = makeDatumSystem(name, features[0], features[1], features[2])
+        return self.datumSystems[features]
+
+    def importRow(self, data):
+        "importRow(data): creates the objects of a validated row"
+        if not data['plane'] in self.planes:
+            self.planes[data['plane']] = makeAnnotationPlane(data['plane'], data['offset'], faces=data['planeFace'])
+        container = ContainerOfData(data['faces'])
+        container.annotationPlane = self.planes[data['plane']]
+        container.selectedPoint = data['point']
+        if data['point'] == None:
+            self.toPlace.add(data['plane'])
+        if data['diameter'] <> None:
+            container.diameter = data['diameter']
+        container.toleranceSelect = data['lowLimit'] == 0.0 and data['highLimit'] == 0.0
+        container.toleranceDiameter = data['toleranceDiameter']
+        container.lowLimit = data['lowLimit']
+        container.highLimit = data['highLimit']
+        annotation = getAnnotationObj(container)
+        if data['datum'] <> '':
+            if annotation <> None and annotation.DF <> None:
+                raise ValueError("the faces already have the datum feature '%s'" % annotation.DF.Label)
+            self.datumFeatures[data['datum']] = makeDatumFeature(data['datum'], container)
+            self.created += 1
+        if data['characteristic'] <> '':
+            container.characteristic = makeCharacteristics(data['characteristic'])
+            container.toleranceValue = data['tolerance']
+            container.circumference = data['circumference']
+            container.featureControlFrame = makeFeatureControlFrame(data['modifier'])
+            container.datumSystem = self.getDatumSystem(data['datums'])
+            self.numGT += 1
+            makeGeometricTolerance(data.get('name') or 'GT'+str(self.numGT), container)
+            self.created += 1
+
+    def importRows(self, rows):
+        "importRows(rows): imports an iterable of (line number, row dictionary) pairs"
+        openBatch()
+        try:
+            for lineNumber, row in rows:
+                try:
+                    data = self.validate(row)
+                    data['name'] = (row.get('name') or '').strip()
+                    self.importRow(data)
+                except Exception as e:
+                    self.errors.append((lineNumber, str(e)))
+                    FreeCAD.Console.PrintWarning("GDT import, line " + str(lineNumber) + ": " + str(e) + "\n")
+            for l in sorted(self.toPlace):
+                placeAnnotations(self.planes[l], onlyNew=True)
+        finally:
+            closeBatch()
+        return self.created, self.errors
+
+def iterRows(stream):
+    "iterRows(stream): yields (line number, row dictionary) pairs read from a CSV stream"
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def importSpecifications(filename, doc=None):
+    '''importSpecifications(filename,[doc]): imports a CSV specification file into
+    the document, returns the number of created objects and a list of
+    (line number, message) errors. The document is made active during the
+    import, as the GD&T objects are created in the active document.'''
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    previous = FreeCAD.ActiveDocument
+    if previous <> doc:
+        FreeCAD.setActiveDocument(doc.Name)
+    try:
+        with open(filename, 'rb') as stream:
+            return SpecificationImporter(doc).importRows(iterRows(stream))
+    finally:
+        if previous <> None and previous <> doc:
+            FreeCAD.setActiveDocument(previous.Name)
@@ -0,0 +1,526 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Evaluation of geometric tolerances against measured points.
+
+The measured points are given as a dictionary that maps a face link
+(object name, 'FaceN') to an N x 3 array of points, in document coordinates:
+
+    import inspection
+    results = inspection.evaluateFormTolerances(doc, {("Pad", "Face6"): points})
+
+Fits and deviations are computed on whole arrays with NumPy. The minimum
+zone refinement works on a bounded sample of the points and the refined
+solution is then checked against all of them, so the reported deviation
+is always that of a valid zone and never larger than the least squares one.
+'''
+
+import numpy
+from GDT import *
+
+formCharacteristics = ['Straightness', 'Flatness', 'Circularity', 'Cylindricity']
+# points kept for the minimum zone refinement
+refinementSampleSize = 50000
+# number of sections where circularity is evaluated on a surface scan
+circularitySections = 10
+
+class InspectionResult(object):
+    def __init__(self, GT, deviation, tolerance, method, details=None):
+        self.GT = GT
+        self.characteristic = GT.Characteristic if GT <> None else ''
+        self.deviation = float(deviation)
+        self.tolerance = float(tolerance)
+        self.passed = self.deviation <= self.tolerance
+        self.method = method
+        self.details = details if details <> None else {}
+
+    def __str__(self):
+        name = self.GT.Label if self.GT <> None else ''
+        return name + ': ' + self.characteristic + ' ' + str(round(self.deviation,6)) + ' / ' + str(self.tolerance) + (' pass' if self.passed else ' fail')
+
+def getMeasuredPoints(faces, pointsByFace):
+    "getMeasuredPoints(faces,pointsByFace): returns the measured points of the linked faces as one array, or None if there are none"
+    arrays = []
+    for link in getFaceLinks(faces):
+        points = pointsByFace.get((link[0].Name, link[1]))
+        if points is not None and len(points):
+            arrays.append(numpy.asarray(points, dtype=float).reshape(-1,3))
+    if arrays == []:
+        return None
+    return numpy.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+
+def getAnnotationOfGT(GT):
+    for l in GT.InList:
+        if getType(l) == "Annotation":
+            return l
+    return None
+
+def getSample(points, residuals=None, size=None):
+    '''getSample(points,[residuals],[size]): returns at most size points, keeping the ones
+    with the most extreme residuals, which are the ones that bound the zone'''
+    if size == None:
+        size = refinementSampleSize
+    if len(points) <= size:
+        return points
+    if residuals is None:
+        return points[numpy.linspace(0, len(points)-1, size).astype(int)]
+    order = numpy.argsort(residuals)
+    extremes = numpy.concatenate((order[:size//4], order[-(size//4):]))
+    rest = order[size//4:-(size//4)]
+    rest = rest[numpy.linspace(0, len(rest)-1, size - len(extremes)).astype(int)]
+    return points[numpy.concatenate((extremes, rest))]
+
+    #-----------------------------------------------------------------------
+    # Least squares fits
+    #-----------------------------------------------------------------------
+
+def getPrincipalAxes(points):
+    "getPrincipalAxes(points): returns the centroid and the principal directions of the points, by decreasing variance"
+    centroid = points.mean(axis=0)
+    centered = points - centroid
+    values, vectors = numpy.linalg.eigh(numpy.dot(centered.T, centered))
+    return centroid, vectors[:, ::-1].T
+
+def fitPlane(points):
+    "fitPlane(points): returns the centroid and the unit normal of the least squares plane"
+    centroid, axes = getPrincipalAxes(points)
+    return centroid, axes[2]
+
+def fitLine(points):
+    "fitLine(points): returns a point and the unit direction of the least squares line"
+    centroid, axes = getPrincipalAxes(points)
+    return centroid, axes[0]
+
+def getPlaneBasis(normal):
+    "getPlaneBasis(normal): returns two unit vectors perpendicular to normal and to each other"
+    helper = numpy.array([1.0,0.0,0.0]) if abs(normal[0]) < 0.9 else numpy.array([0.0,1.0,0.0])
+    u = numpy.cross(normal, helper)
+    u /= numpy.linalg.norm(u)
+    return u, numpy.cross(normal, u)
+
+def fitCircle2D(x, y):
+    "fitCircle2D(x,y): returns the center and radius of the algebraic least squares circle of 2D points"
+    A = numpy.column_stack((2*x, 2*y, numpy.ones(len(x))))
+    b = x*x + y*y
+    a, b0, c = numpy.linalg.lstsq(A, b, rcond=-1)[0]
+    return numpy.array([a, b0]), numpy.sqrt(max(c + a*a + b0*b0, 0.0))
+
+def tiltDirection(direction, params):
+    "tiltDirection(direction,params): returns the unit direction tilted by two small angles around its perpendicular axes"
+    u, v = getPlaneBasis(direction)
+    d = direction + u*params[0] + v*params[1]
+    return d / numpy.linalg.norm(d)
+
+    #-----------------------------------------------------------------------
+    # Minimum zone refinement
+    #-----------------------------------------------------------------------
+
+def patternSearch(evaluate, params, step, minStep=None, iterations=200):
+    '''patternSearch(evaluate,params,step,[minStep],[iterations]): minimizes evaluate(params)
+    by trying steps along each parameter and halving them when nothing improves'''
+    params = numpy.array(params, dtype=float)
+    best = evaluate(params)
+    if minStep == None:
+        minStep = step*1e-4
+    for n in range(iterations):
+        improved = False
+        for i in range(len(params)):
+            for sign in [1.0, -1.0]:
+                candidate = params.copy()
+                candidate[i] += sign*step
+                value = evaluate(candidate)
+                if value < best:
+                    best, params, improved = value, candidate, True
+                    break
+        if not improved:
+            step /= 2.0
+            if step < minStep:
+                break
+    return params, best
+
+def getRange(values):
+    return values.max() - values.min()
+
+    #-----------------------------------------------------------------------
+    # Form deviations
+    #-----------------------------------------------------------------------
+
+def getFlatness(points):
+    "getFlatness(points): returns the least squares and the minimum zone flatness of the points and the refined normal"
+    centroid, normal = fitPlane(points)
+    residuals = numpy.dot(points - centroid, normal)
+    lsq = getRange(residuals)
+    sample = getSample(points, residuals)
+    params, refined = patternSearch(lambda p: getRange(numpy.dot(sample, tiltDirection(normal, p))), [0.0, 0.0], 1e-3)
+    normal2 = tiltDirection(normal, params)
+    zone = min(lsq, getRange(numpy.dot(points, normal2)))
+    return lsq, zone, normal2
+
+def getStraightness(points, diameter=False):
+    '''getStraightness(points,[diameter]): returns the least squares and the minimum zone straightness
+    of the points, as the width between two parallel lines of their best plane or, with diameter,
+    as the diameter of the cylinder around their best line'''
+    origin, direction = fitLine(points)
+    centered = points - origin
+    if diameter:
+        def width(d, p, pts):
+            c = pts - p
+            radial = c - numpy.outer(numpy.dot(c, d), d)
+            return 2*numpy.sqrt((radial*radial).sum(axis=1).max())
+        lsq = width(direction, numpy.zeros(3), centered)
+        u, v = getPlaneBasis(direction)
+        sample = getSample(centered)
+        evaluate = lambda p: width(tiltDirection(direction, p[:2]), u*p[2] + v*p[3], sample)
+        params, refined = patternSearch(evaluate, [0.0, 0.0, 0.0, 0.0], max(lsq, 1e-6)*1e-2)
+        zone = min(lsq, width(tiltDirection(direction, params[:2]), u*params[2] + v*params[3], centered))
+        return lsq, zone
+    centroid, axes = getPrincipalAxes(points)
+    normal = axes[2]
+    across = numpy.cross(normal, direction)
+    residuals = numpy.dot(centered, across)
+    lsq = getRange(residuals)
+    sample = getSample(centered, residuals)
+    def evaluate(p):
+        c, s = numpy.cos(p[0]), numpy.sin(p[0])
+        return getRange(numpy.dot(sample, across*c + direction*s))
+    params, refined = patternSearch(evaluate, [0.0], 1e-3)
+    c, s = numpy.cos(params[0]), numpy.sin(params[0])
+    zone = min(lsq, getRange(numpy.dot(centered, across*c + direction*s)))
+    return lsq, zone
+
+def getRoundness2D(x, y):
+    "getRoundness2D(x,y): returns the least squares and the minimum zone roundness of 2D points and the least squares radius"
+    center, radius = fitCircle2D(x, y)
+    r = numpy.hypot(x - center[0], y - center[1])
+    lsq = getRange(r)
+    if len(x) > refinementSampleSize:
+        keep = getSample(numpy.column_stack((x, y, numpy.zeros(len(x)))), r - radius)
+        xs, ys = keep[:,0], keep[:,1]
+    else:
+        xs, ys = x, y
+    params, refined = patternSearch(lambda p: getRange(numpy.hypot(xs - p[0], ys - p[1])), center, max(lsq, 1e-6)*0.1)
+    zone = min(lsq, getRange(numpy.hypot(x - params[0], y - params[1])))
+    return lsq, zone, radius
+
+def getAxis(points):
+    '''getAxis(points): returns a point and the unit direction of the axis of points on a
+    surface of revolution, taken from the principal direction whose perpendicular
+    projection is the most circular'''
+    centroid, axes = getPrincipalAxes(points)
+    centered = points - centroid
+    best = None
+    for direction in axes:
+        u, v = getPlaneBasis(direction)
+        x, y = numpy.dot(centered, u), numpy.dot(centered, v)
+        center, radius = fitCircle2D(x, y)
+        error = numpy.std(numpy.hypot(x - center[0], y - center[1]) - radius)
+        if best == None or error < best[0]:
+            best = (error, centroid + u*center[0] + v*center[1], direction)
+    return best[1], best[2]
+
+def getCylinderResiduals(points, origin, direction, params):
+    "getCylinderResiduals(points,origin,direction,params): returns the radial distances of the points to an axis tilted and shifted by params"
+    d = tiltDirection(direction, params[:2])
+    u, v = getPlaneBasis(direction)
+    c = points - (origin + u*params[2] + v*params[3])
+    radial = c - numpy.outer(numpy.dot(c, d), d)
+    return numpy.sqrt((radial*radial).sum(axis=1))
+
+def fitCylinder(points):
+    "fitCylinder(points): returns a point, the unit direction of the least squares axis of the points and the parameters that refine getAxis"
+    origin, direction = getAxis(points)
+    radius = getCylinderResiduals(points, origin, direction, numpy.zeros(4)).mean()
+    sample = getSample(points)
+    params, rms = patternSearch(lambda p: numpy.std(getCylinderResiduals(sample, origin, direction, p)), numpy.zeros(4), max(radius, 1e-6)*1e-2)
+    return origin, direction, params
+
+def getCylindricity(points):
+    "getCylindricity(points): returns the least squares and the minimum zone cylindricity of the points and the fitted axis"
+    origin, direction, params = fitCylinder(points)
+    r = getCylinderResiduals(points, origin, direction, params)
+    lsq = getRange(r)
+    sample = getSample(points, r)
+    params2, refined = patternSearch(lambda p: getRange(getCylinderResiduals(sample, origin, direction, p)), params, max(lsq, 1e-6)*0.1)
+    zone = min(lsq, getRange(getCylinderResiduals(points, origin, direction, params2)))
+    return lsq, zone, (origin + getPlaneBasis(direction)[0]*params2[2] + getPlaneBasis(direction)[1]*params2[3], tiltDirection(direction, params2[:2]))
+
+def getCircularity(points, sections=None):
+    '''getCircularity(points,[sections]): returns the least squares and minimum zone circularity
+    of the points, the largest of the sections perpendicular to their axis'''
+    if sections == None:
+        sections = circularitySections
+    origin, direction, params = fitCylinder(points)
+    u, v = getPlaneBasis(direction)
+    origin = origin + u*params[2] + v*params[3]
+    direction = tiltDirection(direction, params[:2])
+    centered = points - origin
+    u, v = getPlaneBasis(direction)
+    x, y, t = numpy.dot(centered, u), numpy.dot(centered, v), numpy.dot(centered, direction)
+    span = getRange(t)
+    if span < 1e-9:
+        station = numpy.zeros(len(t), dtype=int)
+    else:
+        station = numpy.minimum(((t - t.min()) / span * sections).astype(int), sections-1)
+    lsq, zone = 0.0, 0.0
+    order = numpy.argsort(station, kind='mergesort')
+    bounds = numpy.searchsorted(station[order], numpy.arange(sections+1))
+    for i in range(sections):
+        rows = order[bounds[i]:bounds[i+1]]
+        if len(rows) < 3:
+            continue
+        l, z, radius = getRoundness2D(x[rows], y[rows])
+        lsq, zone = max(lsq, l), max(zone, z)
+    return lsq, zone
+
+def evaluateForm(GT, points):
+    "evaluateForm(GT,points): returns the InspectionResult of a form tolerance for the measured points of its faces"
+    characteristic = GT.Characteristic
+    points = numpy.asarray(points, dtype=float).reshape(-1,3)
+    if characteristic == 'Flatness':
+        lsq, zone, normal = getFlatness(points)
+    elif characteristic == 'Straightness':
+        lsq, zone = getStraightness(points, GT.Circumference)
+    elif characteristic == 'Circularity':
+        lsq, zone = getCircularity(points)
+    elif characteristic == 'Cylindricity':
+        lsq, zone, axis = getCylindricity(points)
+    else:
+        raise ValueError(characteristic + " is not a form tolerance")
+    return InspectionResult(GT, zone, GT.ToleranceValue, 'minimum zone', {'leastSquares': float(lsq), 'points': len(points)})
+
+def evaluateFormTolerances(doc, pointsByFace):
+    "evaluateFormTolerances(doc,pointsByFace): evaluates every form tolerance of the document that has measured points"
+    results = []
+    for obj in doc.Objects:
+        if getType(obj) == "GeometricTolerance" and obj.Characteristic in formCharacteristics:
+            annotation = getAnnotationOfGT(obj)
+            if annotation == None:
+                continue
+            points = getMeasuredPoints(annotation.faces, pointsByFace)
+            if points is not None and len(points) >= 3:
+                results.append(evaluateForm(obj, points))
+    return results
+
+    #-----------------------------------------------------------------------
+    # Orientation and location
+    #-----------------------------------------------------------------------
+
+orientationCharacteristics = ['Perpendicularity', 'Parallelism', 'Angularity']
+locationCharacteristics = ['Position', 'Symmetry', 'Concentricity']
+# points used to fit the axis of a feature, a least squares axis needs far fewer than a zone
+axisSampleSize = 2000
+
+def getFittedAxis(points):
+    '''getFittedAxis(points): returns the two end points of the axis of points on a cylinder,
+    over the extent of the points. The axis goes through the least squares circle centers
+    of the two halves of the points along it.'''
+    origin, direction = getAxis(getSample(points, size=axisSampleSize))
+    for i in range(2):
+        u, v = getPlaneBasis(direction)
+        c = points - origin
+        t, x, y = numpy.dot(c, direction), numpy.dot(c, u), numpy.dot(c, v)
+        lower = t <= numpy.median(t)
+        centers = []
+        for rows in [lower, ~lower]:
+            if rows.sum() < 3:
+                break
+            center, radius = fitCircle2D(x[rows], y[rows])
+            centers.append(origin + u*center[0] + v*center[1] + direction*t[rows].mean())
+        if len(centers) < 2 or numpy.linalg.norm(centers[1] - centers[0]) < 1e-9:
+            break
+        origin = centers[0]
+        direction = (centers[1] - centers[0]) / numpy.linalg.norm(centers[1] - centers[0])
+    t = numpy.dot(points - origin, direction)
+    return numpy.array([origin + direction*t.min(), origin + direction*t.max()])
+
+def getDistancesToLine(points, origin, direction):
+    "getDistancesToLine(points,origin,direction): returns the distances of the points to a line"
+    c = points - origin
+    radial = c - numpy.outer(numpy.dot(c, direction), direction)
+    return numpy.sqrt((radial*radial).sum(axis=1))
+
+def getWidthDirection(nominalDirection):
+    "getWidthDirection(nominalDirection): returns the axis of the datum frame most perpendicular to a nominal direction in frame coordinates, made perpendicular to it"
+    axis = numpy.identity(3)[numpy.argmin(numpy.abs(nominalDirection))]
+    axis = axis - numpy.dot(axis, nominalDirection)*nominalDirection
+    return axis / numpy.linalg.norm(axis)
+
+def evaluateFeature(characteristic, kind, nominalPoint, nominalDirection, points, diameter=True):
+    '''evaluateFeature(characteristic,kind,nominalPoint,nominalDirection,points,[diameter]): returns the
+    deviation of one feature, with the nominal geometry and the measured points both in
+    datum frame coordinates. Planar features have a zone between two planes, axes a
+    cylindrical zone when diameter is True, otherwise a zone between two planes across
+    the axis, perpendicular to the nearest axis of the datum frame.'''
+    if kind == 'plane':
+        d = numpy.dot(points - nominalPoint, nominalDirection)
+        if characteristic in orientationCharacteristics:
+            # the zone keeps its nominal orientation but may float
+            return getRange(d)
+        return 2*numpy.abs(d).max()
+    ends = getFittedAxis(points)
+    if not diameter:
+        width = getWidthDirection(nominalDirection)
+        if characteristic in orientationCharacteristics:
+            return abs(numpy.dot(ends[1] - ends[0], width))
+        return 2*numpy.abs(numpy.dot(ends - nominalPoint, width)).max()
+    if characteristic in orientationCharacteristics:
+        # the extent of the axis across its nominal direction
+        axis = ends[1] - ends[0]
+        return numpy.linalg.norm(axis - numpy.dot(axis, nominalDirection)*nominalDirection)
+    return 2*getDistancesToLine(ends, nominalPoint, nominalDirection).max()
+
+def getFeatures(annotation, pointsByFace):
+    '''getFeatures(annotation,pointsByFace): returns the (kind, nominal point, nominal direction,
+    measured points, face link) of each feature of an annotation. Every cylindrical face is a feature of
+    its own, as in a pattern of holes, the planar faces together are one feature.'''
+    import datumFrame
+    features = []
+    planes = []
+    for link in getFaceLinks(annotation.faces):
+        points = getMeasuredPoints([link], pointsByFace)
+        if points is None or len(points) < 6:
+            continue
+        kind, point, direction = datumFrame.getNominalGeometry(link)
+        if kind == 'axis':
+            features.append((kind, point, direction, points, link))
+        else:
+            planes.append((kind, point, direction, points, link))
+    if planes:
+        # the nominal point of several faces, like the two sides of a slot, is their median
+        features.append(('plane', numpy.mean([l[1] for l in planes], axis=0), planes[0][2], numpy.concatenate([l[3] for l in planes]), planes[0][4]))
+    return features
+
+def getSymmetryDeviation(nominalFrame, frame, features):
+    "getSymmetryDeviation(nominalFrame,frame,features): returns twice the offset of the median of the measured faces from their nominal median"
+    kind, point, direction, points, link = features[-1]
+    normal = nominalFrame.directionToFrame(direction)
+    median = numpy.dot(nominalFrame.toFrame([point])[0], normal)
+    measured = numpy.dot(frame.toFrame(points), normal)
+    return abs(measured.max() + measured.min() - 2*median)
+
+def evaluateLocation(GT, annotation, solver, pointsByFace):
+    "evaluateLocation(GT,annotation,solver,pointsByFace): returns the InspectionResult of an orientation or location tolerance"
+    frame = solver.getFrame(GT.DS)
+    nominalFrame = solver.getNominalFrame(GT.DS)
+    features = getFeatures(annotation, pointsByFace)
+    if features == []:
+        return None
+    deviations = []
+    for kind, point, direction, points, link in features:
+        nominalPoint = nominalFrame.toFrame([point])[0]
+        nominalDirection = nominalFrame.directionToFrame(direction)
+        nominalDirection = nominalDirection / numpy.linalg.norm(nominalDirection)
+        deviations.append(evaluateFeature(GT.Characteristic, kind, nominalPoint, nominalDirection, frame.toFrame(points), GT.Circumference))
+    if GT.Characteristic == 'Symmetry':
+        deviations = [getSymmetryDeviation(nominalFrame, frame, features)]
+    tolerances = numpy.repeat(GT.ToleranceValue, len(deviations))
+    if GT.Characteristic == 'Position' and GT.FeatureControlFrame in materialConditions and annotation.circumferenceBool:
+        axes = [l for l in features if l[0] == 'axis']
+        if len(axes) == len(features):
+            sizes = numpy.array([getFeatureSize(l[3]) for l in axes])
+            internal = numpy.array([isInternalFeature(l[4]) for l in axes])
+            low, high = getSizeLimits(annotation)
+            bonus = getBonusTolerances(sizes, internal, low, high, GT.FeatureControlFrame)
+            tolerances = tolerances + bonus
+            result = makeFeatureResult(GT, numpy.array(deviations), tolerances, features)
+            result.details['sizes'] = sizes.tolist()
+            result.details['bonus'] = bonus.tolist()
+            result.details['sizeConforming'] = ((sizes >= low) & (sizes <= high)).tolist()
+            result.passed = result.passed and all(result.details['sizeConforming'])
+            return result
+    return makeFeatureResult(GT, numpy.array(deviations), tolerances, features)
+
+    #-----------------------------------------------------------------------
+    # Material condition bonus
+    #-----------------------------------------------------------------------
+
+materialConditions = ['Maximum material condition', 'Least material condition']
+
+def getFeatureSize(points):
+    "getFeatureSize(points): returns the least squares diameter of points on a cylinder"
+    ends = getFittedAxis(points)
+    direction = (ends[1] - ends[0]) / max(numpy.linalg.norm(ends[1] - ends[0]), 1e-12)
+    return 2*getDistancesToLine(points, ends[0], direction).mean()
+
+def isInternalFeature(link):
+    "isInternalFeature(link): returns True if a linked cylindrical face is a hole, its normal pointing to its axis"
+    face = link[0].Shape.getElement(link[1])
+    surface = face.Surface
+    point = face.valueAt(sum(face.ParameterRange[:2])/2, sum(face.ParameterRange[2:])/2)
+    radial = point - surface.Center
+    radial = radial - surface.Axis*radial.dot(surface.Axis)
+    return face.normalAt(sum(face.ParameterRange[:2])/2, sum(face.ParameterRange[2:])/2).dot(radial) < 0
+
+def getSizeLimits(annotation):
+    "getSizeLimits(annotation): returns the low and high size limits of the diameter of an annotation"
+    if annotation.toleranceSelectBool:
+        return annotation.diameter - annotation.toleranceDiameter, annotation.diameter + annotation.toleranceDiameter
+    return annotation.lowLimit, annotation.highLimit
+
+def getBonusTolerances(sizes, internal, low, high, modifier):
+    '''getBonusTolerances(sizes,internal,low,high,modifier): returns the bonus tolerance of each
+    feature of a pattern, the departure of its measured size from the maximum or least material
+    size. internal is True for holes and False for pins, features out of limits get no bonus.'''
+    sizes = numpy.asarray(sizes, dtype=float)
+    internal = numpy.asarray(internal, dtype=bool)
+    if modifier == 'Maximum material condition':
+        bonus = numpy.where(internal, sizes - low, high - sizes)
+    elif modifier == 'Least material condition':
+        bonus = numpy.where(internal, high - sizes, sizes - low)
+    else:
+        return numpy.zeros(len(sizes))
+    return numpy.where((sizes >= low) & (sizes <= high), numpy.clip(bonus, 0.0, high - low), 0.0)
+
+def makeFeatureResult(GT, deviations, tolerances, features):
+    "makeFeatureResult(GT,deviations,tolerances,features): returns the InspectionResult of the worst feature with the per feature values in its details"
+    margins = tolerances - deviations
+    worst = int(numpy.argmin(margins))
+    result = InspectionResult(GT, deviations[worst], tolerances[worst], 'datum frame', {
+        'deviations': deviations.tolist(),
+        'tolerances': tolerances.tolist(),
+        'passed': (margins >= 0).tolist(),
+        'features': len(features)})
+    return result
+
+def evaluateLocationTolerances(doc, pointsByFace, solver=None):
+    '''evaluateLocationTolerances(doc,pointsByFace,[solver]): evaluates every orientation and
+    location tolerance of the document that has a datum system and measured points. The
+    datum frames are solved once, in one batch, for all of them.'''
+    import datumFrame
+    if solver == None:
+        solver = datumFrame.DatumFrameSolver(pointsByFace)
+    tolerances = []
+    for obj in doc.Objects:
+        if getType(obj) == "GeometricTolerance" and obj.Characteristic in orientationCharacteristics + locationCharacteristics and obj.DS <> None:
+            annotation = getAnnotationOfGT(obj)
+            if annotation <> None and getMeasuredPoints(annotation.faces, pointsByFace) is not None:
+                tolerances.append((obj, annotation))
+    results = []
+    DSs = dict([(l[0].DS.Name, l[0].DS) for l in tolerances])
+    solver.solveAll(DSs.values())
+    for GT, annotation in tolerances:
+        if not GT.DS.Name in solver.frames:
+            continue
+        result = evaluateLocation(GT, annotation, solver, pointsByFace)
+        if result <> None:
+            results.append(result)
+    return results
@@ -0,0 +1,208 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Inspection results shown on the model.
+
+The lines of each annotation take the color of the worst state of its
+results: pass, marginal (passed, but within marginalRatio of the tolerance)
+or fail. Results with per point distances, like the profile tolerances,
+also color their faces: the distances are averaged onto the vertices of the
+cached tessellation of each face, and the colors are pushed as one array
+into the single per vertex material of the face.
+
+    results = profileTolerance.evaluateProfileTolerances(doc, pointsByFace)
+    inspectionOverlay.applyResults(doc, results, pointsByFace)
+
+A whole set of results is applied at once, with the notifications of the
+overlay held until it is complete, and no document property is changed.
+'''
+
+import numpy
+from GDT import *
+import tessellation
+from inspection import getAnnotationOfGT
+from profileTolerance import TriangleHierarchy, alignPoints
+
+# a passed result whose deviation is beyond this fraction of its tolerance is marginal
+marginalRatio = 0.8
+# measured points of a face used for its colors
+colorSampleSize = 200000
+noDataColor = (0.5, 0.5, 0.5)
+states = [None, 'pass', 'marginal', 'fail']
+
+def getInspectionState(result):
+    "getInspectionState(result): returns 'pass', 'marginal' or 'fail' for an InspectionResult"
+    if not result.passed:
+        return 'fail'
+    if result.tolerance > 0 and result.deviation > marginalRatio*result.tolerance:
+        return 'marginal'
+    return 'pass'
+
+def getAnnotationStates(results):
+    "getAnnotationStates(results): returns the worst state of the results of each annotation, by annotation name"
+    annotationStates = {}
+    for result in results:
+        annotation = getAnnotationOfGT(result.GT) if result.GT <> None else None
+        if annotation == None:
+            continue
+        state = getInspectionState(result)
+        if states.index(state) > states.index(annotationStates.get(annotation.Name)):
+            annotationStates[annotation.Name] = state
+    return annotationStates
+
+def getDeviationColors(values, tolerance):
+    '''getDeviationColors(values,tolerance): returns an N x 3 array of colors, blue at minus half the
+    tolerance, green at zero and red at half of it, gray for NaN values'''
+    half = tolerance/2.0 if tolerance > 0 else 1.0
+    t = numpy.clip(numpy.nan_to_num(numpy.asarray(values, dtype=float)/half), -1.0, 1.0)
+    colors = numpy.empty((len(t), 3), dtype=numpy.float32)
+    colors[:,0] = numpy.maximum(t, 0.0)
+    colors[:,1] = 1.0 - numpy.abs(t)
+    colors[:,2] = numpy.maximum(-t, 0.0)
+    colors[numpy.isnan(values)] = noDataColor
+    return colors
+
+def getVertexDeviations(vertices, triangles, points, distances):
+    "getVertexDeviations(vertices,triangles,points,distances): returns the mean distance of the points nearest to the triangles around each vertex, NaN where there are none"
+    squared, nearest = TriangleHierarchy(vertices, triangles).query(points)
+    corners = triangles[nearest].ravel()
+    weights = numpy.repeat(distances, 3)
+    sums = numpy.bincount(corners, weights, minlength=len(vertices))
+    counts = numpy.bincount(corners, minlength=len(vertices))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.where(counts > 0, sums/counts, numpy.nan)
+
+def getSample(points, distances, size=None):
+    "getSample(points,distances,[size]): returns at most size evenly spread points and their distances"
+    if size == None:
+        size = colorSampleSize
+    if len(points) <= size:
+        return numpy.asarray(points[:], dtype=float).reshape(-1,3), numpy.asarray(distances)
+    index = numpy.linspace(0, len(points)-1, size).astype(int)
+    return numpy.asarray(points[index], dtype=float).reshape(-1,3), numpy.asarray(distances)[index]
+
+class InspectionOverlay:
+    "The face color maps of a document, one separator per face under a root added to the 3D view"
+    def __init__(self, doc):
+        self.doc = doc
+        self.root = coin.SoSeparator()
+        offset = coin.SoPolygonOffset()
+        offset.factor = -1.0
+        offset.units = -1.0
+        self.root.addChild(offset)
+        self.faces = {}
+        view = FreeCADGui.getDocument(doc.Name).ActiveView
+        self.sceneGraph = view.getSceneGraph()
+        self.sceneGraph.addChild(self.root)
+
+    def setFaceColors(self, key, vertices, triangles, colors):
+        "setFaceColors(key,vertices,triangles,colors): shows a face with one color per vertex"
+        if not key in self.faces:
+            node = coin.SoSeparator()
+            binding = coin.SoMaterialBinding()
+            binding.value = coin.SoMaterialBinding.PER_VERTEX_INDEXED
+            material = coin.SoMaterial()
+            coordinates = coin.SoCoordinate3()
+            faceSet = coin.SoIndexedFaceSet()
+            for child in [binding, material, coordinates, faceSet]:
+                node.addChild(child)
+            self.root.addChild(node)
+            self.faces[key] = (node, material, coordinates, faceSet)
+        node, material, coordinates, faceSet = self.faces[key]
+        coordinates.point.setValues(0, len(vertices), vertices.tolist())
+        coordinates.point.setNum(len(vertices))
+        index = numpy.column_stack((triangles, numpy.repeat(-1, len(triangles)))).ravel()
+        faceSet.coordIndex.setValues(0, len(index), index.tolist())
+        faceSet.coordIndex.setNum(len(index))
+        material.diffuseColor.setValues(0, len(colors), colors.tolist())
+        material.diffuseColor.setNum(len(colors))
+
+    def clear(self):
+        "clear(): removes the colors of all the faces"
+        for node, material, coordinates, faceSet in self.faces.values():
+            self.root.removeChild(node)
+        self.faces = {}
+
+    def remove(self):
+        self.clear()
+        self.sceneGraph.removeChild(self.root)
+
+overlays = {}
+
+def getOverlay(doc, create=True):
+    "getOverlay(doc,[create]): returns the inspection overlay of a document"
+    if not doc.Name in overlays and create:
+        overlays[doc.Name] = InspectionOverlay(doc)
+    return overlays.get(doc.Name)
+
+def setAnnotationStates(doc, annotationStates):
+    "setAnnotationStates(doc,annotationStates): sets the inspection state of every annotation of the document, None for the ones without results"
+    for obj in doc.Objects:
+        if getType(obj) == "Annotation" and obj.ViewObject <> None and hasattr(obj.ViewObject.Proxy,"setInspectionState"):
+            obj.ViewObject.Proxy.setInspectionState(annotationStates.get(obj.Name))
+
+def applyResults(doc, results, pointsByFace=None):
+    '''applyResults(doc,results,[pointsByFace]): shows a set of InspectionResults on the model,
+    replacing the ones shown before. Faces are colored when pointsByFace is given and the
+    results have per point distances. A face with the distances of several results shows the
+    one with the largest distance.'''
+    setAnnotationStates(doc, getAnnotationStates(results))
+    overlay = getOverlay(doc)
+    overlay.root.enableNotify(False)
+    try:
+        overlay.clear()
+        if pointsByFace <> None:
+            # each face shows one map, of the result with the largest distance on it
+            worst = {}
+            for result in results:
+                for key, distances in result.details.get('distances', {}).items():
+                    if len(distances) == 0:
+                        continue
+                    largest = numpy.abs(distances).max()
+                    if not key in worst or largest > worst[key][0]:
+                        worst[key] = (largest, result, distances)
+            for key, (largest, result, distances) in worst.items():
+                obj = doc.getObject(key[0])
+                points = pointsByFace.get(key)
+                if obj == None or points is None or len(points) == 0:
+                    continue
+                vertices, triangles = tessellation.getFaceTessellation((obj, key[1]))
+                if len(triangles) == 0:
+                    continue
+                points, distances = getSample(points, distances)
+                alignment = result.details.get('alignment')
+                if alignment <> None:
+                    # the distances were measured on the points aligned to the nominal faces
+                    points = alignPoints(points, alignment[0], alignment[1])
+                deviations = getVertexDeviations(vertices, triangles, points, distances)
+                overlay.setFaceColors(key, vertices, triangles, getDeviationColors(deviations, result.tolerance))
+    finally:
+        overlay.root.enableNotify(True)
+        overlay.root.touch()
+
+def clearResults(doc):
+    "clearResults(doc): removes the inspection results shown on the model"
+    setAnnotationStates(doc, {})
+    overlay = getOverlay(doc, False)
+    if overlay <> None:
+        overlay.remove()
+        del overlays[doc.Name]
@@ -0,0 +1,226 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Streaming ingestion of measured points.
+
+Scans are read without loading them whole: binary files are memory mapped
+and ASCII XYZ or CSV files are parsed in blocks of lines. In one pass, each
+chunk of points is assigned to the nearest annotated face through a
+triangle hierarchy over the tessellation of the faces, and appended to a
+partition file of that face. Partitions keep the points as float32 offsets
+from the centre of their face, and are reused while the scan and the faces
+do not change:
+
+    pointsByFace = measurement.partitionScan(doc, "scan.xyz")
+    results = inspection.evaluateFormTolerances(doc, pointsByFace)
+
+Each partition reads like a read only N x 3 array, slice by slice.
+'''
+
+import os, json, itertools
+import numpy
+from GDT import *
+import profileTolerance
+import tessellation
+
+asciiExtensions = ['.xyz', '.txt', '.csv', '.asc']
+# raw x, y, z values, besides .npy files
+binaryExtensions = ['.bin', '.raw']
+# points read and assigned at once
+chunkSize = 1000000
+# points farther than this from every annotated face are discarded
+assignmentTolerance = 0.5
+cacheVersion = 1
+
+def iterAsciiChunks(filename, size=None):
+    "iterAsciiChunks(filename,[size]): yields the points of an ASCII XYZ or CSV file as N x 3 arrays of at most size points, skipping header and comment lines"
+    if size == None:
+        size = chunkSize
+    with open(filename) as f:
+        delimiter = None
+        while True:
+            lines = list(itertools.islice(f, size))
+            if lines == []:
+                break
+            if delimiter == None:
+                sample = [l for l in lines if l.strip() and l.strip()[0] in '+-.0123456789']
+                delimiter = ',' if sample and ',' in sample[0] else False
+            rows = [l.replace(',', ' ') if delimiter else l for l in lines]
+            rows = [l.split()[:3] for l in rows if l.strip() and l.strip()[0] in '+-.0123456789']
+            if rows:
+                yield numpy.array(rows, dtype=float)
+
+def openPointFile(filename, dtype=None):
+    '''openPointFile(filename,[dtype]): returns the points of a .npy or raw binary file as a read only
+    memory mapped N x 3 array. Raw files hold consecutive x, y, z values of the given dtype, float64
+    by default.'''
+    if filename.lower().endswith('.npy'):
+        points = numpy.load(filename, mmap_mode='r')
+    else:
+        points = numpy.memmap(filename, dtype=dtype or numpy.float64, mode='r')
+    return points.reshape(-1,3)
+
+def iterPointChunks(filename, size=None, dtype=None):
+    "iterPointChunks(filename,[size],[dtype]): yields the points of a measurement file as float N x 3 arrays of at most size points"
+    if size == None:
+        size = chunkSize
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in asciiExtensions:
+        for chunk in iterAsciiChunks(filename, size):
+            yield chunk
+        return
+    if not extension in binaryExtensions + ['.npy']:
+        raise ValueError("unsupported measurement file '%s'" % filename)
+    points = openPointFile(filename, dtype)
+    for start in range(0, len(points), size):
+        yield numpy.asarray(points[start:start+size], dtype=float)
+
+class FacePartition:
+    "The points of one face in a partition file, float32 offsets from an origin read back as float64 points"
+    def __init__(self, filename, origin, count):
+        self.filename = filename
+        self.origin = numpy.asarray(origin, dtype=float)
+        self.count = count
+        self.data = None
+
+    def getData(self):
+        if self.data is None:
+            if self.count:
+                self.data = numpy.memmap(self.filename, dtype=numpy.float32, mode='r', shape=(self.count, 3))
+            else:
+                self.data = numpy.zeros((0,3), dtype=numpy.float32)
+        return self.data
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return numpy.asarray(self.getData()[index], dtype=float) + self.origin
+
+    def __array__(self, dtype=None):
+        points = self[:]
+        return points if dtype == None else points.astype(dtype)
+
+def getAnnotatedFaces(doc):
+    "getAnnotatedFaces(doc): returns the (object, face name) links of all the faces of the annotations of the document"
+    links = []
+    seen = set()
+    for obj in doc.Objects:
+        if getType(obj) == "Annotation":
+            for link in getFaceLinks(obj.faces):
+                if not (link[0].Name, link[1]) in seen:
+                    seen.add((link[0].Name, link[1]))
+                    links.append(link)
+    return links
+
+def getCacheKey(filename, links, tolerance):
+    "getCacheKey(filename,links,tolerance): returns what the partitions of a scan depend on, the scan file, the faces and a digest of their geometry, and the tolerance"
+    stat = os.stat(filename)
+    return {'version': cacheVersion,
+            'file': os.path.abspath(filename),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'faces': [[l[0].Name, l[1], tessellation.getFaceRevision(l[0].Shape.getElement(l[1]))] for l in links],
+            'tolerance': tolerance}
+
+def getCacheDir(filename):
+    return os.path.splitext(filename)[0] + '.partitions'
+
+def loadPartitions(cacheDir, key=None):
+    "loadPartitions(cacheDir,[key]): returns the cached points by face, or None if there is no cache or it was made for another key"
+    indexFile = os.path.join(cacheDir, 'index.json')
+    if not os.path.exists(indexFile):
+        return None
+    with open(indexFile) as f:
+        index = json.load(f)
+    if key <> None and index.get('key') <> json.loads(json.dumps(key)):
+        return None
+    pointsByFace = {}
+    for face in index['faces']:
+        pointsByFace[(str(face['object']), str(face['face']))] = FacePartition(os.path.join(cacheDir, face['file']), face['origin'], face['count'])
+    return pointsByFace
+
+def partitionPoints(chunks, links, cacheDir, tolerance=None, key=None):
+    '''partitionPoints(chunks,links,cacheDir,[tolerance],[key]): assigns each chunk of points
+    to the nearest of the linked faces and appends it to the partition file of the face.
+    Returns the points by face and the number of discarded points.'''
+    if tolerance == None:
+        tolerance = assignmentTolerance
+    mesh = profileTolerance.getFaceMesh(links)
+    if mesh == None:
+        return {}, 0
+    hierarchy = profileTolerance.TriangleHierarchy(*mesh)
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    elif os.path.exists(os.path.join(cacheDir, 'index.json')):
+        os.remove(os.path.join(cacheDir, 'index.json'))
+    origins = []
+    for link in links:
+        box = link[0].Shape.getElement(link[1]).BoundBox
+        origins.append([box.Center.x, box.Center.y, box.Center.z])
+    origins = numpy.array(origins)
+    names = ['face%d.f32' % i for i in range(len(links))]
+    counts = numpy.zeros(len(links), dtype=int)
+    discarded = 0
+    files = [open(os.path.join(cacheDir, n), 'wb') for n in names]
+    try:
+        for chunk in chunks:
+            for start in range(0, len(chunk), profileTolerance.querySize):
+                points = chunk[start:start+profileTolerance.querySize]
+                squared, nearest = hierarchy.query(points)
+                keep = squared <= tolerance*tolerance
+                discarded += int((~keep).sum())
+                faces = hierarchy.faceIndex[nearest[keep]]
+                points = points[keep]
+                order = numpy.argsort(faces, kind='mergesort')
+                faces, points = faces[order], points[order]
+                bounds = numpy.searchsorted(faces, numpy.arange(len(links) + 1))
+                for i in numpy.flatnonzero(numpy.diff(bounds)):
+                    part = points[bounds[i]:bounds[i+1]]
+                    files[i].write((part - origins[i]).astype(numpy.float32).tobytes())
+                    counts[i] += len(part)
+    finally:
+        for f in files:
+            f.close()
+    index = {'key': key, 'discarded': discarded, 'faces': []}
+    for i in range(len(links)):
+        index['faces'].append({'object': links[i][0].Name, 'face': links[i][1], 'file': names[i], 'origin': origins[i].tolist(), 'count': int(counts[i])})
+    with open(os.path.join(cacheDir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    return loadPartitions(cacheDir), discarded
+
+def partitionScan(doc, filename, cacheDir=None, tolerance=None, dtype=None):
+    '''partitionScan(doc,filename,[cacheDir],[tolerance],[dtype]): returns the points of a scan by
+    annotated face, partitioning the scan in one streaming pass unless a cache made from the same
+    scan, faces and tolerance exists'''
+    if cacheDir == None:
+        cacheDir = getCacheDir(filename)
+    if tolerance == None:
+        tolerance = assignmentTolerance
+    links = getAnnotatedFaces(doc)
+    key = getCacheKey(filename, links, tolerance)
+    pointsByFace = loadPartitions(cacheDir, key)
+    if pointsByFace == None:
+        pointsByFace, discarded = partitionPoints(iterPointChunks(filename, dtype=dtype), links, cacheDir, tolerance, key)
+        if discarded:
+            FreeCAD.Console.PrintMessage(str(discarded) + " points farther than " + str(tolerance) + " from the annotated faces were discarded\n")
+    return pointsByFace
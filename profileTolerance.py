@@ -0,0 +1,307 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Profile of a line and profile of a surface evaluated against the CAD faces.
+
+The annotated faces are tessellated once into one triangle mesh and a
+bounding volume hierarchy is built over its triangles. The measured points
+are then queried in batches: each point first descends greedily to one leaf
+to get an upper bound of its distance, and then the (point, node) pairs
+whose boxes are nearer than that bound are expanded level by level, so a
+batch of points is resolved with a few dozen vectorized steps.
+
+    mesh = profileTolerance.getProfileMesh(annotation)
+    distances = mesh.getSignedDistances(points)
+
+Distances are positive along the outward normal of the faces. The profile
+zone is taken as equally disposed about the nominal faces, so the deviation
+compared with the ToleranceValue is twice the largest absolute distance.
+Profile of a line is evaluated with the same distances, which equal the
+in-section distance where the surface is normal to the section planes.
+'''
+
+import numpy
+from GDT import *
+import tessellation
+from inspection import InspectionResult, getAnnotationOfGT
+
+profileCharacteristics = ['Profile of a line', 'Profile of a surface']
+# chordal deviation of the tessellation, in document units
+tessellationTolerance = 0.01
+# triangles in a leaf of the hierarchy
+leafSize = 8
+# points queried at once
+querySize = 100000
+
+def getClosestWeights(points, a, b, c):
+    "getClosestWeights(points,a,b,c): returns the weights (v,w) of the closest point a + v*(b-a) + w*(c-a) of each triangle (a,b,c) to each point, all N x 3 arrays"
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    d1 = numpy.einsum('ij,ij->i', ab, ap)
+    d2 = numpy.einsum('ij,ij->i', ac, ap)
+    bp = points - b
+    d3 = numpy.einsum('ij,ij->i', ab, bp)
+    d4 = numpy.einsum('ij,ij->i', ac, bp)
+    cp = points - c
+    d5 = numpy.einsum('ij,ij->i', ab, cp)
+    d6 = numpy.einsum('ij,ij->i', ac, cp)
+    va = d3*d6 - d5*d4
+    vb = d5*d2 - d1*d6
+    vc = d1*d4 - d3*d2
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        # inside the triangle
+        denominator = 1.0/(va + vb + vc)
+        v = vb*denominator
+        w = vc*denominator
+        # edge regions, the regions tested last take precedence
+        t = (d4 - d3)/((d4 - d3) + (d5 - d6))
+        region = (va <= 0) & ((d4 - d3) >= 0) & ((d5 - d6) >= 0)
+        v = numpy.where(region, 1 - t, v)
+        w = numpy.where(region, t, w)
+        region = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        v = numpy.where(region, 0.0, v)
+        w = numpy.where(region, d2/(d2 - d6), w)
+        region = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        v = numpy.where(region, d1/(d1 - d3), v)
+        w = numpy.where(region, 0.0, w)
+    # vertex regions
+    region = (d6 >= 0) & (d5 <= d6)
+    v = numpy.where(region, 0.0, v)
+    w = numpy.where(region, 1.0, w)
+    region = (d3 >= 0) & (d4 <= d3)
+    v = numpy.where(region, 1.0, v)
+    w = numpy.where(region, 0.0, w)
+    region = (d1 <= 0) & (d2 <= 0)
+    v = numpy.where(region, 0.0, v)
+    w = numpy.where(region, 0.0, w)
+    return v, w, ab, ac
+
+def getClosestPoints(points, a, b, c):
+    "getClosestPoints(points,a,b,c): returns the closest point of each triangle (a,b,c) to each point, all N x 3 arrays"
+    v, w, ab, ac = getClosestWeights(points, a, b, c)
+    return a + ab*v[:,None] + ac*w[:,None]
+
+def getBoxDistances(points, low, high):
+    "getBoxDistances(points,low,high): returns the squared distance of each point to each box"
+    gap = numpy.maximum(numpy.maximum(low - points, points - high), 0.0)
+    return numpy.einsum('ij,ij->i', gap, gap)
+
+class TriangleHierarchy:
+    "A bounding volume hierarchy over the triangles of a mesh, stored as flat arrays"
+    def __init__(self, vertices, triangles, faceIndex=None):
+        self.vertices = numpy.asarray(vertices, dtype=float).reshape(-1,3)
+        self.triangles = numpy.asarray(triangles, dtype=int).reshape(-1,3)
+        corners = self.vertices[self.triangles]
+        self.normals = numpy.cross(corners[:,1] - corners[:,0], corners[:,2] - corners[:,0])
+        lengths = numpy.linalg.norm(self.normals, axis=1)
+        self.normals /= numpy.where(lengths > 0, lengths, 1.0)[:,None]
+        self.faceIndex = faceIndex if faceIndex is not None else numpy.zeros(len(self.triangles), dtype=int)
+        self.build(corners)
+
+    def build(self, corners):
+        "build(corners): splits the triangles at the median of the longest axis of their centroids until the leaves have at most leafSize triangles"
+        centroids = corners.mean(axis=1)
+        lows = corners.min(axis=1)
+        highs = corners.max(axis=1)
+        order = numpy.arange(len(corners))
+        nodeLow, nodeHigh, children, starts, counts = [], [], [], [], []
+        stack = [(0, len(order), -1, 0)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(nodeLow)
+            if parent >= 0:
+                children[parent][side] = node
+            part = order[start:end]
+            nodeLow.append(lows[part].min(axis=0))
+            nodeHigh.append(highs[part].max(axis=0))
+            children.append([-1, -1])
+            starts.append(start)
+            counts.append(end - start)
+            if end - start <= leafSize:
+                continue
+            spread = centroids[part].max(axis=0) - centroids[part].min(axis=0)
+            axis = int(numpy.argmax(spread))
+            middle = (end - start)//2
+            order[start:end] = part[numpy.argpartition(centroids[part,axis], middle)]
+            stack.append((start + middle, end, node, 1))
+            stack.append((start, start + middle, node, 0))
+        self.order = order
+        self.nodeLow = numpy.array(nodeLow)
+        self.nodeHigh = numpy.array(nodeHigh)
+        self.children = numpy.array(children, dtype=int)
+        self.starts = numpy.array(starts, dtype=int)
+        self.counts = numpy.array(counts, dtype=int)
+
+    def getLeafPairs(self, pointIndex, nodes):
+        "getLeafPairs(pointIndex,nodes): expands (point, leaf) pairs to (point, triangle) pairs"
+        counts = self.counts[nodes]
+        pointIndex = numpy.repeat(pointIndex, counts)
+        offsets = numpy.arange(len(pointIndex)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        return pointIndex, self.order[numpy.repeat(self.starts[nodes], counts) + offsets]
+
+    def updateNearest(self, points, pointIndex, triangleIndex, best, nearest):
+        "updateNearest(points,pointIndex,triangleIndex,best,nearest): keeps for each point the nearest of the given triangles"
+        corners = self.vertices[self.triangles[triangleIndex]]
+        offsets = points[pointIndex] - getClosestPoints(points[pointIndex], corners[:,0], corners[:,1], corners[:,2])
+        distances = numpy.einsum('ij,ij->i', offsets, offsets)
+        # one sort by point, then by distance, on a single key
+        order = numpy.argsort(pointIndex + distances/(distances.max()*1.001 + 1e-300))
+        pointIndex = pointIndex[order]
+        first = numpy.concatenate(([True], pointIndex[1:] <> pointIndex[:-1]))
+        pointIndex = pointIndex[first]
+        distances = distances[order][first]
+        better = distances < best[pointIndex]
+        best[pointIndex[better]] = distances[better]
+        nearest[pointIndex[better]] = triangleIndex[order][first][better]
+
+    def query(self, points):
+        "query(points): returns the squared distance to the mesh and the nearest triangle of each point"
+        best = numpy.full(len(points), numpy.inf)
+        nearest = numpy.zeros(len(points), dtype=int)
+        # greedy descent to one leaf gives an upper bound of the distance
+        nodes = numpy.zeros(len(points), dtype=int)
+        inner = self.children[nodes,0] >= 0
+        while inner.any():
+            index = numpy.flatnonzero(inner)
+            left = self.children[nodes[index],0]
+            right = self.children[nodes[index],1]
+            toLeft = getBoxDistances(points[index], self.nodeLow[left], self.nodeHigh[left]) <= getBoxDistances(points[index], self.nodeLow[right], self.nodeHigh[right])
+            nodes[index] = numpy.where(toLeft, left, right)
+            inner = self.children[nodes,0] >= 0
+        self.updateNearest(points, *self.getLeafPairs(numpy.arange(len(points)), nodes) + (best, nearest))
+        # expand the pairs whose box is nearer than the bound
+        greedy = nodes
+        pointIndex = numpy.arange(len(points))
+        nodes = numpy.zeros(len(points), dtype=int)
+        while len(pointIndex):
+            keep = getBoxDistances(points[pointIndex], self.nodeLow[nodes], self.nodeHigh[nodes]) < best[pointIndex]
+            pointIndex, nodes = pointIndex[keep], nodes[keep]
+            leaf = self.children[nodes,0] < 0
+            leafPoints, leafNodes = pointIndex[leaf], nodes[leaf]
+            visited = greedy[leafPoints] == leafNodes
+            if (~visited).any():
+                self.updateNearest(points, *self.getLeafPairs(leafPoints[~visited], leafNodes[~visited]) + (best, nearest))
+            pointIndex, nodes = pointIndex[~leaf], nodes[~leaf]
+            pointIndex = numpy.concatenate((pointIndex, pointIndex))
+            nodes = numpy.concatenate((self.children[nodes,0], self.children[nodes,1]))
+        return best, nearest
+
+    def getSignedDistances(self, points, size=None, transform=None):
+        "getSignedDistances(points,[size],[transform]): returns the signed distance of each point to the mesh, querying size points at a time, after applying transform to them"
+        if size == None:
+            size = querySize
+        distances = numpy.empty(len(points))
+        for start in range(0, len(points), size):
+            batch = numpy.asarray(points[start:start+size], dtype=float).reshape(-1,3)
+            if transform <> None:
+                batch = transform(batch)
+            squared, nearest = self.query(batch)
+            corners = self.vertices[self.triangles[nearest]]
+            closest = getClosestPoints(batch, corners[:,0], corners[:,1], corners[:,2])
+            sign = numpy.where(numpy.einsum('ij,ij->i', batch - closest, self.normals[nearest]) < 0, -1.0, 1.0)
+            distances[start:start+size] = sign*numpy.sqrt(squared)
+        return distances
+
+def getFaceMesh(links, tolerance=None):
+    "getFaceMesh(links,[tolerance]): returns the vertices, triangles and face index of the triangles of the cached tessellation of the linked faces"
+    if tolerance == None:
+        tolerance = tessellationTolerance
+    vertices, triangles, faceIndex = [], [], []
+    offset = 0
+    for i in range(len(links)):
+        points, facets = tessellation.getFaceTessellation(links[i], tolerance)
+        if len(facets) == 0:
+            continue
+        vertices.append(points)
+        triangles.append(facets + offset)
+        faceIndex.append(numpy.repeat(i, len(facets)))
+        offset += len(points)
+    if triangles == []:
+        return None
+    return numpy.concatenate(vertices), numpy.concatenate(triangles), numpy.concatenate(faceIndex)
+
+def getProfileMesh(annotation, tolerance=None):
+    "getProfileMesh(annotation,[tolerance]): returns the TriangleHierarchy of the faces of the annotation, or None if they have no triangles"
+    mesh = getFaceMesh(getFaceLinks(annotation.faces), tolerance)
+    if mesh == None:
+        return None
+    return TriangleHierarchy(*mesh)
+
+def alignPoints(points, frame, nominalFrame):
+    "alignPoints(points,frame,nominalFrame): returns the measured points moved from their datum frame to the nominal one"
+    return numpy.dot(frame.toFrame(points), nominalFrame.axes) + nominalFrame.origin
+
+def evaluateProfile(GT, annotation, pointsByFace, solver=None, mesh=None):
+    '''evaluateProfile(GT,annotation,pointsByFace,[solver],[mesh]): returns the InspectionResult of
+    a profile tolerance, with the signed distance of every measured point in its details. Points
+    are aligned through the datum frame of the GT when it has one, and the frames are kept in the
+    details, otherwise they are taken to be in document coordinates.'''
+    if mesh == None:
+        mesh = getProfileMesh(annotation)
+    if mesh == None:
+        return None
+    transform = None
+    alignment = None
+    if solver <> None and GT.DS <> None and GT.DS.Name in solver.frames:
+        alignment = (solver.getFrame(GT.DS), solver.getNominalFrame(GT.DS))
+        transform = lambda points: alignPoints(points, alignment[0], alignment[1])
+    distances = {}
+    for link in getFaceLinks(annotation.faces):
+        key = (link[0].Name, link[1])
+        points = pointsByFace.get(key)
+        if points is None or len(points) == 0:
+            continue
+        distances[key] = mesh.getSignedDistances(points, transform=transform)
+    if distances == {}:
+        return None
+    low = min([d.min() for d in distances.values()])
+    high = max([d.max() for d in distances.values()])
+    deviation = 2*max(abs(low), abs(high))
+    return InspectionResult(GT, deviation, GT.ToleranceValue, 'triangle hierarchy', {
+        'distances': distances,
+        'min': float(low),
+        'max': float(high),
+        'triangles': len(mesh.triangles),
+        # the measured and nominal frames the points were aligned with, or None
+        'alignment': alignment})
+
+def evaluateProfileTolerances(doc, pointsByFace, solver=None):
+    "evaluateProfileTolerances(doc,pointsByFace,[solver]): evaluates every profile tolerance of the document that has measured points, through its datum frame when it has a datum system"
+    tolerances = []
+    for obj in doc.Objects:
+        if getType(obj) == "GeometricTolerance" and obj.Characteristic in profileCharacteristics:
+            annotation = getAnnotationOfGT(obj)
+            if annotation <> None:
+                tolerances.append((obj, annotation))
+    DSs = dict([(l[0].DS.Name, l[0].DS) for l in tolerances if l[0].DS <> None])
+    if DSs:
+        if solver == None:
+            import datumFrame
+            solver = datumFrame.DatumFrameSolver(pointsByFace)
+        solver.solveAll(DSs.values())
+    results = []
+    for GT, annotation in tolerances:
+        result = evaluateProfile(GT, annotation, pointsByFace, solver)
+        if result <> None:
+            results.append(result)
+    return results
@@ -0,0 +1,174 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Evaluation of circular and total run-out against a datum axis.
+
+The measured points are taken to the datum reference frame of the GT, whose
+Z axis is the datum axis, and binned by station and angle: stations along
+the axis for cylindrical and conical surfaces (radial run-out), stations
+across the radius for planar faces (axial run-out). Only the lowest and
+highest value of each bin is kept, so the points can be streamed in chunks
+and scans larger than the memory, like numpy.memmap arrays, are read chunk by
+chunk, in one pass for the range of the stations and one for the bins:
+
+    results = runout.evaluateRunoutTolerances(doc, {("Shaft", "Face3"): numpy.load("scan.npy", mmap_mode='r')})
+'''
+
+import numpy
+from GDT import *
+import datumFrame
+from inspection import InspectionResult, getAnnotationOfGT
+
+runoutCharacteristics = ['Circular run-out', 'Total run-out']
+# points transformed and binned at once
+chunkSize = 1000000
+stationCount = 50
+angleCount = 72
+
+def iterChunks(points, size=None):
+    "iterChunks(points,[size]): yields consecutive slices of an array, a memory mapped array is only read slice by slice"
+    if size == None:
+        size = chunkSize
+    for start in range(0, len(points), size):
+        yield numpy.asarray(points[start:start+size], dtype=float).reshape(-1,3)
+
+class RunoutAccumulator:
+    "Lowest and highest radial or axial value of the points of each (station, angle) bin"
+    def __init__(self, frame, radial, stationRange, stations=None, angles=None):
+        self.frame = frame
+        self.radial = radial
+        self.stationRange = stationRange
+        self.stations = stations if stations <> None else stationCount
+        self.angles = angles if angles <> None else angleCount
+        self.low = numpy.full(self.stations*self.angles, numpy.inf)
+        self.high = numpy.full(self.stations*self.angles, -numpy.inf)
+        self.count = 0
+
+    def add(self, points):
+        "add(points): bins a chunk of measured points in document coordinates"
+        local = self.frame.toFrame(points)
+        coordinate, value = getStationCoordinates(local, self.radial)
+        lower, upper = self.stationRange
+        span = max(upper - lower, 1e-12)
+        station = numpy.clip(((coordinate - lower)/span*self.stations).astype(int), 0, self.stations-1)
+        angle = ((numpy.arctan2(local[:,1], local[:,0]) + numpy.pi)/(2*numpy.pi)*self.angles).astype(int) % self.angles
+        index = station*self.angles + angle
+        order = numpy.argsort(index, kind='mergesort')
+        index, value = index[order], value[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], index[1:] <> index[:-1])))
+        bins = index[starts]
+        self.low[bins] = numpy.minimum(self.low[bins], numpy.minimum.reduceat(value, starts))
+        self.high[bins] = numpy.maximum(self.high[bins], numpy.maximum.reduceat(value, starts))
+        self.count += len(points)
+
+    def getStations(self):
+        "getStations(): returns the lowest and highest value and the angular coverage of each station, NaN where it has no points"
+        low = self.low.reshape(self.stations, self.angles)
+        high = self.high.reshape(self.stations, self.angles)
+        filled = numpy.isfinite(low)
+        coverage = filled.mean(axis=1)
+        with numpy.errstate(invalid='ignore'):
+            stationLow = numpy.where(coverage > 0, low.min(axis=1), numpy.nan)
+            stationHigh = numpy.where(coverage > 0, high.max(axis=1), numpy.nan)
+        return stationLow, stationHigh, coverage
+
+    def getCircularRunout(self):
+        "getCircularRunout(): returns the run-out of each station, NaN where it has no points"
+        low, high, coverage = self.getStations()
+        return high - low
+
+    def getTotalRunout(self):
+        "getTotalRunout(): returns the run-out of the whole surface"
+        filled = numpy.isfinite(self.low)
+        if not filled.any():
+            return numpy.nan
+        return self.high[filled].max() - self.low[filled].min()
+
+def getStationCoordinates(local, radial):
+    "getStationCoordinates(local,radial): returns the station coordinate and the run-out value of points in frame coordinates, along the axis and radius when radial, the other way round otherwise"
+    r = numpy.hypot(local[:,0], local[:,1])
+    if radial:
+        return local[:,2], r
+    return r, local[:,2]
+
+def getStationRange(frame, points, radial):
+    "getStationRange(frame,points,radial): returns the range of stations covered by the measured points in the frame, reading them in chunks"
+    lower, upper = numpy.inf, -numpy.inf
+    for chunk in iterChunks(points):
+        coordinate = getStationCoordinates(frame.toFrame(chunk), radial)[0]
+        lower, upper = min(lower, coordinate.min()), max(upper, coordinate.max())
+    return lower, upper
+
+def evaluateRunout(GT, annotation, solver, pointsByFace, stations=None, angles=None):
+    '''evaluateRunout(GT,annotation,solver,pointsByFace,[stations],[angles]): returns the
+    InspectionResult of a run-out tolerance, streaming the points of each face in chunks'''
+    frame = solver.getFrame(GT.DS)
+    deviations = []
+    stationRunouts = []
+    coverages = []
+    uncovered = []
+    for link in getFaceLinks(annotation.faces):
+        points = pointsByFace.get((link[0].Name, link[1]))
+        if points is None or len(points) == 0:
+            continue
+        radial = datumFrame.getNominalGeometry(link)[0] == 'axis'
+        # the stations span the points in the frame they are binned in
+        accumulator = RunoutAccumulator(frame, radial, getStationRange(frame, points, radial), stations, angles)
+        for chunk in iterChunks(points):
+            accumulator.add(chunk)
+        runouts = accumulator.getCircularRunout()
+        if numpy.isnan(runouts).all():
+            uncovered.append(link[1])
+            continue
+        if GT.Characteristic == 'Total run-out':
+            deviations.append(accumulator.getTotalRunout())
+        else:
+            stationRunouts.append(runouts.tolist())
+            deviations.append(numpy.nanmax(runouts))
+        coverages.append(float(accumulator.getStations()[2].mean()))
+    if deviations == []:
+        return None
+    details = {'faces': len(deviations), 'deviations': deviations, 'coverage': coverages}
+    if uncovered:
+        details['uncovered'] = uncovered
+    if stationRunouts:
+        details['stations'] = stationRunouts
+    return InspectionResult(GT, max(deviations), GT.ToleranceValue, 'station and angle bins', details)
+
+def evaluateRunoutTolerances(doc, pointsByFace, solver=None, stations=None, angles=None):
+    "evaluateRunoutTolerances(doc,pointsByFace,[solver],[stations],[angles]): evaluates every run-out tolerance of the document that has a datum system and measured points"
+    if solver == None:
+        solver = datumFrame.DatumFrameSolver(pointsByFace)
+    tolerances = []
+    for obj in doc.Objects:
+        if getType(obj) == "GeometricTolerance" and obj.Characteristic in runoutCharacteristics and obj.DS <> None:
+            annotation = getAnnotationOfGT(obj)
+            if annotation <> None:
+                tolerances.append((obj, annotation))
+    solver.solveAll(dict([(l[0].DS.Name, l[0].DS) for l in tolerances]).values())
+    results = []
+    for GT, annotation in tolerances:
+        if GT.DS.Name in solver.frames:
+            result = evaluateRunout(GT, annotation, solver, pointsByFace, stations, angles)
+            if result <> None:
+                results.append(result)
+    return results
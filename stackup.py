@@ -0,0 +1,207 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Tolerance stack-up over the tolerances of the document.
+
+A stack is a chain of annotations, each with the sensitivity of the stack
+to it (1 or -1 for a dimension added or subtracted, 0.5 for the radius of
+a diameter). Each annotation contributes its size limits, when it is over
+a circumference, and a zone centered on nominal for each of its geometric
+tolerances. The form tolerances of the datum features of their datum
+systems are added too, once each, as datums shift the whole chain:
+
+    stack = stackup.buildStack([(doc.Annotation, 1.0), (doc.Annotation001, -0.5)])
+    result = stackup.analyzeStack(stack, samples=5000000, lowerLimit=0.1, upperLimit=0.4)
+    print result
+
+Results hold the worst-case and RSS ranges, the Monte Carlo statistics and
+the share of the variance of the stack due to each contributor. Sampling
+is done in chunks of chunkSize samples and can be sharded over a process
+pool, which forks the worker processes, so it should only be used where
+forking FreeCAD is safe.
+'''
+
+import numpy
+from GDT import *
+from inspection import getSizeLimits
+import datumFrame
+
+# samples drawn at once
+chunkSize = 1000000
+distributions = ['normal', 'uniform']
+
+class Contributor(object):
+    "A contributor to a stack, a value between low and high scaled by sensitivity, normal with the limits at 3 sigma or uniform"
+    def __init__(self, name, low, high, sensitivity=1.0, distribution='normal'):
+        self.name = name
+        self.low = float(low)
+        self.high = float(high)
+        self.sensitivity = float(sensitivity)
+        self.distribution = distribution
+
+    def getMean(self):
+        return (self.low + self.high)/2.0
+
+    def getSigma(self):
+        if self.distribution == 'uniform':
+            return (self.high - self.low)/numpy.sqrt(12.0)
+        return (self.high - self.low)/6.0
+
+def getSizeContributor(annotation, sensitivity=1.0, distribution='normal'):
+    "getSizeContributor(annotation,[sensitivity],[distribution]): returns the Contributor of the size of an annotation over a circumference, or None"
+    if not annotation.circumferenceBool:
+        return None
+    low, high = getSizeLimits(annotation)
+    if high <= low:
+        return None
+    return Contributor(annotation.Label + ' size', low, high, sensitivity, distribution)
+
+def getToleranceContributor(GT, sensitivity=1.0, distribution='normal'):
+    "getToleranceContributor(GT,[sensitivity],[distribution]): returns the Contributor of a geometric tolerance, a zone centered on nominal"
+    return Contributor(GT.Label, -GT.ToleranceValue/2.0, GT.ToleranceValue/2.0, sensitivity, distribution)
+
+def getDatumTolerances(DS):
+    "getDatumTolerances(DS): returns the geometric tolerances of the datum features of a datum system"
+    GTs = []
+    for DF in datumFrame.getDatums(DS):
+        annotation = datumFrame.getDatumAnnotation(DF)
+        if annotation <> None:
+            GTs += [l for l in annotation.GT if l.DS == None]
+    return GTs
+
+def buildStack(chain, includeDatums=True, distribution='normal'):
+    '''buildStack(chain,[includeDatums],[distribution]): returns the contributors of a chain of
+    annotations, or of (annotation, sensitivity) pairs'''
+    contributors = []
+    names = set()
+    def add(contributor):
+        if contributor <> None and not contributor.name in names:
+            names.add(contributor.name)
+            contributors.append(contributor)
+    for item in chain:
+        annotation, sensitivity = item if isinstance(item, tuple) else (item, 1.0)
+        add(getSizeContributor(annotation, sensitivity, distribution))
+        for GT in annotation.GT:
+            add(getToleranceContributor(GT, sensitivity, distribution))
+            if includeDatums and GT.DS <> None:
+                for datumGT in getDatumTolerances(GT.DS):
+                    add(getToleranceContributor(datumGT, sensitivity, distribution))
+    return contributors
+
+def getWorstCase(contributors):
+    "getWorstCase(contributors): returns the lowest and highest value of the stack"
+    ends = numpy.array([[c.sensitivity*c.low, c.sensitivity*c.high] for c in contributors])
+    return ends.min(axis=1).sum(), ends.max(axis=1).sum()
+
+def getRSS(contributors):
+    "getRSS(contributors): returns the root sum square range of the stack, about the sum of the mean values"
+    mean = sum([c.sensitivity*c.getMean() for c in contributors])
+    half = numpy.sqrt(sum([(c.sensitivity*(c.high - c.low)/2.0)**2 for c in contributors]))
+    return mean - half, mean + half
+
+def getParameters(contributors):
+    "getParameters(contributors): returns the means, sigmas, sensitivities and uniform flags of the contributors as arrays"
+    means = numpy.array([c.getMean() for c in contributors])
+    sigmas = numpy.array([c.getSigma() for c in contributors])
+    sensitivities = numpy.array([c.sensitivity for c in contributors])
+    uniform = numpy.array([c.distribution == 'uniform' for c in contributors])
+    return means, sigmas, sensitivities, uniform
+
+def sampleStack(arguments):
+    '''sampleStack((parameters,count,seed)): returns count samples of the stack and the sums of each
+    contributor and of its product with the stack, to get the covariances. Runs in the worker
+    processes, so it only takes plain arrays.'''
+    (means, sigmas, sensitivities, uniform), count, seed = arguments
+    random = numpy.random.RandomState(seed)
+    samples = numpy.empty(count)
+    sums = numpy.zeros(len(means))
+    products = numpy.zeros(len(means))
+    for start in range(0, count, chunkSize):
+        size = min(chunkSize, count - start)
+        values = random.standard_normal((size, len(means)))
+        if uniform.any():
+            values[:,uniform] = random.uniform(-numpy.sqrt(3.0), numpy.sqrt(3.0), (size, int(uniform.sum())))
+        values = means + values*sigmas
+        stack = numpy.dot(values, sensitivities)
+        samples[start:start+size] = stack
+        sums += values.sum(axis=0)
+        products += numpy.dot(stack, values)
+    return samples, sums, products
+
+class StackResult(object):
+    def __init__(self, contributors, samples, sensitivities, lowerLimit=None, upperLimit=None):
+        self.contributors = contributors
+        self.samples = samples
+        self.mean = samples.mean()
+        self.std = samples.std()
+        self.worstCase = getWorstCase(contributors)
+        self.rss = getRSS(contributors)
+        # (name, share of the variance of the stack), largest first
+        self.sensitivities = sensitivities
+        self.lowerLimit = lowerLimit
+        self.upperLimit = upperLimit
+        inside = numpy.ones(len(samples), dtype=bool)
+        if lowerLimit <> None:
+            inside &= samples >= lowerLimit
+        if upperLimit <> None:
+            inside &= samples <= upperLimit
+        self.yieldFraction = inside.mean()
+
+    def getPercentiles(self, percents=[0.135, 50, 99.865]):
+        "getPercentiles([percents]): returns the values of the stack at the given percents of the samples"
+        return numpy.percentile(self.samples, percents)
+
+    def __str__(self):
+        text = 'Worst case: ' + str(round(self.worstCase[0],6)) + ' to ' + str(round(self.worstCase[1],6)) + '\n'
+        text += 'RSS: ' + str(round(self.rss[0],6)) + ' to ' + str(round(self.rss[1],6)) + '\n'
+        text += 'Monte Carlo: mean ' + str(round(self.mean,6)) + ', sigma ' + str(round(self.std,6)) + ', yield ' + str(round(100*self.yieldFraction,3)) + '%\n'
+        for name, share in self.sensitivities:
+            text += '  ' + name + ': ' + str(round(100*share,2)) + '%\n'
+        return text
+
+def analyzeStack(contributors, samples=1000000, seed=0, processes=None, lowerLimit=None, upperLimit=None):
+    '''analyzeStack(contributors,[samples],[seed],[processes],[lowerLimit],[upperLimit]): returns the
+    StackResult of a stack, sampled in one process or sharded over processes worker processes'''
+    if contributors == []:
+        raise ValueError("The stack has no contributors")
+    parameters = getParameters(contributors)
+    if processes:
+        import multiprocessing
+        counts = [samples//processes + (1 if i < samples % processes else 0) for i in range(processes)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            shards = pool.map(sampleStack, [(parameters, counts[i], seed + i) for i in range(processes)])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        shards = [sampleStack((parameters, samples, seed))]
+    values = numpy.concatenate([l[0] for l in shards])
+    sums = sum([l[1] for l in shards])
+    products = sum([l[2] for l in shards])
+    # share of the variance of the stack: sensitivity * cov(contributor, stack) / var(stack)
+    covariances = products/len(values) - sums/len(values)*values.mean()
+    variance = values.var()
+    shares = parameters[2]*covariances/variance if variance > 0 else numpy.zeros(len(contributors))
+    order = numpy.argsort(-shares)
+    sensitivities = [(contributors[i].name, float(shares[i])) for i in order]
+    return StackResult(contributors, values, sensitivities, lowerLimit, upperLimit)
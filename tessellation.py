@@ -0,0 +1,152 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''A cache of the triangle meshes of annotated faces.
+
+Meshes are kept as NumPy arrays, float64 vertices and int32 triangles, keyed
+by (object, face name, shape revision, deflection). The revision is derived
+from the geometry of the face, so a face changed by a recompute misses the
+cache while an unchanged one is reused, across sessions too when the meshes
+are stored next to the document. The least recently used meshes are dropped
+when the cache outgrows its budget, the tessellationCacheSize parameter in
+megabytes:
+
+    vertices, triangles = tessellation.getFaceTessellation((doc.Box, "Face6"))
+'''
+
+import os, hashlib, collections
+import numpy
+from GDT import *
+
+defaultDeflection = 0.01
+defaultCacheSize = 256
+
+def getFaceRevision(face):
+    "getFaceRevision(face): returns a string that changes when the geometry of the face changes"
+    box = face.BoundBox
+    values = [face.Area, box.XMin, box.YMin, box.ZMin, box.XMax, box.YMax, box.ZMax, len(face.Edges), len(face.Vertexes), face.Surface.__class__.__name__]
+    values += [c for v in face.Vertexes for c in (v.X, v.Y, v.Z)]
+    text = ' '.join([('%.9g' % v) if isinstance(v, float) else str(v) for v in values])
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+
+class TessellationCache:
+    "Triangle meshes of faces, least recently used first, within a memory budget in bytes"
+    def __init__(self, budget=None):
+        if budget == None:
+            budget = (getParam("tessellationCacheSize", defaultCacheSize) or defaultCacheSize)*1024*1024
+        self.budget = budget
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def getKey(self, obj, faceName, deflection):
+        # the revision is measured on every lookup: a shape hashCode is an address that a
+        # recomputed shape may reuse, so it can not tell whether a face changed
+        return (obj.Name, faceName, getFaceRevision(obj.Shape.getElement(faceName)), float(deflection))
+
+    def get(self, obj, faceName, deflection=None):
+        "get(obj,faceName,[deflection]): returns the vertices and triangles of the tessellation of a face"
+        if deflection == None:
+            deflection = defaultDeflection
+        key = self.getKey(obj, faceName, deflection)
+        if key in self.entries:
+            self.hits += 1
+            mesh = self.entries.pop(key)
+            self.entries[key] = mesh
+            return mesh
+        self.misses += 1
+        filename = getCacheFile(obj.Document, key)
+        mesh = loadMesh(filename) if filename <> None else None
+        if mesh == None:
+            mesh = tessellateFace(obj.Shape.getElement(faceName), deflection)
+            if filename <> None:
+                saveMesh(filename, mesh)
+        self.put(key, mesh)
+        return mesh
+
+    def put(self, key, mesh):
+        "put(key,mesh): adds a mesh, dropping the least recently used ones beyond the budget"
+        if key in self.entries:
+            self.size -= getMeshSize(self.entries.pop(key))
+        self.entries[key] = mesh
+        self.size += getMeshSize(mesh)
+        while self.size > self.budget and len(self.entries) > 1:
+            self.size -= getMeshSize(self.entries.popitem(last=False)[1])
+
+    def clear(self, obj=None):
+        "clear([obj]): removes the meshes of an object, or all of them"
+        for key in list(self.entries.keys()):
+            if obj == None or key[0] == obj.Name:
+                self.size -= getMeshSize(self.entries.pop(key))
+
+def getMeshSize(mesh):
+    return mesh[0].nbytes + mesh[1].nbytes
+
+def tessellateFace(face, deflection):
+    "tessellateFace(face,deflection): returns the vertices and triangles of a face as float64 and int32 arrays"
+    points, facets = face.tessellate(deflection)
+    vertices = numpy.array([[p.x, p.y, p.z] for p in points], dtype=float).reshape(-1,3)
+    triangles = numpy.array(facets, dtype=numpy.int32).reshape(-1,3)
+    return vertices, triangles
+
+def getCacheDir(doc):
+    "getCacheDir(doc): returns the directory where the meshes of a saved document are stored, or None"
+    if doc == None or not getParam("tessellationCacheOnDisk", False) or not doc.FileName:
+        return None
+    return os.path.splitext(doc.FileName)[0] + '.tessellation'
+
+def getCacheFile(doc, key):
+    directory = getCacheDir(doc)
+    if directory == None:
+        return None
+    return os.path.join(directory, '%s_%s_%s_%g.npz' % key)
+
+def loadMesh(filename):
+    if not os.path.exists(filename):
+        return None
+    try:
+        data = numpy.load(filename)
+        return data['vertices'], data['triangles']
+    except Exception:
+        return None
+
+def saveMesh(filename, mesh):
+    try:
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        numpy.savez(filename, vertices=mesh[0], triangles=mesh[1])
+    except (IOError, OSError):
+        FreeCAD.Console.PrintWarning("Could not store the tessellation in " + filename + "\n")
+
+cache = None
+
+def getCache():
+    "getCache(): returns the tessellation cache of the session"
+    global cache
+    if cache == None:
+        cache = TessellationCache()
+    return cache
+
+def getFaceTessellation(link, deflection=None):
+    "getFaceTessellation(link,[deflection]): returns the cached vertices and triangles of an (object, face name) link"
+    return getCache().get(link[0], link[1], deflection)
@@ -0,0 +1,322 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Tolerance zones drawn on demand.
+
+The zone of a geometric tolerance is derived from the nominal geometry of
+the faces of its annotation, which the datum frames of its datum system are
+solved against:
+
+ - a slab of the tolerance thickness for planar faces,
+ - a cylinder of the tolerance diameter for the axis of cylindrical faces,
+   when the tolerance applies to a diameter,
+ - coaxial shells for cylindricity, circularity and run-out,
+ - surfaces offset by half the tolerance for profiles.
+
+Zones are only made for the GTs that get selected, directly or through
+their annotation, and are cached by a fingerprint of the GT and its faces.
+They are drawn as Coin meshes under one root of the 3D view, never as
+document objects, so they add nothing to the document or its recomputes.
+'''
+
+import hashlib, collections
+import numpy
+from GDT import *
+import tessellation
+import datumFrame
+from inspection import getAnnotationOfGT
+
+shellCharacteristics = ['Cylindricity', 'Circularity', 'Circular run-out', 'Total run-out']
+profileCharacteristics = ['Profile of a line', 'Profile of a surface']
+# segments of the circles of cylindrical zones
+zoneSegments = 48
+# zones kept in the cache
+zoneCacheSize = 2000
+zoneColor = (0.2, 0.6, 1.0)
+zoneTransparency = 0.6
+
+def getFingerprint(GT, annotation):
+    "getFingerprint(GT,annotation): returns a digest of everything the zone of a GT depends on, the geometry of its faces included"
+    faces = [(l[0].Name, l[1], tessellation.getFaceRevision(l[0].Shape.getElement(l[1]))) for l in getFaceLinks(annotation.faces)]
+    values = (GT.Characteristic, GT.ToleranceValue, GT.Circumference, getattr(GT.DS, "Name", None), faces)
+    return hashlib.md5(repr(values).encode('utf-8')).hexdigest()
+
+def getBasis(direction):
+    "getBasis(direction): returns two unit vectors perpendicular to direction and to each other"
+    u = numpy.cross(direction, [1.0, 0.0, 0.0] if abs(direction[0]) < 0.9 else [0.0, 1.0, 0.0])
+    u /= numpy.linalg.norm(u)
+    return u, numpy.cross(direction, u)
+
+def getFaceCorners(face):
+    box = face.BoundBox
+    return numpy.array([[x, y, z] for x in [box.XMin, box.XMax] for y in [box.YMin, box.YMax] for z in [box.ZMin, box.ZMax]])
+
+def makeSlab(point, normal, corners, thickness):
+    "makeSlab(point,normal,corners,thickness): returns the vertices and triangles of a box of the given thickness about a plane, covering the corners projected on it"
+    u, v = getBasis(normal)
+    offsets = corners - point
+    a = numpy.dot(offsets, u)
+    b = numpy.dot(offsets, v)
+    vertices = []
+    for h in [-thickness/2.0, thickness/2.0]:
+        for x, y in [(a.min(), b.min()), (a.max(), b.min()), (a.max(), b.max()), (a.min(), b.max())]:
+            vertices.append(point + x*u + y*v + h*normal)
+    triangles = [[0,2,1], [0,3,2], [4,5,6], [4,6,7]]
+    for i in range(4):
+        j = (i + 1) % 4
+        triangles += [[i, j, j+4], [i, j+4, i+4]]
+    return numpy.array(vertices), numpy.array(triangles)
+
+def makeTube(point, direction, inner, outer, start, end, segments=None):
+    '''makeTube(point,direction,inner,outer,start,end,[segments]): returns the vertices and triangles
+    of a tube between two radii along an axis, a cylinder if inner is zero'''
+    if segments == None:
+        segments = zoneSegments
+    u, v = getBasis(direction)
+    angles = numpy.linspace(0, 2*numpy.pi, segments, endpoint=False)
+    circle = numpy.outer(numpy.cos(angles), u) + numpy.outer(numpy.sin(angles), v)
+    radii = [outer, inner] if inner > 0 else [outer]
+    rings = [point + position*direction + radius*circle for radius in radii for position in [start, end]]
+    vertices = numpy.concatenate(rings)
+    i = numpy.arange(segments)
+    j = (i + 1) % segments
+    def band(first, second):
+        a, b = first*segments, second*segments
+        return numpy.concatenate((numpy.column_stack((a+i, a+j, b+j)), numpy.column_stack((a+i, b+j, b+i))))
+    triangles = [band(0, 1)]
+    if inner > 0:
+        triangles += [band(3, 2), band(2, 0), band(1, 3)]
+    else:
+        centers = len(vertices)
+        vertices = numpy.concatenate((vertices, [point + start*direction, point + end*direction]))
+        triangles += [numpy.column_stack((numpy.repeat(centers, segments), j, i)), numpy.column_stack((numpy.repeat(centers + 1, segments), segments + i, segments + j))]
+    return vertices, numpy.concatenate(triangles)
+
+def getVertexNormals(vertices, triangles):
+    "getVertexNormals(vertices,triangles): returns the area weighted normal of each vertex"
+    corners = vertices[triangles]
+    faceNormals = numpy.cross(corners[:,1] - corners[:,0], corners[:,2] - corners[:,0])
+    normals = numpy.zeros((len(vertices), 3))
+    for k in range(3):
+        normals[:,k] = numpy.bincount(triangles.ravel(), numpy.repeat(faceNormals[:,k], 3), minlength=len(vertices))
+    lengths = numpy.linalg.norm(normals, axis=1)
+    return normals/numpy.where(lengths > 0, lengths, 1.0)[:,None]
+
+def makeOffsetShells(links, thickness):
+    "makeOffsetShells(links,thickness): returns the vertices and triangles of the tessellation of the faces offset by half the thickness to each side"
+    vertices, triangles = [], []
+    offset = 0
+    for link in links:
+        points, facets = tessellation.getFaceTessellation(link)
+        if len(facets) == 0:
+            continue
+        normals = getVertexNormals(points, facets)
+        for side in [-1.0, 1.0]:
+            vertices.append(points + side*thickness/2.0*normals)
+            triangles.append(facets + offset)
+            offset += len(points)
+    if triangles == []:
+        return None
+    return numpy.concatenate(vertices), numpy.concatenate(triangles)
+
+def makeZone(GT, annotation):
+    "makeZone(GT,annotation): returns the vertices and triangles of the zone of a GT, or None if it has none"
+    links = getFaceLinks(annotation.faces)
+    if links == [] or GT.ToleranceValue <= 0:
+        return None
+    if GT.Characteristic in profileCharacteristics:
+        return makeOffsetShells(links, GT.ToleranceValue)
+    meshes = []
+    for link in links:
+        kind, point, direction = datumFrame.getNominalGeometry(link)
+        face = link[0].Shape.getElement(link[1])
+        if kind == 'plane':
+            meshes.append(makeSlab(point, direction, getFaceCorners(face), GT.ToleranceValue))
+            continue
+        positions = numpy.dot(getFaceCorners(face) - point, direction)
+        if GT.Characteristic in shellCharacteristics:
+            radius = face.Surface.Radius
+            meshes.append(makeTube(point, direction, max(radius - GT.ToleranceValue/2.0, 0.0), radius + GT.ToleranceValue/2.0, positions.min(), positions.max()))
+        elif GT.Circumference:
+            meshes.append(makeTube(point, direction, 0.0, GT.ToleranceValue/2.0, positions.min(), positions.max()))
+    if meshes == []:
+        return None
+    offsets = numpy.cumsum([0] + [len(l[0]) for l in meshes[:-1]])
+    return numpy.concatenate([l[0] for l in meshes]), numpy.concatenate([l[1] + o for l, o in zip(meshes, offsets)])
+
+zoneCache = collections.OrderedDict()
+
+def getZone(GT, annotation, key):
+    "getZone(GT,annotation,key): returns the cached vertices and triangles of the zone of a GT with the fingerprint key, making them if needed, or None"
+    if key in zoneCache:
+        zone = zoneCache.pop(key)
+    else:
+        try:
+            zone = makeZone(GT, annotation)
+        except Exception:
+            FreeCAD.Console.PrintWarning("The tolerance zone of " + GT.Label + " could not be made\n")
+            zone = None
+    zoneCache[key] = zone
+    while len(zoneCache) > zoneCacheSize:
+        zoneCache.popitem(last=False)
+    return zone
+
+class ZoneViewer:
+    "The zones of the selected GTs of a document, one separator per GT under a root added to the 3D view"
+    def __init__(self, doc):
+        self.doc = doc
+        self.root = coin.SoSeparator()
+        material = coin.SoMaterial()
+        material.diffuseColor.setValue(zoneColor[0], zoneColor[1], zoneColor[2])
+        material.transparency.setValue(zoneTransparency)
+        hints = coin.SoShapeHints()
+        hints.vertexOrdering = coin.SoShapeHints.UNKNOWN_ORDERING
+        self.root.addChild(material)
+        self.root.addChild(hints)
+        self.nodes = {}
+        self.sceneGraph = FreeCADGui.getDocument(doc.Name).ActiveView.getSceneGraph()
+        self.sceneGraph.addChild(self.root)
+
+    def show(self, GTs):
+        "show(GTs): shows the zones of the given GTs only, the zones already shown are kept as they are"
+        names = set([l.Name for l in GTs])
+        for name in list(self.nodes.keys()):
+            if not name in names:
+                self.root.removeChild(self.nodes.pop(name))
+        for GT in GTs:
+            if GT.Name in self.nodes:
+                continue
+            annotation = getAnnotationOfGT(GT)
+            if annotation == None:
+                continue
+            zone = getZone(GT, annotation, getFingerprint(GT, annotation))
+            if zone == None:
+                continue
+            vertices, triangles = zone
+            node = coin.SoSeparator()
+            coordinates = coin.SoCoordinate3()
+            coordinates.point.setValues(0, len(vertices), vertices.tolist())
+            faceSet = coin.SoIndexedFaceSet()
+            index = numpy.column_stack((triangles, numpy.repeat(-1, len(triangles)))).ravel()
+            faceSet.coordIndex.setValues(0, len(index), index.tolist())
+            node.addChild(coordinates)
+            node.addChild(faceSet)
+            self.root.addChild(node)
+            self.nodes[GT.Name] = node
+
+    def remove(self):
+        self.sceneGraph.removeChild(self.root)
+        self.nodes = {}
+
+def getSelectedGTs(doc):
+    "getSelectedGTs(doc): returns the selected GTs of a document and the GTs of its selected annotations"
+    GTs = []
+    for obj in FreeCADGui.Selection.getSelection(doc.Name):
+        if getType(obj) == "GeometricTolerance":
+            candidates = [obj]
+        elif getType(obj) == "Annotation":
+            candidates = obj.GT
+        else:
+            continue
+        GTs += [l for l in candidates if not l in GTs]
+    return GTs
+
+class ZoneSelectionObserver:
+    "Shows the zones of the selected GTs in the documents with a viewer"
+    def __init__(self):
+        self.viewers = {}
+        # the selection callbacks of one user action, like a box selection, are handled together
+        self.pending = set()
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def update(self, docName):
+        viewer = self.viewers.get(docName)
+        if viewer <> None:
+            viewer.show(getSelectedGTs(viewer.doc))
+
+    def schedule(self, docName):
+        if docName in self.viewers:
+            self.pending.add(docName)
+            self.timer.start(0)
+
+    def flush(self):
+        pending = self.pending
+        self.pending = set()
+        for docName in pending:
+            self.update(docName)
+
+    def addSelection(self, doc, obj, sub, pnt):
+        self.schedule(doc)
+
+    def removeSelection(self, doc, obj, sub):
+        self.schedule(doc)
+
+    def setSelection(self, doc):
+        self.schedule(doc)
+
+    def clearSelection(self, doc):
+        self.schedule(doc)
+
+observer = None
+
+def toggleZones(doc=None):
+    "toggleZones([doc]): starts or stops showing the zones of the selected GTs of a document, returns True if they are shown"
+    global observer
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    if observer == None:
+        observer = ZoneSelectionObserver()
+        FreeCADGui.Selection.addObserver(observer)
+    if doc.Name in observer.viewers:
+        observer.viewers.pop(doc.Name).remove()
+        return False
+    observer.viewers[doc.Name] = ZoneViewer(doc)
+    observer.update(doc.Name)
+    return True
+
+class ToleranceZonesCommand:
+    def __init__(self):
+        self.iconPath = ':/dd/icons/FeatureControlFrame/projectedToleranceZone.svg'
+        self.toolTip = 'Show the tolerance zones of the selected geometric tolerances'
+
+    def Activated(self):
+        if toggleZones(FreeCAD.ActiveDocument):
+            FreeCAD.Console.PrintMessage("Tolerance zones of the selected geometric tolerances are shown\n")
+        else:
+            FreeCAD.Console.PrintMessage("Tolerance zones are hidden\n")
+
+    def GetResources(self):
+        return {
+            'Pixmap' : self.iconPath,
+            'MenuText': self.toolTip,
+            'ToolTip':  self.toolTip
+            }
+
+    def IsActive(self):
+        if FreeCADGui.ActiveDocument:
+            return True
+        else:
+            return False
+
+FreeCADGui.addCommand('dd_toleranceZones', ToleranceZonesCommand())
@@ -0,0 +1,118 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+from GDT import *
+import validator
+
+class ValidationDock:
+    "Dockable list of the findings of the validator of the active document"
+    def __init__(self):
+        self.validator = None
+        self.widget = QtGui.QDockWidget('GD&T validation')
+        self.widget.setObjectName('GDTValidation')
+        self.list = QtGui.QListWidget()
+        self.list.itemDoubleClicked.connect(self.selectItem)
+        self.label = QtGui.QLabel()
+        buttonRefresh = QtGui.QPushButton('Validate all')
+        buttonRefresh.clicked.connect(self.validateAll)
+        hbox = QtGui.QHBoxLayout()
+        hbox.addWidget(self.label)
+        hbox.addStretch(1)
+        hbox.addWidget(buttonRefresh)
+        vbox = QtGui.QVBoxLayout()
+        vbox.addWidget(self.list)
+        vbox.addLayout(hbox)
+        w = QtGui.QWidget()
+        w.setLayout(vbox)
+        self.widget.setWidget(w)
+        # the changes of one recompute are validated together
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.update)
+        FreeCADGui.getMainWindow().addDockWidget(QtCore.Qt.RightDockWidgetArea, self.widget)
+
+    def show(self, doc):
+        if self.validator <> None and self.schedule in self.validator.listeners:
+            self.validator.listeners.remove(self.schedule)
+        self.validator = validator.watch(doc)
+        self.validator.listeners.append(self.schedule)
+        self.widget.show()
+        self.widget.raise_()
+        self.update()
+
+    def schedule(self):
+        if not self.timer.isActive():
+            self.timer.start(200)
+
+    def validateAll(self):
+        if self.validator <> None:
+            self.validator.dirty = None
+            self.update()
+
+    def update(self):
+        if self.validator == None or not self.widget.isVisible():
+            return
+        findings = self.validator.validate()
+        self.list.clear()
+        icons = {'Error': QtGui.QStyle.SP_MessageBoxCritical, 'Warning': QtGui.QStyle.SP_MessageBoxWarning}
+        for finding in findings:
+            obj = self.validator.doc.getObject(finding.Object)
+            label = obj.Label if obj <> None else finding.Object
+            item = QtGui.QListWidgetItem(self.widget.style().standardIcon(icons.get(finding.Severity, QtGui.QStyle.SP_MessageBoxInformation)), label + ': ' + finding.Message)
+            item.setData(QtCore.Qt.UserRole, finding.Object)
+            item.setToolTip(finding.Rule)
+            self.list.addItem(item)
+        self.label.setText(str(len(findings)) + ' findings')
+
+    def selectItem(self, item):
+        obj = self.validator.doc.getObject(str(item.data(QtCore.Qt.UserRole)))
+        if obj <> None:
+            FreeCADGui.Selection.clearSelection()
+            FreeCADGui.Selection.addSelection(obj)
+
+dock = None
+
+class ValidateCommand:
+    def __init__(self):
+        self.iconPath = ':/dd/icons/helpGDT.svg'
+        self.toolTip = 'Validate GD&T'
+
+    def Activated(self):
+        global dock
+        if dock == None:
+            dock = ValidationDock()
+        dock.show(FreeCAD.ActiveDocument)
+
+    def GetResources(self):
+        return {
+            'Pixmap' : self.iconPath,
+            'MenuText': self.toolTip,
+            'ToolTip':  self.toolTip
+            }
+
+    def IsActive(self):
+        if FreeCADGui.ActiveDocument:
+            return True
+        else:
+            return False
+
+FreeCADGui.addCommand('dd_validate', ValidateCommand())
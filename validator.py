@@ -0,0 +1,281 @@
+#***************************************************************************
+#*                                                                         *
+#*   Copyright (c) 2016 Juan Vanyo Cerda <juavacer@inf.upv.es>             *
+#*                                                                         *
+#*   This program is free software; you can redistribute it and/or modify  *
+#*   it under the terms of the GNU Lesser General Public License (LGPL)    *
+#*   as published by the Free Software Foundation; either version 2 of     *
+#*   the License, or (at your option) any later version.                   *
+#*   for detail see the LICENCE text file.                                 *
+#*                                                                         *
+#*   This program is distributed in the hope that it will be useful,       *
+#*   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+#*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+#*   GNU Library General Public License for more details.                  *
+#*                                                                         *
+#*   You should have received a copy of the GNU Library General Public     *
+#*   License along with this program; if not, write to the Free Software   *
+#*   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+#*   USA                                                                   *
+#*                                                                         *
+#***************************************************************************
+
+'''Consistency validation of the GD&T model of a document.
+
+Each rule checks one object of a given GD&T type and returns the findings
+of that object. The findings are kept per object, so after a change only the
+changed objects and the GD&T objects that link to them (their InList) are
+checked again:
+
+    import validator
+    v = validator.Validator(FreeCAD.ActiveDocument)
+    for finding in v.validate():
+        print(finding)
+
+A Validator registered with watch() is invalidated by a document observer,
+which is how the dock list stays up to date.
+'''
+
+from GDT import *
+
+datumCharacteristics = ['Perpendicularity', 'Angularity', 'Parallelism', 'Symmetry', 'Position', 'Concentricity', 'Circular run-out', 'Total run-out']
+formCharacteristics = ['Straightness', 'Flatness', 'Circularity', 'Cylindricity']
+gdtTypes = ["AnnotationPlane", "DatumFeature", "DatumSystem", "GeometricTolerance", "Annotation"]
+
+class Finding(object):
+    def __init__(self, Severity, Rule, Object, Message):
+        self.Severity = Severity
+        self.Rule = Rule
+        self.Object = Object
+        self.Message = Message
+
+    def __str__(self):
+        return self.Severity + ': ' + self.Object + ': ' + self.Message + ' [' + self.Rule + ']'
+
+def isLinkTo(obj, link, tp):
+    "isLinkTo(obj,link,tp): checks that a link of obj points to a live GD&T object of type tp of the same document"
+    try:
+        return getType(link) == tp and link.Document == obj.Document and link.Document.getObject(link.Name) <> None
+    except Exception:
+        return False
+
+    #-----------------------------------------------------------------------
+    # Rules
+    #-----------------------------------------------------------------------
+
+def checkDatumSystem(validator, obj):
+    findings = []
+    datums = [obj.Primary, obj.Secondary, obj.Tertiary]
+    if datums[0] == None:
+        findings.append(('Error', 'The datum system has no primary datum'))
+    if datums[1] == None and datums[2] <> None:
+        findings.append(('Error', 'The datum system has a tertiary datum but no secondary datum'))
+    names = []
+    for l in datums:
+        if l == None:
+            continue
+        if not isLinkTo(obj, l, "DatumFeature"):
+            findings.append(('Error', 'The datum system references a missing datum feature'))
+        elif l.Name in names:
+            findings.append(('Error', 'The datum feature ' + l.Label + ' is referenced more than once'))
+        else:
+            names.append(l.Name)
+    return findings
+
+def checkGeometricTolerance(validator, obj):
+    findings = []
+    if obj.DS <> None and not isLinkTo(obj, obj.DS, "DatumSystem"):
+        findings.append(('Error', 'The geometric tolerance references a missing datum system'))
+    if obj.Characteristic in formCharacteristics and obj.DS <> None:
+        findings.append(('Error', 'A ' + obj.Characteristic + ' tolerance can not reference a datum system'))
+    elif obj.Characteristic in datumCharacteristics and obj.DS == None:
+        findings.append(('Warning' if obj.Characteristic == 'Position' else 'Error', 'The ' + obj.Characteristic + ' tolerance has no datum system'))
+    if obj.ToleranceValue <= 0:
+        findings.append(('Error', 'The tolerance value is not positive'))
+    if not [l for l in obj.InList if getType(l) == "Annotation"]:
+        findings.append(('Warning', 'The geometric tolerance is not in any annotation'))
+    return findings
+
+def checkDatumFeature(validator, obj):
+    if not [l for l in obj.InList if getType(l) == "Annotation"]:
+        return [('Warning', 'The datum feature is not in any annotation')]
+    return []
+
+def checkAnnotation(validator, obj):
+    findings = []
+    if not obj.faces:
+        findings.append(('Error', 'The annotation has no faces'))
+    for link in obj.faces:
+        subs = link[1]
+        if isinstance(subs, str):
+            subs = [subs]
+        numFaces = validator.getNumberOfFaces(link[0])
+        for sub in subs:
+            if not sub.startswith('Face') or not sub[4:].isdigit() or not 0 < int(sub[4:]) <= numFaces:
+                findings.append(('Error', 'The annotation references the missing face ' + link[0].Label + '.' + sub))
+    if not isLinkTo(obj, obj.AP, "AnnotationPlane"):
+        findings.append(('Error', 'The annotation has no annotation plane'))
+    if obj.DF == None and not obj.GT:
+        findings.append(('Warning', 'The annotation has neither a datum feature nor a geometric tolerance'))
+    return findings
+
+def checkAnnotationPlane(validator, obj):
+    if not obj.faces:
+        return [('Warning', 'The annotation plane has no reference face')]
+    return []
+
+# rule name -> (type of the checked objects, function)
+rules = {
+    'datum-system': ("DatumSystem", checkDatumSystem),
+    'geometric-tolerance': ("GeometricTolerance", checkGeometricTolerance),
+    'datum-feature': ("DatumFeature", checkDatumFeature),
+    'annotation': ("Annotation", checkAnnotation),
+    'annotation-plane': ("AnnotationPlane", checkAnnotationPlane),
+    }
+
+    #-----------------------------------------------------------------------
+    # Validator
+    #-----------------------------------------------------------------------
+
+class Validator:
+    "Keeps the findings of the GD&T objects of a document and checks again only the invalidated objects"
+    def __init__(self, doc=None):
+        if doc == None:
+            doc = FreeCAD.ActiveDocument
+        self.doc = doc
+        self.rulesOfType = {}
+        for name in sorted(rules):
+            tp, function = rules[name]
+            self.rulesOfType.setdefault(tp, []).append((name, function))
+        self.findings = {}
+        self.numFaces = {}
+        self.dirty = None
+        self.listeners = []
+        # names of the GD&T objects each GD&T object linked to when it was last seen
+        self.outLists = {}
+
+    def getNumberOfFaces(self, obj):
+        "getNumberOfFaces(obj): returns the number of faces of an object, cached until the object changes"
+        if not obj.Name in self.numFaces:
+            try:
+                self.numFaces[obj.Name] = len(obj.Shape.Faces)
+            except Exception:
+                self.numFaces[obj.Name] = 0
+        return self.numFaces[obj.Name]
+
+    def invalidate(self, obj):
+        "invalidate(obj): marks an object and the GD&T objects that depend on it to be checked again"
+        self.numFaces.pop(obj.Name, None)
+        if self.dirty == None:
+            return
+        if getType(obj) in gdtTypes:
+            self.dirty.add(obj.Name)
+        for l in obj.InList:
+            if getType(l) in gdtTypes:
+                self.dirty.add(l.Name)
+        # a link to obj may be about to break, check its targets that are GD&T objects too,
+        # the ones it linked to before the change as well as the current ones
+        self.dirty.update(self.outLists.get(obj.Name, []))
+        for l in obj.OutList:
+            if getType(l) in gdtTypes:
+                self.dirty.add(l.Name)
+        if getType(obj) in gdtTypes:
+            self.recordOutList(obj)
+
+    def recordOutList(self, obj):
+        "recordOutList(obj): remembers the GD&T objects an object links to, to invalidate them once it drops them"
+        self.outLists[obj.Name] = [l.Name for l in obj.OutList if getType(l) in gdtTypes]
+
+    def remove(self, obj):
+        "remove(obj): forgets a deleted object and invalidates the objects that depend on it"
+        self.invalidate(obj)
+        if self.dirty <> None:
+            self.dirty.discard(obj.Name)
+        self.findings.pop(obj.Name, None)
+        self.outLists.pop(obj.Name, None)
+
+    def check(self, obj):
+        self.recordOutList(obj)
+        findings = []
+        for name, function in self.rulesOfType.get(getType(obj), []):
+            try:
+                result = function(self, obj)
+            except Exception as e:
+                result = [('Error', 'The rule failed: ' + str(e))]
+            for severity, message in result:
+                findings.append(Finding(severity, name, obj.Name, message))
+        if findings:
+            self.findings[obj.Name] = findings
+        else:
+            self.findings.pop(obj.Name, None)
+
+    def validate(self):
+        "validate(): checks the invalidated objects, or the whole document the first time, and returns all the findings"
+        if self.dirty == None:
+            self.findings = {}
+            objects = [l for l in self.doc.Objects if getType(l) in gdtTypes]
+        else:
+            objects = [self.doc.getObject(l) for l in self.dirty]
+        self.dirty = set()
+        for obj in objects:
+            if obj <> None:
+                self.check(obj)
+        return self.getFindings()
+
+    def getFindings(self):
+        "getFindings(): returns the findings of the last validation sorted by object"
+        findings = []
+        for name in sorted(self.findings):
+            findings.extend(self.findings[name])
+        return findings
+
+    def isDirty(self):
+        return self.dirty == None or len(self.dirty) > 0
+
+class ValidatorObserver:
+    "Document observer that invalidates the objects of the watched validators"
+    def __init__(self):
+        self.validators = {}
+
+    def slotCreatedObject(self, obj):
+        self.notify(obj, False)
+
+    def slotBeforeChangeObject(self, obj, prop):
+        validator = self.validators.get(obj.Document.Name)
+        if validator <> None and getType(obj) in gdtTypes:
+            validator.recordOutList(obj)
+
+    def slotChangedObject(self, obj, prop):
+        self.notify(obj, False)
+
+    def slotDeletedObject(self, obj):
+        self.notify(obj, True)
+
+    def notify(self, obj, deleted):
+        validator = self.validators.get(obj.Document.Name)
+        if validator == None:
+            return
+        if deleted:
+            validator.remove(obj)
+        else:
+            validator.invalidate(obj)
+        for l in validator.listeners:
+            l()
+
+observer = None
+
+def watch(doc=None):
+    "watch([doc]): returns the validator of a document kept up to date by a document observer"
+    global observer
+    if doc == None:
+        doc = FreeCAD.ActiveDocument
+    if observer == None:
+        observer = ValidatorObserver()
+        FreeCAD.addDocumentObserver(observer)
+    if not doc.Name in observer.validators:
+        observer.validators[doc.Name] = Validator(doc)
+    return observer.validators[doc.Name]
+
+def validateDocument(doc=None):
+    "validateDocument([doc]): checks the whole document and returns its findings"
+    return Validator(doc).validate()